@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class StatsCache:
+    """Cache LRU em memória para os endpoints de estatísticas
+
+    Cada entrada guarda a versão dos dados do momento em que foi calculada (as mesmas
+    entradas do ETag da rota: versões das tabelas e, se depender da data, o dia de hoje);
+    quando a versão muda a entrada deixa de valer. O TTL só limita a idade das entradas.
+    """
+
+    def __init__(self, maxsize=256, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key, version):
+        """Retorna (encontrado, valor) para a chave na versão de dados informada"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, expires_at, value = entry
+                if entry_version == version and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return True, value
+                del self._entries[key]
+
+            self._misses += 1
+            return False, None
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    async def get_or_compute(self, key, version, compute):
+        """Retorna o valor em cache ou aguarda compute() e guarda o resultado
+
+        version deve ser lido antes do cálculo: se houver uma escrita no meio, a entrada
+        já nasce com a versão antiga e é descartada na próxima leitura.
+        """
+        hit, value = self.get(key, version)
+        if hit:
+            return value
+
+        value = await compute()
+        self.set(key, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hitRate': self._hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,96 @@
+"""
+Registro de alterações para a sincronização incremental (GET/POST /api/sync).
+
+As triggers guardam em change_log a última alteração de cada linha de cycles, subjects,
+study_sessions e stats. seq cresce a cada escrita, então "o que mudou desde o cursor X"
+é WHERE seq > X, e uma linha alterada várias vezes aparece uma vez só. Linhas apagadas
+ficam registradas com op = 'delete'.
+
+O cursor entregue aos clientes é "{epoch}.{seq}". O epoch muda quando o banco é
+substituído (restauração de backup), invalidando cursores do arquivo anterior.
+"""
+
+# Tabela -> coluna que identifica a linha para o cliente
+SYNC_TABLES = {
+    'cycles': 'id',
+    'subjects': 'id',
+    'study_sessions': 'id',
+    'stats': 'date',
+}
+
+
+class StaleCursorError(ValueError):
+    """O cursor foi gerado por outro banco (ex.: antes de uma restauração de backup)"""
+
+
+def _log_trigger(table, event, ref, op):
+    return f'''
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_changelog_{event.lower()}
+    AFTER {event} ON {table}
+    BEGIN
+        -- "+" tira a afinidade da coluna; sem ele a comparação não usa o índice de row_key
+        DELETE FROM change_log WHERE table_name = '{table}' AND row_key = +{ref}.{SYNC_TABLES[table]};
+        INSERT INTO change_log (table_name, row_key, op)
+        VALUES ('{table}', {ref}.{SYNC_TABLES[table]}, '{op}');
+    END
+    '''
+
+
+CHANGELOG_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_key NOT NULL,  -- sem tipo: texto para ciclos/disciplinas/datas, inteiro para sessões
+        op TEXT NOT NULL CHECK (op IN ('upsert', 'delete'))
+    )
+    ''',
+    # Uma entrada por linha: a trigger apaga a anterior e grava com um seq novo
+    # (DELETE + INSERT, porque um INSERT OR REPLACE herdaria o conflito do comando externo)
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_row ON change_log(table_name, row_key)',
+    '''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        epoch TEXT NOT NULL
+    )
+    ''',
+    "INSERT OR IGNORE INTO sync_state (id, epoch) VALUES (1, lower(hex(randomblob(8))))",
+    *(
+        _log_trigger(table, event, ref, op)
+        for table in SYNC_TABLES
+        for event, ref, op in (('INSERT', 'NEW', 'upsert'), ('UPDATE', 'NEW', 'upsert'), ('DELETE', 'OLD', 'delete'))
+    ),
+    # Linhas que já existiam antes do registro entram como alteradas
+    *(
+        f'''
+        INSERT OR IGNORE INTO change_log (table_name, row_key, op)
+        SELECT '{table}', {key}, 'upsert' FROM {table} ORDER BY rowid
+        '''
+        for table, key in SYNC_TABLES.items()
+    ),
+]
+
+
+def read_sync_position(cursor):
+    """Retorna (epoch, último seq) do registro de alterações"""
+    cursor.execute('SELECT epoch FROM sync_state WHERE id = 1')
+    epoch = cursor.fetchone()[0]
+    cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log')
+    return epoch, cursor.fetchone()[0]
+
+
+def renew_sync_epoch(cursor):
+    """Gera um epoch novo: cursores emitidos antes deixam de valer"""
+    cursor.execute("UPDATE sync_state SET epoch = lower(hex(randomblob(8))) WHERE id = 1")
+
+
+def format_cursor(epoch, seq):
+    return f"{epoch}.{seq}"
+
+
+def parse_cursor(value):
+    """Separa o cursor em (epoch, seq); levanta ValueError se o formato for inválido"""
+    epoch, sep, seq = value.partition('.')
+    if not sep or not epoch or not seq.isdigit():
+        raise ValueError(f"Cursor inválido: {value}")
+    return epoch, int(seq)
@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.routing import Match
+
+# Import compatível com Windows e Linux
+try:
+    from backend.pool import current_endpoint
+except ModuleNotFoundError:
+    from pool import current_endpoint
+
+
+class AsyncDatabase:
+    """Versão assíncrona do Database: cada chamada roda num pool de threads dedicado, fora do event loop
+
+    Uso: await adb.get_all_cycles() equivale a db.get_all_cycles() sem bloquear o loop.
+    """
+
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        # Uma thread por conexão de leitura, mais uma para o escritor
+        self.max_workers = max_workers or db.pool.size + 1
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pomodoro-db")
+
+    async def run(self, fn, *args, **kwargs):
+        """Executa fn no pool de threads preservando os contextvars (ex.: endpoint atual)"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, fn, *args, **kwargs)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def iterate(self, iterable):
+        """Consome um gerador síncrono (ex.: db.iter_sessions) item a item no pool de threads"""
+        iterator = iter(iterable)
+        done = object()
+        try:
+            while True:
+                item = await self.run(next, iterator, done)
+                if item is done:
+                    break
+                yield item
+        finally:
+            # Cliente desconectou no meio do streaming: fecha o gerador e devolve a conexão
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                await self.run(close)
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def route_label(scope):
+    """Identifica a rota pelo template do path (ex.: GET /api/cycles/{cycle_id})
+
+    Paths sem rota ficam todos sob o mesmo rótulo, para que varreduras de URLs não criem
+    um rótulo (e uma série nas métricas) por path.
+    """
+    app = scope.get("app")
+    if app is not None:
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+    return f"{scope['method']} (sem rota)"
+
+
+class EndpointMiddleware:
+    """Middleware ASGI: marca o endpoint atual e aplica limites de concorrência por rota
+
+    limits mapeia o rótulo da rota (ex.: "GET /api/stats/patterns") para o número máximo de
+    requisições simultâneas. Requisições excedentes esperam na fila até queue_timeout segundos
+    e depois recebem 503. O limite vale até o fim da resposta, inclusive em streaming.
+
+    Com metrics (backend/metrics.py), registra a duração de cada requisição (fila incluída),
+    o status e os contadores de banco da requisição.
+    """
+
+    def __init__(self, app, limits=None, queue_timeout=10.0, metrics=None):
+        self.app = app
+        self.limits = dict(limits or {})
+        self.queue_timeout = queue_timeout
+        self.metrics = metrics
+        self._semaphores = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        label = route_label(scope)
+        if self.metrics is None:
+            await self._dispatch(label, scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        request = self.metrics.start_request()
+        stats = request[0]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                stats.status = message["status"]
+            await send(message)
+
+        try:
+            await self._dispatch(label, scope, receive, send_with_status)
+        finally:
+            self.metrics.finish_request(label, started, request)
+
+    async def _dispatch(self, label, scope, receive, send):
+        token = current_endpoint.set(label)
+        try:
+            limit = self.limits.get(label)
+            if limit is None:
+                await self.app(scope, receive, send)
+                return
+
+            semaphore = self._semaphores.setdefault(label, asyncio.Semaphore(limit))
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                await self._reject(send, label)
+                return
+
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                semaphore.release()
+        finally:
+            current_endpoint.reset(token)
+
+    async def _reject(self, send, label):
+        body = json.dumps({"detail": f"Muitas requisições simultâneas em {label}, tente novamente"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,21 +1,193 @@
+import base64
 import json
+import os
 import sqlite3
-from datetime import datetime
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Import compatível com Windows e Linux
+try:
+    from backend.migrations import SCHEMA_VERSION, apply_migrations, get_schema_version
+    from backend.pool import STORAGE_PROFILES, ConnectionPool, SingleWriter
+    from backend.localtime import (EPOCH_SQL, MAX_UTC_OFFSET, MIN_UTC_OFFSET, WEEKDAY_SQL, date_to_day,
+                                   day_start, day_to_date, local_day, parse_epoch, read_utc_offset,
+                                   validate_instant)
+    from backend.rollups import rebuild_rollups, rebuild_summary
+    from backend.changelog import (SYNC_TABLES, StaleCursorError, format_cursor, parse_cursor,
+                                   read_sync_position, renew_sync_epoch)
+    from backend.versions import advance_table_versions, read_table_versions, read_version_total
+except ModuleNotFoundError:
+    from migrations import SCHEMA_VERSION, apply_migrations, get_schema_version
+    from pool import STORAGE_PROFILES, ConnectionPool, SingleWriter
+    from localtime import (EPOCH_SQL, MAX_UTC_OFFSET, MIN_UTC_OFFSET, WEEKDAY_SQL, date_to_day,
+                           day_start, day_to_date, local_day, parse_epoch, read_utc_offset,
+                           validate_instant)
+    from rollups import rebuild_rollups, rebuild_summary
+    from changelog import (SYNC_TABLES, StaleCursorError, format_cursor, parse_cursor,
+                           read_sync_position, renew_sync_epoch)
+    from versions import advance_table_versions, read_table_versions, read_version_total
 
 
 class Database:
-    def __init__(self, db_path="pomodoro.db"):
+    def __init__(self, db_path="pomodoro.db", pool_size=5, pool_timeout=10.0, pragmas=None,
+                 profile='wal', single_writer=False, connection_factory=None, shared=False):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Perfil de armazenamento desconhecido: {profile}")
+        
         self.db_path = db_path
+        self.profile = profile
+        
+        # PRAGMAs explícitos sobrescrevem os do perfil
+        pragmas = {**STORAGE_PROFILES[profile], **(pragmas or {})}
+        # connection_factory: classe das conexões SQLite (ex.: Metrics.connection_class())
+        self.pool = ConnectionPool(db_path, size=pool_size, timeout=pool_timeout, pragmas=pragmas,
+                                   factory=connection_factory)
+        
+        # Escritor único opcional: serializa as escritas sem ocupar o pool dos leitores
+        self.writer = SingleWriter(self.pool.open_connection) if single_writer else None
+        
+        # Versão dos dados: muda a cada transação que altera alguma linha (invalida caches)
+        self._data_version = 0
+        self._version_lock = threading.Lock()
+        
+        # Fuso do usuário em minutos (cópia de user_settings, atualizada por set_utc_offset)
+        self._utc_offset = 0
+        
+        # Vários processos no mesmo arquivo (ver "SINCRONIZAÇÃO ENTRE PROCESSOS"); ligado depois
+        # do init_db, que pode estar criando table_versions
+        self.shared = False
+        self._commit_lock = threading.Lock()
+        self._own_changes = 0  # incrementos de table_versions confirmados por este processo
+        self._seen_total = None  # total da última leitura (recarrega o fuso quando muda)
+        self._polled_total = None  # total da última chamada a poll_external_changes
+        
         self.init_db()
+        
+        if shared:
+            with self.connection() as conn:
+                self._polled_total = read_version_total(conn.cursor())
+            self.shared = True
+    
+    @contextmanager
+    def connection(self):
+        """Empresta uma conexão do pool para leituras"""
+        with self.pool.connection() as conn:
+            yield conn
+    
+    @contextmanager
+    def transaction(self):
+        """Abre uma transação de escrita (commit ou rollback automáticos)"""
+        source = self.writer if self.writer is not None else self.pool
+        
+        with source.connection() as conn:
+            # IMMEDIATE reserva a escrita logo no início e evita deadlock na promoção do lock
+            conn.execute('BEGIN IMMEDIATE')
+            changes = conn.total_changes
+            before = read_version_total(conn.cursor()) if self.shared else None
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+            
+            if before is None:
+                conn.commit()
+            else:
+                # Ainda com o lock de escrita: a diferença é só desta transação
+                after = read_version_total(conn.cursor())
+                with self._commit_lock:
+                    conn.commit()
+                    self._own_changes += after - before
+            
+            if conn.total_changes != changes:
+                self._bump_data_version()
+    
+    def _bump_data_version(self):
+        with self._version_lock:
+            self._data_version += 1
+    
+    @property
+    def data_version(self):
+        """Contador incrementado a cada escrita confirmada"""
+        return self._data_version
+    
+    def get_table_versions(self):
+        """Retorna a versão de modificação de cada tabela rastreada (ver backend/versions.py)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            versions = read_table_versions(cursor)
+            if self.shared:
+                self._observe_total(cursor, sum(versions.values()))
+            return versions
+    
+    # ===== SINCRONIZAÇÃO ENTRE PROCESSOS =====
+    # Com vários workers no mesmo arquivo, data_version e a cópia do fuso só veem as escritas
+    # do próprio processo. table_versions é mantida por triggers e vale para todos: a soma das
+    # versões muda a cada escrita, venha de onde vier.
+    
+    def shared_version(self):
+        """Versão dos dados válida entre processos (soma de table_versions)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            total = read_version_total(cursor)
+            self._observe_total(cursor, total)
+            return total
+    
+    def poll_external_changes(self):
+        """Retorna True se outro processo alterou o banco desde a chamada anterior
+        
+        Desconta do total os incrementos das transações deste processo; a leitura e a
+        contagem ficam sob o mesmo lock do commit, então nenhuma escrita local fica de fora.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            with self._commit_lock:
+                total = read_version_total(cursor)
+                own, self._own_changes = self._own_changes, 0
+            
+            previous, self._polled_total = self._polled_total, total
+            external = total != previous + own
+            if external:
+                self._bump_data_version()
+            self._observe_total(cursor, total)
+            return external
     
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
+    def _observe_total(self, cursor, total):
+        # O fuso só muda junto com table_versions (ver set_utc_offset)
+        if total != self._seen_total:
+            self._seen_total = total
+            self._utc_offset = read_utc_offset(cursor)
+    
+    def pool_stats(self):
+        """Retorna os contadores do pool e do escritor único"""
+        stats = self.pool.stats()
+        stats['profile'] = self.profile
+        stats['writer'] = self.writer.stats() if self.writer is not None else None
+        return stats
+    
+    def close(self):
+        """Fecha as conexões ociosas do pool e a conexão do escritor único"""
+        self.pool.close_all()
+        if self.writer is not None:
+            self.writer.close()
     
     def init_db(self):
-        """Inicializa o banco de dados com as tabelas necessárias"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        """Inicializa o banco de dados com as tabelas necessárias e aplica as migrações pendentes"""
+        with self.transaction() as conn:
+            return self._init_schema(conn.cursor())
+    
+    def _init_schema(self, cursor):
+        self._create_tables(cursor)
+        applied = apply_migrations(cursor)
+        self._utc_offset = read_utc_offset(cursor)
+        return applied
+    
+    def schema_version(self):
+        """Retorna a versão do schema registrada em schema_version"""
+        with self.connection() as conn:
+            return get_schema_version(conn.cursor())
+    
+    def _create_tables(self, cursor):
         # Tabela de ciclos
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS cycles (
@@ -67,18 +239,14 @@ class Database:
                 UNIQUE(date)
             )
         ''')
-        
-        conn.commit()
-        conn.close()
     
     # ===== CYCLES =====
     
     def create_cycle(self, cycle_data):
         """Cria um novo ciclo (ou atualiza se já existir)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
             cursor.execute('''
                 INSERT OR REPLACE INTO cycles (id, name, study_days, created_at, week_start_date, is_active)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -90,147 +258,124 @@ class Database:
                 cycle_data['week_start_date'],
                 1 if cycle_data.get('is_active', False) else 0
             ))
-            
-            conn.commit()
-            return cycle_data
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+        
+        return cycle_data
     
     def get_all_cycles(self):
         """Retorna todos os ciclos"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM cycles')
-        rows = cursor.fetchall()
-        
-        cycles = []
-        for row in rows:
-            cycle = {
-                'id': row[0],
-                'name': row[1],
-                'study_days': json.loads(row[2]),
-                'created_at': row[3],
-                'week_start_date': row[4],
-                'is_active': bool(row[5]),
-                'subjects': self.get_subjects_by_cycle(row[0])
-            }
-            cycles.append(cycle)
-        
-        conn.close()
-        return cycles
+        with self.connection() as conn:
+            return self._load_cycles(conn.cursor())
     
     def get_cycle_by_id(self, cycle_id):
         """Retorna um ciclo específico"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM cycles WHERE id = ?', (cycle_id,))
-        row = cursor.fetchone()
+        with self.connection() as conn:
+            cycles = self._load_cycles(conn.cursor(), 'WHERE c.id = ?', (cycle_id,))
         
-        if not row:
-            conn.close()
-            return None
-        
-        cycle = {
-            'id': row[0],
-            'name': row[1],
-            'study_days': json.loads(row[2]),
-            'created_at': row[3],
-            'week_start_date': row[4],
-            'is_active': bool(row[5]),
-            'subjects': self.get_subjects_by_cycle(row[0])
-        }
-        
-        conn.close()
-        return cycle
+        return cycles[0] if cycles else None
     
     def get_active_cycle(self):
         """Retorna o ciclo ativo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM cycles WHERE is_active = 1 LIMIT 1')
-        row = cursor.fetchone()
+        with self.connection() as conn:
+            cycles = self._load_cycles(
+                conn.cursor(),
+                'WHERE c.id = (SELECT id FROM cycles WHERE is_active = 1 LIMIT 1)'
+            )
         
-        if not row:
-            conn.close()
-            return None
+        return cycles[0] if cycles else None
+    
+    def _load_cycles(self, cursor, where='', params=()):
+        """Carrega ciclos e suas disciplinas numa única query (LEFT JOIN), sem N+1"""
+        cursor.execute(f'''
+            SELECT 
+                c.id, c.name, c.study_days, c.created_at, c.week_start_date, c.is_active,
+                s.id, s.cycle_id, s.name, s.weekly_hours, s.color, s.priority,
+                s.current_week_minutes, s.total_minutes, s.total_sessions
+            FROM cycles c
+            LEFT JOIN subjects s ON s.cycle_id = c.id
+            {where}
+            ORDER BY c.rowid, s.rowid
+        ''', params)
         
-        cycle = {
-            'id': row[0],
-            'name': row[1],
-            'study_days': json.loads(row[2]),
-            'created_at': row[3],
-            'week_start_date': row[4],
-            'is_active': bool(row[5]),
-            'subjects': self.get_subjects_by_cycle(row[0])
-        }
+        cycles = []
+        for row in cursor.fetchall():
+            if not cycles or cycles[-1]['id'] != row[0]:
+                cycles.append({
+                    'id': row[0],
+                    'name': row[1],
+                    'study_days': json.loads(row[2]),
+                    'created_at': row[3],
+                    'week_start_date': row[4],
+                    'is_active': bool(row[5]),
+                    'subjects': []
+                })
+            
+            # Ciclo sem disciplinas: o LEFT JOIN traz as colunas da disciplina nulas
+            if row[6] is not None:
+                cycles[-1]['subjects'].append(self._subject_from_row(row[6:]))
         
-        conn.close()
-        return cycle
+        return cycles
     
     def set_active_cycle(self, cycle_id):
         """Define um ciclo como ativo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Desativar todos os ciclos
-        cursor.execute('UPDATE cycles SET is_active = 0')
-        
-        # Ativar o ciclo especificado
-        cursor.execute('UPDATE cycles SET is_active = 1 WHERE id = ?', (cycle_id,))
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Desativar todos os ciclos
+            cursor.execute('UPDATE cycles SET is_active = 0')
+            
+            # Ativar o ciclo especificado
+            cursor.execute('UPDATE cycles SET is_active = 1 WHERE id = ?', (cycle_id,))
         
-        conn.commit()
-        conn.close()
         return True
     
     def update_cycle(self, cycle_id, cycle_data):
         """Atualiza um ciclo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE cycles 
+                SET name = ?, study_days = ?, week_start_date = ?
+                WHERE id = ?
+            ''', (
+                cycle_data['name'],
+                json.dumps(cycle_data['study_days']),
+                cycle_data.get('week_start_date', ''),
+                cycle_id
+            ))
         
-        cursor.execute('''
-            UPDATE cycles 
-            SET name = ?, study_days = ?, week_start_date = ?
-            WHERE id = ?
-        ''', (
-            cycle_data['name'],
-            json.dumps(cycle_data['study_days']),
-            cycle_data.get('week_start_date', ''),
-            cycle_id
-        ))
-        
-        conn.commit()
-        conn.close()
         return True
     
     def delete_cycle(self, cycle_id):
         """Deleta um ciclo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM cycles WHERE id = ?', (cycle_id,))
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM cycles WHERE id = ?', (cycle_id,))
         
-        conn.commit()
-        conn.close()
         return True
     
     # ===== SUBJECTS =====
     
     def create_subject(self, subject_data):
-        """Cria uma nova disciplina (ou atualiza se já existir)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Cria uma nova disciplina (ou atualiza se já existir) e retorna a versão gravada
         
-        try:
+        Os contadores só valem na criação: numa disciplina existente quem os mantém são as
+        sessões, e uma aba desatualizada não pode sobrescrevê-los.
+        """
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
             cursor.execute('''
-                INSERT OR REPLACE INTO subjects 
+                INSERT INTO subjects 
                 (id, cycle_id, name, weekly_hours, color, priority, current_week_minutes, total_minutes, total_sessions)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    cycle_id = excluded.cycle_id,
+                    name = excluded.name,
+                    weekly_hours = excluded.weekly_hours,
+                    color = excluded.color,
+                    priority = excluded.priority
             ''', (
                 subject_data['id'],
                 subject_data['cycle_id'],
@@ -243,140 +388,217 @@ class Database:
                 subject_data.get('total_sessions', subject_data.get('totalSessions', 0))
             ))
             
-            conn.commit()
-            return subject_data
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+            return self._fetch_subject(cursor, subject_data['id'])
     
     def get_subjects_by_cycle(self, cycle_id):
         """Retorna todas as disciplinas de um ciclo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        with self.connection() as conn:
+            return self._fetch_subjects(conn.cursor(), cycle_id)
+    
+    def _fetch_subjects(self, cursor, cycle_id):
+        """Busca as disciplinas de um ciclo usando o cursor de quem chamou"""
         cursor.execute('SELECT * FROM subjects WHERE cycle_id = ?', (cycle_id,))
-        rows = cursor.fetchall()
-        
-        subjects = []
-        for row in rows:
-            subject = {
-                'id': row[0],
-                'cycle_id': row[1],
-                'name': row[2],
-                'weeklyHours': row[3],
-                'color': row[4],
-                'priority': row[5],
-                'currentWeekMinutes': row[6],
-                'totalMinutes': row[7],
-                'totalSessions': row[8]
-            }
-            subjects.append(subject)
-        
-        conn.close()
-        return subjects
+        return [self._subject_from_row(row) for row in cursor.fetchall()]
+    
+    def _subject_from_row(self, row):
+        return {
+            'id': row[0],
+            'cycle_id': row[1],
+            'name': row[2],
+            'weeklyHours': row[3],
+            'color': row[4],
+            'priority': row[5],
+            'currentWeekMinutes': row[6],
+            'totalMinutes': row[7],
+            'totalSessions': row[8]
+        }
+    
+    def get_subject(self, subject_id):
+        """Retorna uma disciplina, com os contadores atuais"""
+        with self.connection() as conn:
+            return self._fetch_subject(conn.cursor(), subject_id)
+    
+    def _fetch_subject(self, cursor, subject_id):
+        cursor.execute('SELECT * FROM subjects WHERE id = ?', (subject_id,))
+        row = cursor.fetchone()
+        return self._subject_from_row(row) if row else None
     
     def update_subject(self, subject_id, subject_data):
-        """Atualiza uma disciplina"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Atualiza uma disciplina e retorna a versão gravada
         
-        cursor.execute('''
-            UPDATE subjects 
-            SET name = ?, weekly_hours = ?, color = ?, priority = ?, 
-                current_week_minutes = ?, total_minutes = ?, total_sessions = ?
-            WHERE id = ?
-        ''', (
-            subject_data['name'],
-            subject_data['weeklyHours'],
-            subject_data['color'],
-            subject_data['priority'],
-            subject_data.get('currentWeekMinutes', 0),
-            subject_data.get('totalMinutes', 0),
-            subject_data.get('totalSessions', 0),
-            subject_id
-        ))
-        
-        conn.commit()
-        conn.close()
-        return True
+        Contadores ausentes (None) são preservados: quem os mantém é create_session.
+        """
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE subjects 
+                SET name = ?, weekly_hours = ?, color = ?, priority = ?, 
+                    current_week_minutes = COALESCE(?, current_week_minutes),
+                    total_minutes = COALESCE(?, total_minutes),
+                    total_sessions = COALESCE(?, total_sessions)
+                WHERE id = ?
+            ''', (
+                subject_data['name'],
+                subject_data['weeklyHours'],
+                subject_data['color'],
+                subject_data['priority'],
+                subject_data.get('currentWeekMinutes'),
+                subject_data.get('totalMinutes'),
+                subject_data.get('totalSessions'),
+                subject_id
+            ))
+            
+            return self._fetch_subject(cursor, subject_id)
     
     def delete_subject(self, subject_id):
         """Deleta uma disciplina"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM subjects WHERE id = ?', (subject_id,))
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM subjects WHERE id = ?', (subject_id,))
         
-        conn.commit()
-        conn.close()
         return True
     
     def reset_week_minutes(self, cycle_id):
         """Reseta os minutos semanais de todas as disciplinas de um ciclo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE subjects 
-            SET current_week_minutes = 0 
-            WHERE cycle_id = ?
-        ''', (cycle_id,))
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE subjects 
+                SET current_week_minutes = 0 
+                WHERE cycle_id = ?
+            ''', (cycle_id,))
         
-        conn.commit()
-        conn.close()
         return True
     
     # ===== SESSIONS =====
     
+    # Sessões com idempotency_key já gravada são ignoradas (reenvio da fila offline)
+    # Os instantes inteiros são calculados pelo SQLite a partir do mesmo texto (?3 e ?4)
+    INSERT_SESSION_SQL = f'''
+        INSERT INTO study_sessions
+        (subject_id, minutes, started_at, completed_at, idempotency_key, started_ts, completed_ts)
+        VALUES (?1, ?2, ?3, ?4, ?5, {EPOCH_SQL.format('?3')}, {EPOCH_SQL.format('?4')})
+        ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+    '''
+    
+    # Contadores da disciplina somados na mesma transação da sessão (sem ler e regravar a linha)
+    ADD_TO_SUBJECT_SQL = '''
+        UPDATE subjects
+        SET current_week_minutes = current_week_minutes + ?,
+            total_minutes = total_minutes + ?,
+            total_sessions = total_sessions + ?
+        WHERE id = ?
+    '''
+    
     def create_session(self, session_data):
-        """Registra uma sessão de estudo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Registra uma sessão de estudo
+        
+        Retorna (criada, disciplina com os contadores atualizados, primeira sessão da disciplina);
+        criada é False quando a idempotency_key já estava gravada e a sessão foi ignorada.
+        A primeira sessão é conferida em study_sessions, não nos contadores da disciplina
+        (que o cliente pode ter enviado na criação).
+        """
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                'SELECT EXISTS (SELECT 1 FROM study_sessions WHERE subject_id = ?)', (session_data['subject_id'],)
+            )
+            had_sessions = cursor.fetchone()[0]
+            
+            cursor.execute(self.INSERT_SESSION_SQL, self._session_params(session_data))
+            
+            # rowcount 0: idempotency_key repetida, a sessão já foi contada
+            created = cursor.rowcount > 0
+            if created:
+                minutes = session_data['minutes']
+                cursor.execute(self.ADD_TO_SUBJECT_SQL, (minutes, minutes, 1, session_data['subject_id']))
+            
+            return created, self._fetch_subject(cursor, session_data['subject_id']), created and not had_sessions
+    
+    def create_sessions(self, sessions, chunk_size=500):
+        """Registra várias sessões numa única transação
         
-        cursor.execute('''
-            INSERT INTO study_sessions (subject_id, minutes, started_at, completed_at)
-            VALUES (?, ?, ?, ?)
-        ''', (
+        Retorna um resultado por sessão, na ordem recebida: 'created' com o id da nova linha,
+        ou 'duplicate' com o id já gravado (idempotency_key já existente ou repetida no
+        próprio lote, caso em que o id é o da primeira ocorrência).
+        """
+        results = [None] * len(sessions)
+        
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Chaves já gravadas, consultadas em blocos (limite de parâmetros do SQLite)
+            keys = list({s['idempotency_key'] for s in sessions if s.get('idempotency_key')})
+            existing = {}
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start + chunk_size]
+                cursor.execute(f'''
+                    SELECT idempotency_key, id FROM study_sessions
+                    WHERE idempotency_key IN ({', '.join('?' * len(chunk))})
+                ''', chunk)
+                existing.update(cursor.fetchall())
+            
+            totals = {}
+            for index, session_data in enumerate(sessions):
+                key = session_data.get('idempotency_key')
+                if key in existing:
+                    results[index] = {'status': 'duplicate', 'id': existing[key]}
+                    continue
+                
+                # Uma execução por sessão para ter o id (lastrowid); as chaves repetidas já
+                # foram descartadas, então toda execução insere
+                cursor.execute(self.INSERT_SESSION_SQL, self._session_params(session_data))
+                results[index] = {'status': 'created', 'id': cursor.lastrowid}
+                if key:
+                    existing[key] = cursor.lastrowid
+                
+                minutes, count = totals.get(session_data['subject_id'], (0, 0))
+                totals[session_data['subject_id']] = (minutes + session_data['minutes'], count + 1)
+            
+            cursor.executemany(self.ADD_TO_SUBJECT_SQL, [
+                (minutes, minutes, count, subject_id)
+                for subject_id, (minutes, count) in totals.items()
+            ])
+        
+        return results
+    
+    def _session_params(self, session_data):
+        # Também vale para sync e importação, que não passam pelo modelo da API
+        return (
             session_data['subject_id'],
             session_data['minutes'],
-            session_data['started_at'],
-            session_data['completed_at']
-        ))
-        
-        conn.commit()
-        conn.close()
-        return True
+            validate_instant(session_data['started_at']),
+            validate_instant(session_data['completed_at']),
+            session_data.get('idempotency_key') or None
+        )
     
     # ===== STATS =====
     
     def get_or_create_stats(self, date):
         """Retorna ou cria estatísticas para uma data"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM stats WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        
-        if row:
-            stats = {
-                'date': row[1],
-                'completedSessions': row[2],
-                'totalFocusTime': row[3],
-                'totalBreakTime': row[4]
-            }
-            conn.close()
-            return stats
-        
-        # Criar novo registro
-        cursor.execute('''
-            INSERT INTO stats (date, completed_sessions, total_focus_time, total_break_time)
-            VALUES (?, 0, 0, 0)
-        ''', (date,))
-        
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT * FROM stats WHERE date = ?', (date,))
+            row = cursor.fetchone()
+            
+            if row:
+                return {
+                    'date': row[1],
+                    'completedSessions': row[2],
+                    'totalFocusTime': row[3],
+                    'totalBreakTime': row[4]
+                }
+            
+            # Criar novo registro
+            cursor.execute('''
+                INSERT INTO stats (date, completed_sessions, total_focus_time, total_break_time)
+                VALUES (?, 0, 0, 0)
+            ''', (date,))
         
         return {
             'date': date,
@@ -387,82 +609,120 @@ class Database:
     
     def update_stats(self, date, stats_data):
         """Atualiza estatísticas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE stats 
+                SET completed_sessions = ?, total_focus_time = ?, total_break_time = ?
+                WHERE date = ?
+            ''', (
+                stats_data['completedSessions'],
+                stats_data['totalFocusTime'],
+                stats_data['totalBreakTime'],
+                date
+            ))
         
-        cursor.execute('''
-            UPDATE stats 
-            SET completed_sessions = ?, total_focus_time = ?, total_break_time = ?
-            WHERE date = ?
-        ''', (
-            stats_data['completedSessions'],
-            stats_data['totalFocusTime'],
-            stats_data['totalBreakTime'],
-            date
-        ))
-        
-        conn.commit()
-        conn.close()
         return True
     
-    # ===== ANALYTICS & DASHBOARD =====
+    # ===== SETTINGS =====
+    # Ver backend/localtime.py
     
-    def get_general_stats(self):
-        """Retorna estatísticas gerais"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Total de minutos estudados
-        cursor.execute('SELECT SUM(minutes) FROM study_sessions')
-        total_minutes = cursor.fetchone()[0] or 0
-        
-        # Total de sessões
-        cursor.execute('SELECT COUNT(*) FROM study_sessions')
-        total_sessions = cursor.fetchone()[0] or 0
-        
-        # Total de disciplinas
-        cursor.execute('SELECT COUNT(DISTINCT subject_id) FROM study_sessions')
-        total_subjects = cursor.fetchone()[0] or 0
-        
-        # Sequência de dias consecutivos (streak)
-        cursor.execute('''
-            SELECT DISTINCT DATE(started_at) as study_date 
-            FROM study_sessions 
-            ORDER BY study_date DESC
-        ''')
-        dates = [row[0] for row in cursor.fetchall()]
-        
-        current_streak = 0
-        if dates:
-            from datetime import timedelta
-            today = datetime.now().date()
+    @property
+    def utc_offset(self):
+        """Fuso do usuário em minutos (ex.: -180 para UTC-03:00)"""
+        return self._utc_offset
+    
+    def local_today(self):
+        """Dia de hoje no fuso do usuário (dias desde 1970-01-01)"""
+        return local_day(self._utc_offset)
+    
+    def get_settings(self):
+        """Retorna as preferências do usuário"""
+        with self.connection() as conn:
+            return {'utcOffsetMinutes': read_utc_offset(conn.cursor())}
+    
+    def set_utc_offset(self, minutes):
+        """Define o fuso do usuário e recalcula os agregados nos dias e horas do novo fuso
+        
+        Retorna False se o fuso já era esse.
+        """
+        if not MIN_UTC_OFFSET <= minutes <= MAX_UTC_OFFSET:
+            raise ValueError(f"Fuso inválido: {minutes} minutos")
+        
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            if read_utc_offset(cursor) == minutes:
+                return False
             
-            for i, date_str in enumerate(dates):
-                date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                expected_date = today - timedelta(days=i)
-                
-                if date == expected_date:
-                    current_streak += 1
-                else:
-                    break
+            cursor.execute('UPDATE user_settings SET utc_offset_minutes = ? WHERE id = 1', (minutes,))
+            rebuild_rollups(cursor)
+            
+            # As estatísticas mudam sem nenhuma sessão mudar: invalida os ETags que dependem delas
+            cursor.execute("UPDATE table_versions SET version = version + 1 WHERE name = 'study_sessions'")
         
-        conn.close()
+        self._utc_offset = minutes
+        return True
+    
+    # ===== ANALYTICS & DASHBOARD =====
+    # Os métodos abaixo leem apenas session_rollups (ver backend/rollups.py)
+    
+    def rebuild_rollups(self):
+        """Recalcula os agregados do dashboard a partir das sessões brutas
+        
+        As triggers aplicam o DELETE + INSERT em session_rollups como deltas nos totais e nas
+        sequências, que manteriam qualquer divergência: por isso são recalculados em seguida.
+        Retorna o número de células de session_rollups.
+        """
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cells = rebuild_rollups(cursor)
+            rebuild_summary(cursor)
+            return cells
+    
+    def get_general_stats(self):
+        """Retorna estatísticas gerais
+        
+        Uma única consulta sobre os totais e as sequências mantidos por triggers
+        (backend/rollups.py): o custo não cresce com o histórico. totalSubjects conta as
+        disciplinas distintas em study_sessions, então o ETag só depende das sessões.
+        """
+        today = self.local_today()
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            # Disciplinas distintas nas sessões (inclusive de disciplinas já removidas), pulando
+            # de uma disciplina para a seguinte no índice (subject_id, started_ts)
+            cursor.execute('''
+                WITH RECURSIVE distinct_subjects(id) AS (
+                    SELECT MIN(subject_id) FROM study_sessions
+                    UNION ALL
+                    SELECT (SELECT MIN(subject_id) FROM study_sessions WHERE subject_id > d.id)
+                    FROM distinct_subjects d WHERE d.id IS NOT NULL
+                )
+                SELECT
+                    t.minutes,
+                    t.sessions,
+                    (SELECT COUNT(*) FROM distinct_subjects WHERE id IS NOT NULL),
+                    -- Sequência atual: só conta se houve estudo hoje
+                    (SELECT ? - start_day + 1 FROM streak_runs WHERE end_day = ?),
+                    (SELECT end_day - start_day + 1 FROM streak_runs ORDER BY end_day - start_day DESC LIMIT 1)
+                FROM session_totals t
+                WHERE t.id = 1
+            ''', (today, today))
+            total_minutes, total_sessions, total_subjects, current_streak, longest_streak = cursor.fetchone()
         
         return {
             'totalMinutes': total_minutes,
             'totalSessions': total_sessions,
             'totalSubjects': total_subjects,
-            'currentStreak': current_streak
+            'currentStreak': current_streak or 0,
+            'longestStreak': longest_streak or 0
         }
     
     def get_chart_data(self, period='week', subject_id='all'):
         """Retorna dados para gráficos"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         # Determinar período
-        from datetime import timedelta
-        
         if period == 'week':
             days = 7
         elif period == 'month':
@@ -470,34 +730,33 @@ class Database:
         else:
             days = 365
         
-        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        start_day = self.local_today() - days
         
         # Query base
         query = '''
-            SELECT DATE(started_at) as date, SUM(minutes) as total_minutes
-            FROM study_sessions
-            WHERE started_at >= ?
+            SELECT day, SUM(minutes) as total_minutes
+            FROM session_rollups
+            WHERE day >= ?
         '''
-        params = [start_date]
+        params = [start_day]
         
         if subject_id != 'all':
             query += ' AND subject_id = ?'
             params.append(subject_id)
         
-        query += ' GROUP BY DATE(started_at) ORDER BY date'
-        
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        query += ' GROUP BY day ORDER BY day'
         
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            results = cursor.fetchall()
         
         # Formatar dados
         labels = []
         data = []
         
         for row in results:
-            date = datetime.strptime(row[0], '%Y-%m-%d')
-            labels.append(date.strftime('%d/%m'))
+            labels.append(day_to_date(row[0]).strftime('%d/%m'))
             data.append(row[1] / 60)  # Converter para horas
         
         return {
@@ -518,75 +777,72 @@ class Database:
     
     def get_heatmap_data(self):
         """Retorna dados para heatmap de atividade"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Buscar sessões dos últimos 30 dias
-        from datetime import timedelta
-        start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-        
-        cursor.execute('''
-            SELECT started_at, minutes
-            FROM study_sessions
-            WHERE started_at >= ?
-        ''', (start_date,))
-        
-        sessions = cursor.fetchall()
-        conn.close()
+        # Agregados dos últimos 30 dias, já somados por dia da semana e hora
+        start_day = self.local_today() - 30
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {WEEKDAY_SQL.format(day='day')} AS weekday, hour, SUM(heat_units)
+                FROM session_rollups
+                WHERE day >= ? AND hour BETWEEN 6 AND 22
+                GROUP BY weekday, hour
+            ''', (start_day,))
+            
+            cells = cursor.fetchall()
         
         # Criar matriz 7 dias x 17 horas (6h-22h)
         heatmap = [[0 for _ in range(17)] for _ in range(7)]
         
-        for session in sessions:
-            dt = datetime.fromisoformat(session[0])
-            day_of_week = dt.weekday()  # 0 = Segunda
-            hour = dt.hour
-            
-            if 6 <= hour <= 22:
-                hour_index = hour - 6
-                heatmap[day_of_week][hour_index] += session[1] // 15  # Intensidade
+        for day_of_week, hour, intensity in cells:
+            heatmap[day_of_week][hour - 6] = intensity
         
         return heatmap
     
     def get_study_patterns(self):
         """Retorna análise de padrões de estudo"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        from collections import defaultdict
-        
-        # Buscar todas as sessões
-        cursor.execute('''
-            SELECT started_at, minutes
-            FROM study_sessions
-        ''')
-        sessions = cursor.fetchall()
-        
-        if not sessions:
-            conn.close()
-            return {
-                'bestTime': '14:00 - 16:00',
-                'bestTimeMinutes': 0,
-                'bestDay': 'Segunda-feira',
-                'bestDayMinutes': 0,
-                'avgDuration': 25,
-                'completionRate': 0
-            }
-        
-        # Análise por horário
-        hour_stats = defaultdict(int)
-        day_stats = defaultdict(int)
-        durations = []
-        
-        for session in sessions:
-            dt = datetime.fromisoformat(session[0])
-            hour = dt.hour
-            day = dt.weekday()
-            minutes = session[1]
-            
-            hour_stats[hour] += minutes
-            day_stats[day] += minutes
-            durations.append(minutes)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT minutes, sessions FROM session_totals WHERE id = 1')
+            total_minutes, total_sessions = cursor.fetchone()
+            
+            if not total_sessions:
+                return {
+                    'bestTime': '14:00 - 16:00',
+                    'bestTimeMinutes': 0,
+                    'bestDay': 'Segunda-feira',
+                    'bestDayMinutes': 0,
+                    'avgDuration': 25,
+                    'completionRate': 0
+                }
+            
+            # Análise por horário (soma por dia e hora primeiro, na ordem da chave primária:
+            # só as linhas já somadas passam pela ordenação do GROUP BY hour)
+            cursor.execute('''
+                SELECT hour, SUM(minutes)
+                FROM (
+                    SELECT day, hour, SUM(minutes) AS minutes
+                    FROM session_rollups
+                    GROUP BY day, hour
+                )
+                GROUP BY hour
+                ORDER BY hour
+            ''')
+            hour_stats = dict(cursor.fetchall())
+            
+            # Análise por dia da semana (soma por dia primeiro, pelo mesmo motivo)
+            cursor.execute(f'''
+                SELECT {WEEKDAY_SQL.format(day='day')} AS weekday, SUM(minutes)
+                FROM (
+                    SELECT day, SUM(minutes) AS minutes
+                    FROM session_rollups
+                    GROUP BY day
+                )
+                GROUP BY weekday
+                ORDER BY weekday
+            ''')
+            day_stats = dict(cursor.fetchall())
         
         # Melhor horário (intervalo de 2 horas)
         best_hour = max(hour_stats.keys(), key=lambda x: hour_stats[x]) if hour_stats else 14
@@ -601,13 +857,11 @@ class Database:
         best_day_minutes = day_stats[best_day_index] if day_stats else 0
         
         # Duração média
-        avg_duration = sum(durations) // len(durations) if durations else 25
+        avg_duration = total_minutes // total_sessions
         
         # Taxa de conclusão (assumindo 25 min como meta)
         completion_rate = int((avg_duration / 25) * 100) if avg_duration else 0
         
-        conn.close()
-        
         return {
             'bestTime': best_time,
             'bestTimeMinutes': best_time_minutes,
@@ -619,24 +873,22 @@ class Database:
     
     def get_subject_ranking(self):
         """Retorna ranking de disciplinas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                s.id,
-                s.name,
-                s.weekly_hours,
-                s.current_week_minutes,
-                COUNT(ss.id) as sessions
-            FROM subjects s
-            LEFT JOIN study_sessions ss ON s.id = ss.subject_id
-            GROUP BY s.id
-            ORDER BY s.current_week_minutes DESC
-        ''')
-        
-        subjects = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT 
+                    s.id,
+                    s.name,
+                    s.weekly_hours,
+                    s.current_week_minutes,
+                    COUNT(ss.id) as sessions
+                FROM subjects s
+                LEFT JOIN study_sessions ss ON s.id = ss.subject_id
+                GROUP BY s.id
+                ORDER BY s.current_week_minutes DESC
+            ''')
+            
+            subjects = cursor.fetchall()
         
         ranking = []
         for subject in subjects:
@@ -652,45 +904,616 @@ class Database:
     
     def get_all_sessions(self):
         """Retorna todas as sessões com informações da disciplina"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        result = []
+        for rows in self.iter_sessions():
+            result.extend(self._session_with_subject(row) for row in rows)
         
-        cursor.execute('''
+        return result
+    
+    def iter_sessions(self, subject_id='all', start_date=None, end_date=None, chunk_size=500):
+        """Percorre as sessões (mais recentes primeiro) em blocos de tuplas, sem carregar o histórico inteiro
+        
+        As datas são no formato YYYY-MM-DD (dias no fuso do usuário) e ambas são inclusivas.
+        Cada bloco traz (id, subject_id, subject_name, minutes, started_at, completed_at, started_ts,
+        completed_ts).
+        """
+        query, params = self._sessions_query(subject_id, None, start_date, end_date)
+        query += ' ORDER BY ss.started_ts DESC, ss.id DESC'
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            yield from self._fetch_chunks(cursor, chunk_size)
+    
+    # Acima disso o filtro de ciclo volta a percorrer o índice de started_ts (e o SQLite
+    # limita o número de SELECTs num UNION ALL)
+    MAX_MERGED_SUBJECTS = 100
+    
+    def get_sessions_page(self, subject_id='all', cycle_id=None, start_date=None, end_date=None,
+                          before=None, limit=50):
+        """Retorna uma página do histórico de sessões (mais recentes primeiro) e o cursor da próxima
+        
+        Paginação por chave (started_ts, id): before é o cursor retornado pela página anterior,
+        e cada página percorre o índice a partir dele, com o mesmo custo da primeira.
+        """
+        bounds = []
+        if before:
+            try:
+                started_ts, session_id = json.loads(base64.urlsafe_b64decode(before.encode()))
+            except (ValueError, TypeError):
+                raise ValueError(f"Cursor inválido: {before}")
+            bounds = [started_ts, session_id]
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            subject_ids = None
+            if cycle_id:
+                cursor.execute('SELECT id FROM subjects WHERE cycle_id = ?', (cycle_id,))
+                subject_ids = [row[0] for row in cursor.fetchall() if subject_id in ('all', row[0])]
+            
+            if subject_ids is None or len(subject_ids) > self.MAX_MERGED_SUBJECTS:
+                query, params = self._page_query(subject_id, cycle_id, start_date, end_date, bounds, limit)
+            elif subject_ids:
+                # Uma busca por disciplina do ciclo em (subject_id, started_ts), juntadas na mesma
+                # ordem: cada uma lê no máximo uma página, por mais sessões que os outros ciclos tenham
+                parts = [self._page_query(subject, None, start_date, end_date, bounds, limit)
+                         for subject in subject_ids]
+                query = ' UNION ALL '.join(f'SELECT * FROM ({part})' for part, _ in parts)
+                query += ' ORDER BY 7 DESC, 1 DESC LIMIT ?'
+                params = [param for _, part_params in parts for param in part_params] + [limit + 1]
+            else:
+                query = None
+            
+            rows = cursor.execute(query, params).fetchall() if query else []
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = base64.urlsafe_b64encode(json.dumps([last[6], last[0]]).encode()).decode()
+        
+        return {
+            'sessions': [self._session_with_subject(row) for row in rows],
+            'nextCursor': next_cursor
+        }
+    
+    def _page_query(self, subject_id, cycle_id, start_date, end_date, bounds, limit):
+        """SELECT de uma página: filtros, posição do cursor (bounds) e limit + 1 linhas"""
+        query, params = self._sessions_query(subject_id, cycle_id, start_date, end_date)
+        
+        if bounds:
+            query += ' AND (ss.started_ts, ss.id) < (?, ?)'
+            params.extend(bounds)
+        
+        # Uma linha a mais indica se existe próxima página
+        query += ' ORDER BY ss.started_ts DESC, ss.id DESC LIMIT ?'
+        params.append(limit + 1)
+        return query, params
+    
+    def _sessions_query(self, subject_id='all', cycle_id=None, start_date=None, end_date=None):
+        """Monta o SELECT das sessões com o nome da disciplina e os filtros informados"""
+        query = '''
             SELECT 
                 ss.id,
                 ss.subject_id,
                 s.name as subject_name,
                 ss.minutes,
                 ss.started_at,
-                ss.completed_at
+                ss.completed_at,
+                ss.started_ts,
+                ss.completed_ts
             FROM study_sessions ss
             JOIN subjects s ON ss.subject_id = s.id
-            ORDER BY ss.started_at DESC
-        ''')
+            WHERE 1 = 1
+        '''
+        params = []
         
-        sessions = cursor.fetchall()
-        conn.close()
+        if subject_id != 'all':
+            query += ' AND ss.subject_id = ?'
+            params.append(subject_id)
         
-        result = []
-        for session in sessions:
-            result.append({
-                'id': session[0],
-                'subject_id': session[1],
-                'subject_name': session[2],
-                'minutes': session[3],
-                'started_at': session[4],
-                'completed_at': session[5]
-            })
+        if cycle_id:
+            # Só para ciclos com muitas disciplinas (ver get_sessions_page): "+" mantém o percurso
+            # pelo índice de started_ts em vez de juntar e reordenar todas as sessões do ciclo
+            query += ' AND +ss.subject_id IN (SELECT id FROM subjects WHERE cycle_id = ?)'
+            params.append(cycle_id)
         
-        return result
+        # Limites nas meias-noites locais: o dia final entra inteiro (limite exclusivo no dia seguinte)
+        if start_date:
+            query += ' AND ss.started_ts >= ?'
+            params.append(day_start(date_to_day(start_date), self._utc_offset))
+        
+        if end_date:
+            query += ' AND ss.started_ts < ?'
+            params.append(day_start(date_to_day(end_date) + 1, self._utc_offset))
+        
+        return query, params
+    
+    def _session_with_subject(self, row):
+        return {
+            'id': row[0],
+            'subject_id': row[1],
+            'subject_name': row[2],
+            'minutes': row[3],
+            'started_at': row[4],
+            'completed_at': row[5]
+        }
+    
+    def _fetch_chunks(self, cursor, chunk_size):
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
     
     def get_all_subjects(self):
         """Retorna todas as disciplinas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT id, name FROM subjects')
-        subjects = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name FROM subjects')
+            subjects = cursor.fetchall()
         
         return [{'id': s[0], 'name': s[1]} for s in subjects]
+    
+    # ===== BACKUP =====
+    
+    def backup_to(self, dest_path, pages=256, sleep=0.005, progress=None):
+        """Copia o banco para dest_path com a API de backup online do SQLite, em lotes de páginas
+        
+        progress(status, remaining, total) é chamado após cada lote, como em sqlite3.Connection.backup.
+        """
+        dest = sqlite3.connect(dest_path)
+        try:
+            with self.connection() as conn:
+                # Snapshot de leitura aberto durante a cópia: sem ele, cada escrita
+                # concorrente faz o backup recomeçar do zero
+                conn.execute('BEGIN')
+                conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                conn.backup(dest, pages=pages, progress=progress, sleep=sleep)
+            
+            # A cópia herda o modo WAL; o arquivo de backup deve ser autossuficiente
+            dest.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            dest.close()
+        
+        return dest_path
+    
+    def validate_backup_file(self, path):
+        """Confere se o arquivo (uma cópia temporária) é um banco SQLite íntegro com o schema esperado
+        
+        Retorna a versão do schema do backup.
+        """
+        with open(path, 'rb') as f:
+            if f.read(16) != b'SQLite format 3\x00':
+                raise ValueError('O arquivo não é um banco de dados SQLite')
+        
+        conn = sqlite3.connect(path)
+        try:
+            cursor = conn.cursor()
+            
+            # Normaliza cópias feitas em modo WAL (o arquivo é uma cópia temporária)
+            cursor.execute('PRAGMA journal_mode = DELETE')
+            
+            cursor.execute('PRAGMA integrity_check')
+            result = cursor.fetchone()[0]
+            if result != 'ok':
+                raise ValueError(f'Falha na verificação de integridade: {result}')
+            
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            tables = {row[0] for row in cursor.fetchall()}
+            missing = {'cycles', 'subjects', 'study_sessions', 'stats'} - tables
+            if missing:
+                raise ValueError(f"Tabelas ausentes no backup: {', '.join(sorted(missing))}")
+            
+            version = get_schema_version(cursor)
+            if version > SCHEMA_VERSION:
+                raise ValueError(
+                    f'Backup com schema versão {version}, mais novo que o suportado ({SCHEMA_VERSION})'
+                )
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f'Banco de dados inválido: {e}')
+        finally:
+            conn.close()
+        
+        return version
+    
+    def restore_from(self, source_path, drain_timeout=30.0):
+        """Substitui o banco atual por source_path (já validado) com troca atômica do arquivo
+        
+        O banco atual é salvo antes em {db_path}.backup. source_path deve estar no mesmo
+        sistema de arquivos que db_path para que os.replace seja atômico.
+        """
+        self.backup_to(f"{self.db_path}.backup")
+        versions = self.get_table_versions()
+        
+        # Segura a fila de escrita e drena o pool: nenhuma conexão fica aberta no arquivo antigo
+        with self.writer.suspended() if self.writer is not None else nullcontext():
+            self.pool.drain(drain_timeout)
+            try:
+                # Com todas as conexões fechadas o SQLite já fez checkpoint do WAL;
+                # sobras do arquivo antigo não podem ser aplicadas ao novo
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(self.db_path + suffix):
+                        os.remove(self.db_path + suffix)
+                
+                os.replace(source_path, self.db_path)
+                
+                # Ainda com o pool drenado, numa conexão avulsa e numa só transação: nenhuma
+                # leitura vê o arquivo restaurado com o schema antigo, ETags já entregues ou
+                # cursores de sincronização do arquivo anterior
+                conn = self.pool.open_connection()
+                try:
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        # Backups de versões antigas sobem para o schema atual
+                        applied = self._init_schema(conn.cursor())
+                        advance_table_versions(conn.cursor(), versions)
+                        renew_sync_epoch(conn.cursor())
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                finally:
+                    conn.close()
+            finally:
+                self.pool.resume()
+        
+        self._bump_data_version()
+        
+        return applied
+    
+    # ===== EXPORT / IMPORT =====
+    
+    def iter_export_records(self, since=None, until=None, chunk_size=500):
+        """Percorre os registros para exportação, tabela por tabela, como tuplas (tipo, dados)
+        
+        Ciclos e disciplinas vão sempre completos; since (inclusivo) e until (exclusivo)
+        filtram as sessões pelo instante de início, para exportações incrementais (nesse
+        caso as sessões saem em ordem de início). Instantes inválidos: ValueError.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Transação de leitura: todas as tabelas saem do mesmo snapshot
+            cursor.execute('BEGIN')
+            
+            cursor.execute('''
+                SELECT id, name, study_days, created_at, week_start_date, is_active
+                FROM cycles
+                ORDER BY rowid
+            ''')
+            for rows in self._fetch_chunks(cursor, chunk_size):
+                for row in rows:
+                    yield 'cycle', self._cycle_record(row)
+            
+            cursor.execute('SELECT * FROM subjects ORDER BY rowid')
+            for rows in self._fetch_chunks(cursor, chunk_size):
+                for row in rows:
+                    yield 'subject', self._subject_from_row(row)
+            
+            query = '''
+                SELECT id, subject_id, minutes, started_at, completed_at, idempotency_key
+                FROM study_sessions
+                WHERE 1 = 1
+            '''
+            params = []
+            
+            # Epochs calculados aqui: com o valor já pronto o intervalo vira uma busca
+            # em idx_sessions_started_ts, percorrido na ordem do índice
+            if since:
+                query += " AND started_ts >= ?"
+                params.append(parse_epoch(since))
+            
+            if until:
+                query += " AND started_ts < ?"
+                params.append(parse_epoch(until))
+            
+            order = ' ORDER BY started_ts, id' if params else ' ORDER BY id'
+            cursor.execute(query + order, params)
+            for rows in self._fetch_chunks(cursor, chunk_size):
+                for row in rows:
+                    yield 'session', self._session_record(row)
+    
+    def _cycle_record(self, row):
+        """Ciclo sem as disciplinas (id, name, study_days, created_at, week_start_date, is_active)"""
+        return {
+            'id': row[0],
+            'name': row[1],
+            'study_days': json.loads(row[2]),
+            'created_at': row[3],
+            'week_start_date': row[4],
+            'is_active': bool(row[5])
+        }
+    
+    def _session_record(self, row):
+        """Sessão (id, subject_id, minutes, started_at, completed_at, idempotency_key)"""
+        return {
+            'id': row[0],
+            'subject_id': row[1],
+            'minutes': row[2],
+            'started_at': row[3],
+            'completed_at': row[4],
+            'idempotency_key': row[5]
+        }
+    
+    def import_records(self, records, batch_size=500):
+        """Importa tuplas (tipo, dados) geradas por iter_export_records numa única transação
+        
+        Registros com o mesmo ID são sobrescritos, então reimportar o mesmo arquivo não duplica dados.
+        Sessões cuja idempotency_key já pertence a outra sessão são ignoradas e contadas em
+        'duplicate' (ver _keep_session_owners).
+        """
+        statements = {
+            'cycle': ('''
+                INSERT OR REPLACE INTO cycles (id, name, study_days, created_at, week_start_date, is_active)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', lambda d: (
+                d['id'], d['name'], json.dumps(d['study_days']), d['created_at'],
+                d['week_start_date'], 1 if d.get('is_active') else 0
+            )),
+            'subject': ('''
+                INSERT OR REPLACE INTO subjects 
+                (id, cycle_id, name, weekly_hours, color, priority, current_week_minutes, total_minutes, total_sessions)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', lambda d: (
+                d['id'], d['cycle_id'], d['name'], d['weeklyHours'], d['color'], d['priority'],
+                d.get('currentWeekMinutes', 0), d.get('totalMinutes', 0), d.get('totalSessions', 0)
+            )),
+            # UPSERT (e não REPLACE) para que as triggers dos agregados vejam a atualização
+            'session': (f'''
+                INSERT INTO study_sessions
+                (id, subject_id, minutes, started_at, completed_at, idempotency_key, started_ts, completed_ts)
+                VALUES (?1, ?2, ?3, ?4, ?5, ?6, {EPOCH_SQL.format('?4')}, {EPOCH_SQL.format('?5')})
+                ON CONFLICT (id) DO UPDATE SET
+                    subject_id = excluded.subject_id,
+                    minutes = excluded.minutes,
+                    started_at = excluded.started_at,
+                    completed_at = excluded.completed_at,
+                    idempotency_key = excluded.idempotency_key,
+                    started_ts = excluded.started_ts,
+                    completed_ts = excluded.completed_ts
+            ''', lambda d: (
+                d['id'], d['subject_id'], d['minutes'], validate_instant(d['started_at']),
+                validate_instant(d['completed_at']), d.get('idempotency_key')
+            )),
+        }
+        
+        counts = {kind: 0 for kind in statements}
+        counts['duplicate'] = 0
+        pending = {kind: [] for kind in statements}
+        owners = {}  # idempotency_key -> id da sessão dona da chave
+        
+        with self.transaction() as conn:
+            def flush(kind):
+                rows = pending[kind]
+                if kind == 'session':
+                    rows = self._keep_session_owners(conn.cursor(), rows, owners)
+                    counts['duplicate'] += len(pending[kind]) - len(rows)
+                conn.executemany(statements[kind][0], rows)
+                counts[kind] += len(rows)
+                pending[kind].clear()
+            
+            for kind, data in records:
+                if kind not in statements:
+                    raise ValueError(f"Tipo de registro desconhecido: {kind}")
+                
+                pending[kind].append(statements[kind][1](data))
+                if len(pending[kind]) >= batch_size:
+                    flush(kind)
+            
+            for kind in statements:
+                flush(kind)
+        
+        return counts
+    
+    def _keep_session_owners(self, cursor, rows, owners, chunk_size=500):
+        """Descarta as sessões importadas cuja idempotency_key pertence a outra sessão
+        
+        Como na ingestão em lote, a chave identifica a sessão: fica a que já a tinha (no banco
+        ou antes no mesmo arquivo), em vez de o índice único abortar a importação inteira.
+        rows são os parâmetros do INSERT (id, ..., idempotency_key).
+        """
+        keys = list({row[5] for row in rows if row[5] and row[5] not in owners})
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            cursor.execute(f'''
+                SELECT idempotency_key, id FROM study_sessions
+                WHERE idempotency_key IN ({', '.join('?' * len(chunk))})
+            ''', chunk)
+            owners.update(cursor.fetchall())
+        
+        return [row for row in rows if not row[5] or owners.setdefault(row[5], row[0]) == row[0]]
+    
+    # ===== SYNC =====
+    # Ver backend/changelog.py
+    
+    # Tabela do banco -> (nome na API, SELECT das colunas, formatação da linha)
+    SYNC_QUERIES = {
+        'cycles': ('cycles', 'SELECT id, name, study_days, created_at, week_start_date, is_active FROM cycles',
+                   '_cycle_record'),
+        'subjects': ('subjects', 'SELECT * FROM subjects', '_subject_from_row'),
+        'study_sessions': ('sessions', '''
+            SELECT id, subject_id, minutes, started_at, completed_at, idempotency_key FROM study_sessions
+        ''', '_session_record'),
+        'stats': ('stats', 'SELECT * FROM stats', '_stats_record'),
+    }
+    
+    def _stats_record(self, row):
+        return {
+            'date': row[1],
+            'completedSessions': row[2],
+            'totalFocusTime': row[3],
+            'totalBreakTime': row[4]
+        }
+    
+    def sync_cursor(self):
+        """Retorna o cursor que aponta para a alteração mais recente"""
+        with self.connection() as conn:
+            return format_cursor(*read_sync_position(conn.cursor()))
+    
+    def get_changes(self, since=None, limit=1000, chunk_size=500):
+        """Retorna as linhas alteradas e apagadas depois do cursor since (None = tudo)
+        
+        No máximo limit alterações por chamada; com hasMore o cliente repete a chamada
+        com o cursor retornado. Se since for de outro banco (restauração de backup), a
+        resposta recomeça do zero com reset = True.
+        """
+        since_epoch, since_seq = parse_cursor(since) if since else (None, 0)
+        
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Transação de leitura: registro e linhas saem do mesmo snapshot
+            cursor.execute('BEGIN')
+            
+            epoch, _ = read_sync_position(cursor)
+            reset = since_epoch is not None and since_epoch != epoch
+            if reset:
+                since_seq = 0
+            
+            cursor.execute('''
+                SELECT seq, table_name, row_key, op FROM change_log
+                WHERE seq > ?
+                ORDER BY seq
+                LIMIT ?
+            ''', (since_seq, limit + 1))
+            entries = cursor.fetchall()
+            
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+            
+            changed = {table: [] for table in SYNC_TABLES}
+            deleted = {self.SYNC_QUERIES[table][0]: [] for table in SYNC_TABLES}
+            for _seq, table, key, op in entries:
+                if op == 'delete':
+                    deleted[self.SYNC_QUERIES[table][0]].append(key)
+                else:
+                    changed[table].append(key)
+            
+            changes = {}
+            for table, keys in changed.items():
+                name, select, formatter = self.SYNC_QUERIES[table]
+                records = changes[name] = []
+                for start in range(0, len(keys), chunk_size):
+                    chunk = keys[start:start + chunk_size]
+                    cursor.execute(
+                        f"{select} WHERE {SYNC_TABLES[table]} IN ({', '.join('?' * len(chunk))})", chunk
+                    )
+                    records.extend(getattr(self, formatter)(row) for row in cursor.fetchall())
+        
+        return {
+            'cursor': format_cursor(epoch, entries[-1][0] if entries else since_seq),
+            'hasMore': has_more,
+            'reset': reset,
+            'changes': changes,
+            'deleted': deleted
+        }
+    
+    def apply_mutations(self, mutations, since):
+        """Aplica alterações enviadas pelo cliente numa única transação
+        
+        Cada mutação é {table, op: upsert|delete, data}. Há conflito quando a linha mudou
+        no servidor depois do cursor since (o último que o cliente sincronizou); nesse caso
+        a mutação não é aplicada e o resultado traz a versão atual da linha. Sessões só
+        podem ser inseridas (com idempotency_key) e contam nos contadores da disciplina.
+        
+        Retorna (resultados na ordem recebida, cursor). O cursor só avança se nenhuma outra
+        escrita aconteceu depois de since; senão o cliente precisa buscar as alterações.
+        """
+        since_epoch, since_seq = parse_cursor(since)
+        results = []
+        
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            
+            epoch, start_seq = read_sync_position(cursor)
+            if since_epoch != epoch:
+                raise StaleCursorError('Cursor de outro banco: sincronize de novo sem since')
+            
+            for index, mutation in enumerate(mutations):
+                try:
+                    results.append({'index': index, **self._apply_mutation(cursor, mutation, since_seq)})
+                except KeyError as e:
+                    results.append({'index': index, 'status': 'invalid', 'error': f'Campo ausente: {e.args[0]}'})
+                except (TypeError, ValueError, sqlite3.IntegrityError) as e:
+                    results.append({'index': index, 'status': 'invalid', 'error': str(e)})
+            
+            _, end_seq = read_sync_position(cursor)
+        
+        return results, format_cursor(epoch, end_seq if start_seq == since_seq else since_seq)
+    
+    def _apply_mutation(self, cursor, mutation, since_seq):
+        names = {name: table for table, (name, _, _) in self.SYNC_QUERIES.items()}
+        table = names.get(mutation['table'])
+        op = mutation['op']
+        data = mutation.get('data') or {}
+        if table is None:
+            raise ValueError(f"Tabela desconhecida: {mutation['table']}")
+        if op not in ('upsert', 'delete'):
+            raise ValueError(f"Operação desconhecida: {op}")
+        
+        if table == 'study_sessions':
+            if op != 'upsert' or not data.get('idempotency_key'):
+                raise ValueError('Sessões só podem ser inseridas, com idempotency_key')
+            cursor.execute(self.INSERT_SESSION_SQL, self._session_params(data))
+            if not cursor.rowcount:
+                return {'status': 'duplicate'}
+            cursor.execute(self.ADD_TO_SUBJECT_SQL, (data['minutes'], data['minutes'], 1, data['subject_id']))
+            return {'status': 'applied'}
+        
+        key = data[SYNC_TABLES[table]]
+        cursor.execute('''
+            SELECT seq FROM change_log WHERE table_name = ? AND row_key = ?
+        ''', (table, key))
+        row = cursor.fetchone()
+        if row and row[0] > since_seq:
+            name, select, formatter = self.SYNC_QUERIES[table]
+            cursor.execute(f"{select} WHERE {SYNC_TABLES[table]} = ?", (key,))
+            current = cursor.fetchone()
+            return {'status': 'conflict', 'current': getattr(self, formatter)(current) if current else None}
+        
+        if op == 'delete':
+            cursor.execute(f"DELETE FROM {table} WHERE {SYNC_TABLES[table]} = ?", (key,))
+        elif table == 'cycles':
+            cursor.execute('''
+                INSERT INTO cycles (id, name, study_days, created_at, week_start_date, is_active)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    name = excluded.name,
+                    study_days = excluded.study_days,
+                    week_start_date = excluded.week_start_date,
+                    is_active = excluded.is_active
+            ''', (
+                key, data['name'], json.dumps(data['study_days']), data['created_at'],
+                data['week_start_date'], 1 if data.get('is_active') else 0
+            ))
+            if data.get('is_active'):
+                cursor.execute('UPDATE cycles SET is_active = 0 WHERE id != ? AND is_active = 1', (key,))
+        elif table == 'subjects':
+            # Contadores vêm só na criação; depois quem os mantém são as sessões
+            cursor.execute('''
+                INSERT INTO subjects 
+                (id, cycle_id, name, weekly_hours, color, priority, current_week_minutes, total_minutes, total_sessions)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    cycle_id = excluded.cycle_id,
+                    name = excluded.name,
+                    weekly_hours = excluded.weekly_hours,
+                    color = excluded.color,
+                    priority = excluded.priority
+            ''', (
+                key, data['cycle_id'], data['name'], data['weeklyHours'], data['color'], data['priority'],
+                data.get('currentWeekMinutes', 0), data.get('totalMinutes', 0), data.get('totalSessions', 0)
+            ))
+        else:
+            cursor.execute('''
+                INSERT INTO stats (date, completed_sessions, total_focus_time, total_break_time)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (date) DO UPDATE SET
+                    completed_sessions = excluded.completed_sessions,
+                    total_focus_time = excluded.total_focus_time,
+                    total_break_time = excluded.total_break_time
+            ''', (key, data['completedSessions'], data['totalFocusTime'], data['totalBreakTime']))
+        
+        return {'status': 'applied'}
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import signal
+from contextlib import contextmanager
+
+# Import compatível com Windows e Linux
+try:
+    from backend.localtime import local_day, parse_epoch
+except ModuleNotFoundError:
+    from localtime import local_day, parse_epoch
+
+
+class Broadcaster:
+    """Distribui eventos para todos os assinantes (conexões SSE) do processo
+
+    Cada evento é serializado uma única vez e o mesmo bloco de bytes vai para a fila de
+    cada assinante. Um assinante lento que enche a fila perde os eventos pendentes e
+    recebe um "invalidate", para recarregar tudo em vez de aplicar deltas incompletos.
+    Todos os métodos devem ser chamados no event loop.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._published = 0
+        self._overflows = 0
+        self._closed = False
+
+    @contextmanager
+    def subscribe(self):
+        """Registra uma fila de eventos enquanto o bloco estiver aberto"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    def publish(self, event, data):
+        """Envia o evento a todos os assinantes sem esperar (nunca bloqueia quem publica)"""
+        if not self._subscribers:
+            return
+
+        message = format_event(event, data)
+        self._published += 1
+
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._overflows += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_event("invalidate", {"reason": "overflow"}))
+
+    def close(self):
+        """Encerra os streams abertos (None na fila sinaliza o fim)"""
+        self._closed = True
+        for queue in self._subscribers:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        return {
+            'subscribers': len(self._subscribers),
+            'published': self._published,
+            'overflows': self._overflows,
+        }
+
+
+def format_event(event, data):
+    """Formata um evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def session_delta(session, subject, utc_offset=0, first_of_subject=False):
+    """Delta das estatísticas do dashboard causado por uma sessão nova
+
+    Mesmas regras dos agregados (backend/rollups.py): dia e hora no fuso do usuário
+    (utc_offset em minutos) e a intensidade do heatmap soma minutes / 15. first_of_subject
+    indica que a disciplina não tinha sessões no banco antes desta (ver create_session).
+    """
+    local = parse_epoch(session['started_at']) + utc_offset * 60
+    day = local // 86400
+    weekday = (day + 3) % 7  # 1970-01-01 foi uma quinta
+    hour = local % 86400 // 3600
+
+    return {
+        'general': {
+            'totalMinutes': session['minutes'],
+            'totalSessions': 1,
+            # Primeira sessão da disciplina: ela passa a contar em totalSubjects
+            'totalSubjects': 1 if first_of_subject else 0,
+        },
+        # Só o que o heatmap exibe: últimos 30 dias (como get_heatmap_data), das 6h às 22h
+        'heatmap': {
+            'day': weekday,
+            'hour': hour,
+            'value': session['minutes'] // 15,
+        } if day >= local_day(utc_offset) - 30 and 6 <= hour <= 22 else None,
+        'ranking': ranking_item(subject, sessions_delta=1) if subject else None,
+    }
+
+
+def ranking_item(subject, sessions_delta=0):
+    """Disciplina no formato de /api/stats/ranking (sessions é um incremento)"""
+    return {
+        'id': subject['id'],
+        'name': subject['name'],
+        'weeklyHours': subject['weeklyHours'],
+        'currentMinutes': subject['currentWeekMinutes'],
+        'sessionsDelta': sessions_delta,
+    }
+
+
+def close_on_exit_signals(broadcaster, loop):
+    """Encerra os streams assim que o processo recebe o sinal de desligamento
+
+    O uvicorn espera as conexões abertas terminarem antes do shutdown do lifespan, então
+    streams sem fim (SSE) travariam o Ctrl+C e o --reload. O tratador anterior continua
+    sendo chamado em seguida.
+    """
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        sig = getattr(signal, name, None)
+        if sig is None:
+            continue
+
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            loop.call_soon_threadsafe(broadcaster.close)
+            previous(signum, frame)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            return  # fora da thread principal: sinais não podem ser tratados aqui
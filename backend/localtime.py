@@ -0,0 +1,97 @@
+"""
+Instantes inteiros (epoch) e fuso horário do usuário.
+
+As sessões guardam, além do texto ISO recebido do cliente, started_ts e completed_ts em
+segundos desde 1970-01-01 UTC. Dia e hora locais saem de conta inteira com o deslocamento
+do usuário (user_settings.utc_offset_minutes):
+
+    dia local  = (ts + offset) / 86400      (dias desde 1970-01-01)
+    hora local = (ts + offset) % 86400 / 3600
+
+Textos ISO sem fuso são tratados como UTC (o frontend envia toISOString(), com "Z").
+"""
+
+import re
+import time
+from datetime import date, datetime, timedelta, timezone
+
+# Instante em segundos de um texto ISO (NULL se o texto não for uma data válida)
+EPOCH_SQL = "CAST(strftime('%s', {}) AS INTEGER)"
+
+# Deslocamento do usuário em segundos, para uso dentro de triggers
+OFFSET_SQL = "(SELECT utc_offset_minutes * 60 FROM user_settings WHERE id = 1)"
+
+# Dia da semana de um dia local no padrão do Python (0 = Segunda); 1970-01-01 foi uma quinta
+WEEKDAY_SQL = "(({day}) + 3) % 7"
+
+# Limites de fuso existentes (UTC-12:00 a UTC+14:00)
+MIN_UTC_OFFSET = -12 * 60
+MAX_UTC_OFFSET = 14 * 60
+
+SETTINGS_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS user_settings (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        utc_offset_minutes INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    # Sem deslocamento: mesmos dias e horas (UTC) que os agregados já usavam
+    'INSERT OR IGNORE INTO user_settings (id, utc_offset_minutes) VALUES (1, 0)',
+]
+
+
+def read_utc_offset(cursor):
+    """Retorna o deslocamento do usuário em minutos"""
+    cursor.execute('SELECT utc_offset_minutes FROM user_settings WHERE id = 1')
+    return cursor.fetchone()[0]
+
+
+def parse_epoch(value):
+    """Instante (epoch) de um texto ISO, com as mesmas regras de EPOCH_SQL (sem fuso = UTC)"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+# Instantes ISO completos (data, "T" e ao menos HH:MM) que parse_epoch e o strftime do SQLite
+# interpretam do mesmo jeito
+ISO_INSTANT = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:\d{2})?$')
+
+
+def validate_instant(value):
+    """Retorna value se for um instante ISO válido; ValueError caso contrário
+
+    Sessões são validadas antes do INSERT: a trigger que rejeita started_ts nulo aborta a
+    transação inteira e fica só como última proteção.
+    """
+    if not isinstance(value, str) or not ISO_INSTANT.match(value):
+        raise ValueError(f"instante ISO inválido: {value!r}")
+    parse_epoch(value)  # datas impossíveis (mês 13, dia 31 de abril...)
+    return value
+
+
+def local_day(offset_minutes, timestamp=None):
+    """Dia local (dias desde 1970-01-01) do instante informado, ou de agora"""
+    if timestamp is None:
+        timestamp = time.time()
+    return int(timestamp + offset_minutes * 60) // 86400
+
+
+def local_datetime(timestamp, offset_minutes):
+    """Data e hora locais (datetime sem fuso) de um instante (epoch)"""
+    return datetime(1970, 1, 1) + timedelta(seconds=timestamp + offset_minutes * 60)
+
+
+def day_start(day, offset_minutes):
+    """Instante (epoch) da meia-noite local do dia"""
+    return day * 86400 - offset_minutes * 60
+
+
+def day_to_date(day):
+    return date(1970, 1, 1) + timedelta(days=day)
+
+
+def date_to_day(value):
+    """Dia (dias desde 1970-01-01) de um texto YYYY-MM-DD"""
+    return (date.fromisoformat(value) - date(1970, 1, 1)).days
@@ -1,17 +1,72 @@
+import asyncio
+import bz2
+import gzip
+import hashlib
+import hmac
+import json
+import lzma
+import os
+import sqlite3
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError, field_validator
 
 # Import compatível com Windows e Linux
 try:
+    from backend.cache import StatsCache
+    from backend.changelog import StaleCursorError
+    from backend.concurrency import AsyncDatabase, EndpointMiddleware
     from backend.database import Database
+    from backend.events import Broadcaster, close_on_exit_signals, format_event, ranking_item, session_delta
+    from backend.localtime import local_datetime, validate_instant
+    from backend.metrics import Metrics
+    from backend.pool import PoolTimeoutError
+    from backend.profiler import ProfilerBusyError, StackSampler, collapsed, top_functions
 except ModuleNotFoundError:
+    from cache import StatsCache
+    from changelog import StaleCursorError
+    from concurrency import AsyncDatabase, EndpointMiddleware
     from database import Database
+    from events import Broadcaster, close_on_exit_signals, format_event, ranking_item, session_delta
+    from localtime import local_datetime, validate_instant
+    from metrics import Metrics
+    from pool import PoolTimeoutError
+    from profiler import ProfilerBusyError, StackSampler, collapsed, top_functions
 
-app = FastAPI(title="Pomodoro API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    # Streams de eventos abertos terminam assim que o servidor recebe o sinal de parada
+    close_on_exit_signals(broadcaster, asyncio.get_running_loop())
+    watcher = asyncio.create_task(watch_other_workers()) if db.shared else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    broadcaster.close()
+
+app = FastAPI(title="Pomodoro API", version="1.0.0", lifespan=lifespan)
+
+# Máximo de requisições simultâneas nas rotas pesadas (as demais não têm limite)
+ROUTE_CONCURRENCY_LIMITS = {
+    "POST /api/sessions/batch": 2,
+    "GET /api/stats/patterns": 4,
+    "GET /api/export/csv": 2,
+    "GET /api/export/json": 2,
+    "POST /api/import/ndjson": 1,
+    "POST /api/backup/create": 1,
+    "POST /api/backup/restore": 1,
+}
+
+# Métricas de rotas e do banco em GET /metrics (POMODORO_METRICS=0 desliga a instrumentação)
+metrics = Metrics(
+    slow_query_ms=float(os.environ.get("POMODORO_SLOW_QUERY_MS", "0")),
+) if os.environ.get("POMODORO_METRICS", "1") == "1" else None
+
+# Marca o endpoint atual (contadores do pool), aplica os limites de concorrência e mede as rotas
+app.add_middleware(EndpointMiddleware, limits=ROUTE_CONCURRENCY_LIMITS, metrics=metrics)
 
 # Configurar CORS
 app.add_middleware(
@@ -22,8 +77,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicializar database
-db = Database()
+# Versão do formato NDJSON de exportação/importação
+EXPORT_FORMAT_VERSION = 1
+
+# Processos servindo o mesmo banco (uvicorn --workers; o launcher define no modo produção).
+# Com mais de um, cache, fuso e eventos acompanham as escritas dos outros pelo table_versions
+WORKERS = int(os.environ.get("POMODORO_WORKERS", "1"))
+SHARED_POLL_SECONDS = float(os.environ.get("POMODORO_SHARED_POLL", "1"))
+
+# Inicializar database (pool e perfil configuráveis por variáveis de ambiente)
+db = Database(
+    db_path=os.environ.get("POMODORO_DB_PATH", "pomodoro.db"),
+    pool_size=int(os.environ.get("POMODORO_DB_POOL_SIZE", "5")),
+    pool_timeout=float(os.environ.get("POMODORO_DB_POOL_TIMEOUT", "10")),
+    profile=os.environ.get("POMODORO_DB_PROFILE", "wal"),
+    single_writer=os.environ.get("POMODORO_DB_SINGLE_WRITER", "1") == "1",
+    connection_factory=metrics.connection_class() if metrics is not None else None,
+    shared=WORKERS > 1,
+)
+if db.shared and db.profile != "wal":
+    print(f"⚠️ {WORKERS} workers com o perfil {db.profile}: sem WAL, cada escrita bloqueia as leituras de todos")
+
+# Chamadas ao banco rodam num pool de threads dedicado, nunca no event loop
+adb = AsyncDatabase(db, max_workers=int(os.environ.get("POMODORO_DB_WORKERS", "0")) or None)
+
+# Cache dos endpoints de estatísticas, invalidado pela versão dos dados do banco
+stats_cache = StatsCache(
+    maxsize=int(os.environ.get("POMODORO_CACHE_SIZE", "256")),
+    ttl=float(os.environ.get("POMODORO_CACHE_TTL", "60")),
+)
+
+async def cached(request, key, compute, *args):
+    """Retorna o resultado em cache de compute(*args) para a versão dos dados da requisição
+
+    A versão é a mesma usada no ETag por conditional() (versões das tabelas e, nas rotas
+    diárias, o dia de hoje): um corpo em cache nunca sai com o ETag de outros dados ou de
+    outro dia. Vale entre workers, porque table_versions é do banco.
+    """
+    return await stats_cache.get_or_compute(key, request.state.data_inputs, lambda: compute(*args))
+
+# Eventos em tempo real (GET /api/stats/stream): um único distribuidor por processo
+broadcaster = Broadcaster(queue_size=int(os.environ.get("POMODORO_EVENTS_QUEUE", "100")))
+
+async def watch_other_workers():
+    """Avisa os streams deste worker sobre escritas feitas pelos outros (só com vários workers)
+
+    Os eventos detalhados ficam no worker que fez a escrita; aqui chega só um invalidate.
+    """
+    while True:
+        await asyncio.sleep(SHARED_POLL_SECONDS)
+        try:
+            if await adb.poll_external_changes():
+                broadcaster.publish("invalidate", {"reason": "external"})
+        except Exception as e:
+            print(f"⚠️ Erro ao verificar escritas de outros workers: {e}")
+
+# ===== CONDITIONAL REQUESTS =====
+
+def etag_matches(if_none_match, etag):
+    """Compara o cabeçalho If-None-Match com o ETag atual (comparação fraca, aceita lista e *)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for value in if_none_match.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        if value == etag:
+            return True
+    return False
+
+def conditional(*tables, daily=False):
+    """Dependência que calcula o ETag da rota a partir das versões das tabelas lidas
+
+    O ETag combina path, query string e a versão de cada tabela em table_versions
+    (daily=True inclui o dia de hoje no fuso do usuário, para respostas que dependem do dia). Se o cliente
+    enviar o mesmo ETag em If-None-Match, responde 304 sem executar as consultas.
+    """
+    async def check(request: Request, response: Response):
+        versions = await adb.get_table_versions()
+        inputs = tuple(f"{table}={versions.get(table, 0)}" for table in tables)
+        if daily:
+            inputs += (str(db.local_today()),)
+        # Versão das entradas de cached() na rota
+        request.state.data_inputs = inputs
+        parts = [request.url.path, request.url.query, *inputs]
+        etag = '"' + hashlib.blake2b("|".join(parts).encode(), digest_size=12).hexdigest() + '"'
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        return headers
+
+    return Depends(check)
 
 # ===== MODELS =====
 
@@ -56,21 +205,33 @@ class SubjectUpdate(BaseModel):
     weeklyHours: int
     color: str
     priority: int
-    currentWeekMinutes: Optional[int] = 0
-    totalMinutes: Optional[int] = 0
-    totalSessions: Optional[int] = 0
+    # Contadores mantidos pelo servidor em POST /api/sessions; enviar só para corrigir manualmente
+    currentWeekMinutes: Optional[int] = None
+    totalMinutes: Optional[int] = None
+    totalSessions: Optional[int] = None
 
 class SessionCreate(BaseModel):
     subject_id: str
     minutes: int
     started_at: str
     completed_at: str
+    idempotency_key: Optional[str] = None  # Gerada pelo cliente; reenvios com a mesma chave são ignorados
+
+    # Instante inválido vira 422 (ou "invalid" no lote) em vez de abortar a transação no banco
+    _check_instants = field_validator("started_at", "completed_at")(validate_instant)
 
 class StatsUpdate(BaseModel):
     completedSessions: int
     totalFocusTime: int
     totalBreakTime: int
 
+class SettingsUpdate(BaseModel):
+    utcOffsetMinutes: int  # Ex.: -180 para UTC-03:00 (o oposto de Date.getTimezoneOffset())
+
+class SyncPush(BaseModel):
+    since: str  # Cursor da última sincronização do cliente
+    mutations: List[dict]
+
 # ===== CYCLES ENDPOINTS =====
 
 @app.get("/")
@@ -84,43 +245,100 @@ async def health_check():
         "status": "healthy",
         "service": "Pomodoro API",
         "version": "1.0.0",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "pid": os.getpid(),
+    }
+
+@app.get("/api/pool")
+async def pool_stats():
+    """Retorna os contadores do pool de conexões (checkouts por endpoint)"""
+    return db.pool_stats()
+
+@app.get("/api/events")
+async def events_stats():
+    """Retorna os contadores do distribuidor de eventos (assinantes, eventos, estouros de fila)"""
+    return broadcaster.stats()
+
+@app.get("/api/cache")
+async def cache_stats():
+    """Retorna os contadores do cache de estatísticas (hits, misses, tamanho)"""
+    stats = stats_cache.stats()
+    stats['dataVersion'] = db.data_version
+    return stats
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métricas no formato de texto do Prometheus (rotas, banco, pool, cache e eventos)"""
+    from fastapi.responses import PlainTextResponse
+
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Métricas desativadas (POMODORO_METRICS=0)")
+
+    pool = db.pool_stats()
+    cache = stats_cache.stats()
+    events = broadcaster.stats()
+    extra = [
+        ("pomodoro_db_pool_connections", "gauge", "Conexões do pool por estado",
+         [({"state": "open"}, pool["open"]), ({"state": "in_use"}, pool["inUse"]), ({"state": "idle"}, pool["idle"])]),
+        ("pomodoro_db_pool_timeouts_total", "counter", "Esperas por conexão que estouraram o tempo",
+         [({}, pool["timeouts"])]),
+        ("pomodoro_db_writer_queued", "gauge", "Escritas na fila do escritor único",
+         [({}, pool["writer"]["queued"] if pool["writer"] else 0)]),
+        ("pomodoro_data_version", "gauge", "Versão dos dados (escritas confirmadas)", [({}, db.data_version)]),
+        ("pomodoro_cache_entries", "gauge", "Entradas no cache de estatísticas", [({}, cache["size"])]),
+        ("pomodoro_cache_hits_total", "counter", "Acertos do cache de estatísticas", [({}, cache["hits"])]),
+        ("pomodoro_cache_misses_total", "counter", "Faltas do cache de estatísticas", [({}, cache["misses"])]),
+        ("pomodoro_cache_evictions_total", "counter", "Remoções do cache de estatísticas", [({}, cache["evictions"])]),
+        ("pomodoro_sse_subscribers", "gauge", "Conexões abertas em /api/stats/stream", [({}, events["subscribers"])]),
+        ("pomodoro_sse_events_total", "counter", "Eventos publicados", [({}, events["published"])]),
+        ("pomodoro_sse_overflows_total", "counter", "Filas de assinantes que estouraram", [({}, events["overflows"])]),
+    ]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/slow-queries")
+async def slow_queries():
+    """Últimas consultas acima de POMODORO_SLOW_QUERY_MS, com o plano de execução"""
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Métricas desativadas (POMODORO_METRICS=0)")
+    return {
+        "thresholdMs": metrics.slow_query_seconds * 1000,
+        "queries": metrics.slow_queries(),
     }
 
 @app.post("/api/cycles")
 async def create_cycle(cycle: CycleCreate):
     """Cria um novo ciclo"""
     try:
-        result = db.create_cycle(cycle.dict())
+        result = await adb.create_cycle(cycle.dict())
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/cycles")
+@app.get("/api/cycles", dependencies=[conditional("cycles", "subjects")])
 async def get_cycles():
     """Retorna todos os ciclos"""
     try:
-        cycles = db.get_all_cycles()
+        cycles = await adb.get_all_cycles()
         return cycles
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/cycles/active")
+@app.get("/api/cycles/active", dependencies=[conditional("cycles", "subjects")])
 async def get_active_cycle():
     """Retorna o ciclo ativo"""
     try:
-        cycle = db.get_active_cycle()
+        cycle = await adb.get_active_cycle()
         if not cycle:
             return None
         return cycle
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/cycles/{cycle_id}")
+@app.get("/api/cycles/{cycle_id}", dependencies=[conditional("cycles", "subjects")])
 async def get_cycle(cycle_id: str):
     """Retorna um ciclo específico"""
     try:
-        cycle = db.get_cycle_by_id(cycle_id)
+        cycle = await adb.get_cycle_by_id(cycle_id)
         if not cycle:
             raise HTTPException(status_code=404, detail="Cycle not found")
         return cycle
@@ -133,7 +351,7 @@ async def get_cycle(cycle_id: str):
 async def activate_cycle(cycle_id: str):
     """Define um ciclo como ativo"""
     try:
-        db.set_active_cycle(cycle_id)
+        await adb.set_active_cycle(cycle_id)
         return {"message": "Cycle activated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -142,7 +360,7 @@ async def activate_cycle(cycle_id: str):
 async def update_cycle(cycle_id: str, cycle: CycleUpdate):
     """Atualiza um ciclo"""
     try:
-        db.update_cycle(cycle_id, cycle.dict())
+        await adb.update_cycle(cycle_id, cycle.dict())
         return {"message": "Cycle updated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -151,7 +369,7 @@ async def update_cycle(cycle_id: str, cycle: CycleUpdate):
 async def delete_cycle(cycle_id: str):
     """Deleta um ciclo"""
     try:
-        db.delete_cycle(cycle_id)
+        await adb.delete_cycle(cycle_id)
         return {"message": "Cycle deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -165,17 +383,42 @@ async def create_subject(subject: SubjectCreate):
         # Converter para formato do banco
         subject_dict = subject.dict()
         subject_dict['weekly_hours'] = subject_dict.pop('weeklyHours')
-        result = db.create_subject(subject_dict)
+        result = await adb.create_subject(subject_dict)
+        broadcaster.publish("subject", {"ranking": ranking_item(result)})
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/subjects", dependencies=[conditional("subjects")])
+async def get_subjects():
+    """Retorna todas as disciplinas (id e nome)"""
+    try:
+        subjects = await adb.get_all_subjects()
+        return subjects
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/subjects/{subject_id}", dependencies=[conditional("subjects")])
+async def get_subject(subject_id: str):
+    """Retorna uma disciplina com os contadores atuais"""
+    try:
+        subject = await adb.get_subject(subject_id)
+        if not subject:
+            raise HTTPException(status_code=404, detail="Subject not found")
+        return subject
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.put("/api/subjects/{subject_id}")
 async def update_subject(subject_id: str, subject: SubjectUpdate):
     """Atualiza uma disciplina"""
     try:
-        db.update_subject(subject_id, subject.dict())
-        return {"message": "Subject updated"}
+        result = await adb.update_subject(subject_id, subject.dict())
+        if result:
+            broadcaster.publish("subject", {"ranking": ranking_item(result)})
+        return {"message": "Subject updated", "subject": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -183,7 +426,8 @@ async def update_subject(subject_id: str, subject: SubjectUpdate):
 async def delete_subject(subject_id: str):
     """Deleta uma disciplina"""
     try:
-        db.delete_subject(subject_id)
+        await adb.delete_subject(subject_id)
+        broadcaster.publish("subject-deleted", {"id": subject_id})
         return {"message": "Subject deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -192,7 +436,8 @@ async def delete_subject(subject_id: str):
 async def reset_week(cycle_id: str):
     """Reseta os minutos semanais de um ciclo"""
     try:
-        db.reset_week_minutes(cycle_id)
+        await adb.reset_week_minutes(cycle_id)
+        broadcaster.publish("invalidate", {"reason": "reset-week"})
         return {"message": "Week reset"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -201,67 +446,247 @@ async def reset_week(cycle_id: str):
 
 @app.post("/api/sessions")
 async def create_session(session: SessionCreate):
-    """Registra uma sessão de estudo"""
+    """Registra uma sessão de estudo e soma os minutos aos contadores da disciplina"""
+    try:
+        session_data = session.dict()
+        created, subject, first_of_subject = await adb.create_session(session_data)
+        if created:
+            broadcaster.publish("session", session_delta(session_data, subject, db.utc_offset, first_of_subject))
+        return {"message": "Session created", "subject": subject}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Tamanho máximo de uma página de GET /api/sessions
+MAX_SESSIONS_PAGE = 200
+
+@app.get("/api/sessions", dependencies=[conditional("subjects", "study_sessions")])
+async def get_sessions(subject: str = "all", cycle: Optional[str] = None, start: Optional[str] = None,
+                       end: Optional[str] = None, before: Optional[str] = None, limit: int = 50):
+    """Retorna o histórico de sessões paginado (mais recentes primeiro)
+
+    Para a próxima página, envie o nextCursor da resposta em before.
+    """
+    if not 1 <= limit <= MAX_SESSIONS_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit deve estar entre 1 e {MAX_SESSIONS_PAGE}")
+
+    for value in (start, end):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Data inválida: {value} (use YYYY-MM-DD)")
+
     try:
-        db.create_session(session.dict())
-        return {"message": "Session created"}
+        return await adb.get_sessions_page(subject, cycle, start, end, before, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Máximo de sessões aceitas num único POST /api/sessions/batch
+MAX_BATCH_SESSIONS = 50000
+
+# Maior linha aceita no NDJSON do lote (uma sessão tem poucas centenas de bytes)
+MAX_BATCH_LINE_BYTES = 64 * 1024
+
+async def ndjson_lines(request):
+    """Objetos JSON de um corpo NDJSON, um por linha, à medida que os blocos chegam
+
+    Só a linha incompleta do fim de cada bloco fica em memória, nunca o corpo inteiro.
+    """
+    pending = b""
+    number = 0
+    async for chunk in request.stream():
+        *lines, pending = (pending + chunk).split(b"\n")
+        if len(pending) > MAX_BATCH_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Linha {number + len(lines) + 1} acima de {MAX_BATCH_LINE_BYTES} bytes")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if pending.strip():
+        yield number + 1, pending
+
+@app.post("/api/sessions/batch")
+async def create_sessions_batch(request: Request):
+    """Registra várias sessões numa única transação (array JSON ou NDJSON, uma sessão por linha)
+
+    O NDJSON é lido e validado linha a linha conforme chega. Sessões cuja idempotency_key já
+    foi gravada são ignoradas. A resposta traz um resultado por item, na ordem recebida:
+    created (com o id), duplicate (com o id existente) ou invalid (o restante do lote é gravado).
+    """
+    results = []
+    valid = []
+    positions = []
+
+    def add(item):
+        index = len(results)
+        if index >= MAX_BATCH_SESSIONS:
+            raise HTTPException(status_code=413, detail=f"Máximo de {MAX_BATCH_SESSIONS} sessões por lote")
+        results.append(None)
+        try:
+            if not isinstance(item, dict):
+                raise TypeError("a sessão deve ser um objeto JSON")
+            valid.append(SessionCreate(**item).dict())
+            positions.append(index)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            results[index] = {"index": index, "status": "invalid", "error": error}
+        except TypeError as e:
+            results[index] = {"index": index, "status": "invalid", "error": str(e)}
+
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        async for number, line in ndjson_lines(request):
+            try:
+                item = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise HTTPException(status_code=400, detail=f"Linha {number} inválida: {e}")
+            add(item)
+    else:
+        try:
+            items = json.loads(await request.body())
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=400, detail=f"Corpo inválido: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Envie um array de sessões ou NDJSON")
+        if len(items) > MAX_BATCH_SESSIONS:
+            raise HTTPException(status_code=413, detail=f"Máximo de {MAX_BATCH_SESSIONS} sessões por lote")
+        for item in items:
+            add(item)
+
+    try:
+        created = await adb.create_sessions(valid) if valid else []
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for index, result in zip(positions, created):
+        results[index] = {"index": index, **result}
+
+    summary = {"created": 0, "duplicate": 0, "invalid": 0}
+    for result in results:
+        summary[result["status"]] += 1
+
+    # Lotes podem ter milhares de sessões: os clientes recarregam em vez de aplicar deltas
+    if summary["created"]:
+        broadcaster.publish("invalidate", {"reason": "sessions"})
+
+    return {**summary, "results": results}
+
+# ===== SETTINGS ENDPOINTS =====
+
+@app.get("/api/settings")
+async def get_settings():
+    """Retorna as preferências do usuário (fuso horário usado nas estatísticas)"""
+    try:
+        return await adb.get_settings()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/api/settings")
+async def update_settings(settings: SettingsUpdate):
+    """Define o fuso do usuário: dias e horas das estatísticas passam a seguir esse fuso"""
+    try:
+        changed = await adb.set_utc_offset(settings.utcOffsetMinutes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Os agregados foram recalculados nos dias do novo fuso
+    if changed:
+        broadcaster.publish("invalidate", {"reason": "settings"})
+
+    return {"message": "Settings updated", "utcOffsetMinutes": settings.utcOffsetMinutes}
+
 # ===== STATS ENDPOINTS =====
 
 # Dashboard endpoints devem vir ANTES dos endpoints com parâmetros
-@app.get("/api/stats/general")
-async def get_general_stats():
+@app.get("/api/stats/general", dependencies=[conditional("study_sessions", daily=True)])
+async def get_general_stats(request: Request):
     """Retorna estatísticas gerais do usuário"""
     try:
-        stats = db.get_general_stats()
+        stats = await cached(request, ("general",), adb.get_general_stats)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/stats/chart-data")
-async def get_chart_data(period: str = "week", subject: str = "all"):
+@app.get("/api/stats/chart-data", dependencies=[conditional("study_sessions", daily=True)])
+async def get_chart_data(request: Request, period: str = "week", subject: str = "all"):
     """Retorna dados para gráficos de evolução"""
     try:
-        data = db.get_chart_data(period, subject)
+        data = await cached(request, ("chart-data", period, subject), adb.get_chart_data, period, subject)
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/stats/heatmap")
-async def get_heatmap_data():
+@app.get("/api/stats/heatmap", dependencies=[conditional("study_sessions", daily=True)])
+async def get_heatmap_data(request: Request):
     """Retorna dados para o heatmap de atividade"""
     try:
-        data = db.get_heatmap_data()
+        data = await cached(request, ("heatmap",), adb.get_heatmap_data)
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/stats/patterns")
-async def get_patterns():
+@app.get("/api/stats/patterns", dependencies=[conditional("study_sessions")])
+async def get_patterns(request: Request):
     """Retorna análise de padrões de estudo"""
     try:
-        patterns = db.get_study_patterns()
+        patterns = await cached(request, ("patterns",), adb.get_study_patterns)
         return patterns
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/stats/ranking")
-async def get_subject_ranking():
+@app.get("/api/stats/ranking", dependencies=[conditional("subjects", "study_sessions")])
+async def get_subject_ranking(request: Request):
     """Retorna ranking de disciplinas"""
     try:
-        ranking = db.get_subject_ranking()
+        ranking = await cached(request, ("ranking",), adb.get_subject_ranking)
         return ranking
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Intervalo entre comentários de keepalive quando não há eventos (mantém proxies conectados)
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/api/stats/stream")
+async def stream_stats():
+    """Envia as mudanças das estatísticas em tempo real (Server-Sent Events)
+
+    Eventos: session (deltas de totais, heatmap e ranking), subject, subject-deleted e
+    invalidate (recarregar tudo).
+    """
+    from fastapi.responses import StreamingResponse
+
+    async def events():
+        if broadcaster.closed:
+            return
+
+        with broadcaster.subscribe() as queue:
+            yield b"retry: 3000\n\n" + format_event("ready", {"dataVersion": db.data_version})
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Endpoints com parâmetros devem vir DEPOIS
-@app.get("/api/stats/{date}")
+@app.get("/api/stats/{date}", dependencies=[conditional("stats")])
 async def get_stats(date: str):
     """Retorna estatísticas de uma data"""
     try:
-        stats = db.get_or_create_stats(date)
+        stats = await adb.get_or_create_stats(date)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -270,106 +695,403 @@ async def get_stats(date: str):
 async def update_stats(date: str, stats: StatsUpdate):
     """Atualiza estatísticas"""
     try:
-        db.update_stats(date, stats.dict())
+        await adb.update_stats(date, stats.dict())
         return {"message": "Stats updated"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# ===== SYNC ENDPOINTS =====
+
+# Limites de uma página de GET /api/sync e de um POST /api/sync
+MAX_SYNC_PAGE = 5000
+MAX_SYNC_MUTATIONS = 5000
+
+@app.get("/api/sync", dependencies=[conditional("cycles", "subjects", "study_sessions", "stats")])
+async def pull_changes(since: Optional[str] = None, limit: int = 1000):
+    """Retorna as linhas alteradas e apagadas desde o cursor (sem cursor: tudo)"""
+    if not 1 <= limit <= MAX_SYNC_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit deve estar entre 1 e {MAX_SYNC_PAGE}")
+
+    try:
+        return await adb.get_changes(since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sync/cursor")
+async def get_sync_cursor():
+    """Cursor da alteração mais recente (lido pelo cliente antes de uma carga completa)"""
+    try:
+        return {"cursor": await adb.sync_cursor()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/sync")
+async def push_changes(push: SyncPush):
+    """Aplica as alterações feitas pelo cliente (offline) com detecção de conflitos"""
+    if len(push.mutations) > MAX_SYNC_MUTATIONS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {MAX_SYNC_MUTATIONS} alterações por envio")
+
+    try:
+        results, cursor = await adb.apply_mutations(push.mutations, push.since)
+    except StaleCursorError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    summary = {"applied": 0, "duplicate": 0, "conflict": 0, "invalid": 0}
+    for result in results:
+        summary[result["status"]] += 1
+
+    if summary["applied"]:
+        broadcaster.publish("invalidate", {"reason": "sync"})
+
+    return {**summary, "cursor": cursor, "results": results}
+
 # ===== EXPORT ENDPOINTS =====
 
 @app.get("/api/export/csv")
-async def export_to_csv():
-    """Exporta dados em formato CSV"""
-    try:
-        import csv
-        import io
-        from datetime import datetime
+async def export_to_csv(start: Optional[str] = None, end: Optional[str] = None, subject: str = "all",
+                        cache_headers: dict = conditional("subjects", "study_sessions", daily=True)):
+    """Exporta dados em formato CSV (em streaming, com filtros opcionais de período e disciplina)"""
+    import csv
+    import io
+
+    from fastapi.responses import StreamingResponse
+
+    # Validar as datas antes de começar o streaming (depois não dá mais para responder 400)
+    for value in (start, end):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Data inválida: {value} (use YYYY-MM-DD)")
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
 
-        from fastapi.responses import StreamingResponse
-        
-        # Buscar todas as sessões
-        sessions = db.get_all_sessions()
-        
-        # Criar CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
         # Cabeçalho
         writer.writerow(['Data', 'Disciplina', 'Minutos', 'Hora Início', 'Hora Fim'])
-        
-        # Dados
-        for session in sessions:
-            writer.writerow([
-                session['started_at'].split('T')[0],
-                session['subject_name'],
-                session['minutes'],
-                session['started_at'].split('T')[1][:5],
-                session['completed_at'].split('T')[1][:5]
-            ])
-        
-        output.seek(0)
-        
+
+        # Data e horas no fuso do usuário, dos instantes inteiros (o texto ISO pode vir em qualquer fuso)
+        offset = db.get_settings()['utcOffsetMinutes']
+
+        # Dados, um bloco do cursor por vez
+        for rows in db.iter_sessions(subject, start, end):
+            for _id, _subject_id, subject_name, minutes, _started_at, _completed_at, started_ts, completed_ts in rows:
+                started = local_datetime(started_ts, offset)
+                writer.writerow([
+                    started.strftime('%Y-%m-%d'),
+                    subject_name,
+                    minutes,
+                    started.strftime('%H:%M'),
+                    local_datetime(completed_ts, offset).strftime('%H:%M')
+                ])
+
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        # Cabeçalho sozinho quando não há sessões
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    return StreamingResponse(
+        adb.iterate(generate()),
+        media_type="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename=pomodoro-stats-{datetime.now().strftime('%Y-%m-%d')}.csv",
+            **cache_headers,
+        }
+    )
+
+@app.get("/api/export/json")
+async def export_to_json(format: str = "json", since: Optional[str] = None, until: Optional[str] = None,
+                         cache_headers: dict = conditional("cycles", "subjects", "study_sessions", daily=True)):
+    """Exporta todos os dados em formato JSON (ou NDJSON em streaming com format=ndjson)"""
+    if format == "ndjson":
+        from fastapi.responses import StreamingResponse
+
+        # Validados antes do streaming: depois do primeiro bloco não dá mais para responder 400
+        try:
+            for instant in (since, until):
+                if instant:
+                    validate_instant(instant)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        def generate():
+            meta = {
+                'type': 'meta',
+                'version': EXPORT_FORMAT_VERSION,
+                'exported_at': datetime.now().isoformat(),
+                'since': since,
+                'until': until
+            }
+            yield (json.dumps(meta) + '\n').encode('utf-8')
+
+            lines = []
+            for kind, data in db.iter_export_records(since, until):
+                lines.append(json.dumps({'type': kind, 'data': data}, ensure_ascii=False))
+                if len(lines) >= 500:
+                    yield ('\n'.join(lines) + '\n').encode('utf-8')
+                    lines.clear()
+
+            if lines:
+                yield ('\n'.join(lines) + '\n').encode('utf-8')
+
         return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=pomodoro-stats-{datetime.now().strftime('%Y-%m-%d')}.csv"}
+            adb.iterate(generate()),
+            media_type="application/x-ndjson",
+            headers={
+                "Content-Disposition": f"attachment; filename=pomodoro-export-{datetime.now().strftime('%Y-%m-%d')}.ndjson",
+                **cache_headers,
+            }
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/export/json")
-async def export_to_json():
-    """Exporta todos os dados em formato JSON"""
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Formato inválido (use json ou ndjson)")
+
     try:
         data = {
-            'cycles': db.get_all_cycles(),
-            'subjects': db.get_all_subjects(),
-            'sessions': db.get_all_sessions(),
+            'cycles': await adb.get_all_cycles(),
+            'subjects': await adb.get_all_subjects(),
+            'sessions': await adb.get_all_sessions(),
             'exported_at': datetime.now().isoformat()
         }
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/import/ndjson")
+async def import_ndjson(request: Request):
+    """Importa um arquivo gerado por /api/export/json?format=ndjson"""
+    import tempfile
+
+    # O corpo vai para um arquivo temporário (em memória só até 8 MB)
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+
+        def records():
+            for number, line in enumerate(spool, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    raise ValueError(f"Linha {number} não é um JSON válido")
+                if not isinstance(record, dict):
+                    raise ValueError(f"Linha {number} não é um objeto JSON")
+                if record.get('type') == 'meta':
+                    if record.get('version') != EXPORT_FORMAT_VERSION:
+                        raise ValueError(f"Versão de exportação não suportada: {record.get('version')}")
+                    continue
+                yield record.get('type'), record.get('data')
+
+        try:
+            counts = await adb.import_records(records())
+        except (ValueError, KeyError, TypeError, sqlite3.IntegrityError) as e:
+            # IntegrityError: registro que viola uma restrição do banco (ex.: campo obrigatório nulo)
+            raise HTTPException(status_code=400, detail=f"Arquivo de importação inválido: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    broadcaster.publish("invalidate", {"reason": "import"})
+    return {"message": "Import completed", "imported": counts}
+
 # ===== BACKUP ENDPOINTS =====
 
+# Compressões disponíveis na biblioteca padrão: nome -> (abrir, extensão, media type)
+BACKUP_COMPRESSIONS = {
+    "gzip": (gzip.open, ".gz", "application/gzip"),
+    "bz2": (bz2.open, ".bz2", "application/x-bzip2"),
+    "xz": (lzma.open, ".xz", "application/x-xz"),
+}
+
 @app.post("/api/backup/create")
-async def create_backup():
-    """Cria um backup do banco de dados"""
-    try:
-        import shutil
-        from datetime import datetime
-
-        from fastapi.responses import FileResponse
-        
-        # Copiar banco de dados para arquivo temporário
-        backup_path = f"pomodoro-backup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
-        shutil.copy2(db.db_path, backup_path)
-        
-        return FileResponse(
-            backup_path,
-            media_type='application/octet-stream',
-            filename=backup_path
+async def create_backup(compress: str = "none"):
+    """Cria um backup do banco de dados (opcionalmente comprimido com gzip, bz2 ou xz)"""
+    import shutil
+    import tempfile
+
+    from fastapi.responses import FileResponse
+    from starlette.background import BackgroundTask
+
+    if compress != "none" and compress not in BACKUP_COMPRESSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Compressão inválida (use none, {', '.join(BACKUP_COMPRESSIONS)})"
         )
+
+    filename = f"pomodoro-backup-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db"
+    media_type = 'application/octet-stream'
+    workdir = tempfile.mkdtemp(prefix="pomodoro-backup-")
+
+    def build():
+        backup_path = db.backup_to(os.path.join(workdir, filename))
+        if compress == "none":
+            return backup_path
+
+        open_compressed, extension, _ = BACKUP_COMPRESSIONS[compress]
+        compressed_path = backup_path + extension
+        with open(backup_path, 'rb') as src, open_compressed(compressed_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.remove(backup_path)
+        return compressed_path
+
+    try:
+        # Backup e compressão rodam no pool de threads do banco, fora do event loop
+        path = await adb.run(build)
     except Exception as e:
+        shutil.rmtree(workdir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    if compress != "none":
+        filename += BACKUP_COMPRESSIONS[compress][1]
+        media_type = BACKUP_COMPRESSIONS[compress][2]
+
+    # O arquivo temporário é removido depois que a resposta termina de ser enviada
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        background=BackgroundTask(shutil.rmtree, workdir, ignore_errors=True)
+    )
+
 @app.post("/api/backup/restore")
-async def restore_backup(file: bytes):
-    """Restaura banco de dados de um backup"""
-    try:
-        import shutil
-        
-        # Fazer backup do banco atual antes de restaurar
-        shutil.copy2(db.db_path, f"{db.db_path}.backup")
-        
-        # Restaurar do arquivo enviado
-        with open(db.db_path, 'wb') as f:
-            f.write(file)
-        
-        return {"message": "Backup restored successfully"}
+async def restore_backup(file: UploadFile = File(...)):
+    """Restaura banco de dados de um backup (aceita também backups comprimidos)"""
+    import shutil
+    import tempfile
+    import time
+
+    # Os outros workers manteriam conexões abertas no arquivo substituído
+    if db.shared:
+        raise HTTPException(status_code=409, detail="Restauração exige o servidor com um único worker")
+
+    timings = {}
+    started = time.perf_counter()
+
+    # O temporário fica ao lado do banco para que a troca (os.replace) seja atômica
+    db_dir = os.path.dirname(os.path.abspath(db.db_path))
+    fd, upload_path = tempfile.mkstemp(prefix=".pomodoro-restore-", suffix=".upload", dir=db_dir)
+    restore_path = upload_path[:-len(".upload")] + ".db"
+
+    try:
+        # 1. Receber o upload em blocos (memória limitada)
+        with os.fdopen(fd, 'wb') as f:
+            while chunk := await file.read(1024 * 1024):
+                f.write(chunk)
+        timings['upload'] = time.perf_counter() - started
+
+        # 2. Descomprimir, se necessário, e validar
+        def prepare():
+            with open(upload_path, 'rb') as f:
+                magic = f.read(6)
+
+            opener = None
+            if magic.startswith(b'\x1f\x8b'):
+                opener = gzip.open
+            elif magic.startswith(b'BZh'):
+                opener = bz2.open
+            elif magic.startswith(b'\xfd7zXZ'):
+                opener = lzma.open
+
+            if opener is None:
+                os.replace(upload_path, restore_path)
+            else:
+                with opener(upload_path, 'rb') as src, open(restore_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.remove(upload_path)
+
+            return db.validate_backup_file(restore_path)
+
+        phase = time.perf_counter()
+        try:
+            schema_version = await adb.run(prepare)
+        except (ValueError, OSError, EOFError, lzma.LZMAError) as e:
+            raise HTTPException(status_code=400, detail=f"Backup inválido: {e}")
+        timings['validate'] = time.perf_counter() - phase
+
+        # 3. Trocar o arquivo com o pool drenado e aplicar migrações pendentes
+        phase = time.perf_counter()
+        try:
+            await adb.restore_from(restore_path)
+        except PoolTimeoutError as e:
+            raise HTTPException(status_code=503, detail=f"Banco ocupado, tente novamente: {e}")
+        timings['swap'] = time.perf_counter() - phase
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for path in (upload_path, restore_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    timings['total'] = time.perf_counter() - started
+    broadcaster.publish("invalidate", {"reason": "restore"})
+
+    return {
+        "message": "Backup restored successfully",
+        "schemaVersion": schema_version,
+        "timings": {phase: round(seconds, 4) for phase, seconds in timings.items()}
+    }
+
+# ===== ADMIN ENDPOINTS =====
+
+# Sem token configurado os endpoints de administração respondem 404
+ADMIN_TOKEN = os.environ.get("POMODORO_ADMIN_TOKEN", "")
+
+profiler = StackSampler()
+
+# Limites de uma captura do profiler
+MAX_PROFILE_SECONDS = 60
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependência dos endpoints de administração: exige o cabeçalho X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Administração desativada (defina POMODORO_ADMIN_TOKEN)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de administração inválido")
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile(seconds: float = 10, interval_ms: float = 5, format: str = "collapsed", idle: bool = False):
+    """Amostra as pilhas de todas as threads por alguns segundos, com as requisições em andamento
+
+    format=collapsed devolve as pilhas no formato do flamegraph.pl/speedscope; format=top,
+    as funções com mais amostras (próprias e acumuladas), como o pstats.
+    """
+    from fastapi.responses import PlainTextResponse
+
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds deve estar entre 0 e {MAX_PROFILE_SECONDS}")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms deve estar entre 1 e 1000")
+    if format not in ("collapsed", "top"):
+        raise HTTPException(status_code=400, detail="Formato inválido (use collapsed ou top)")
+
+    # A amostragem roda numa thread própria (fora do pool do banco e do event loop)
+    loop = asyncio.get_running_loop()
+    try:
+        stacks, totals = await loop.run_in_executor(None, profiler.sample, seconds, interval_ms / 1000, idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "collapsed":
+        return PlainTextResponse(collapsed(stacks), headers={
+            "X-Profile-Seconds": str(totals["seconds"]),
+            "X-Profile-Samples": str(totals["samples"]),
+        })
+
+    period = totals["seconds"] / totals["samples"] if totals["samples"] else 0
+    return {**totals, "functions": top_functions(stacks, period)}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,330 @@
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+
+# Import compatível com Windows e Linux
+try:
+    from backend.pool import current_endpoint
+except ModuleNotFoundError:
+    from pool import current_endpoint
+
+# Limites (em segundos) dos buckets de duração das requisições
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Limites dos buckets de comandos SQL e linhas lidas por requisição
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 1000, 10000, 100000)
+
+# Contadores de banco da requisição em andamento (definidos pelo middleware)
+current_request = ContextVar('current_request', default=None)
+
+
+class RequestStats:
+    """Comandos SQL, linhas lidas e conexões abertas durante uma requisição
+
+    As chamadas ao banco rodam em threads do AsyncDatabase com uma cópia do contexto, que
+    aponta para este mesmo objeto.
+    """
+
+    __slots__ = ('statements', 'rows', 'connections', 'status')
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.connections = 0
+        self.status = 500
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus (o Metrics protege com o lock)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # bisect_left: valores iguais ao limite entram no bucket (le = "menor ou igual")
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """Pares (le, contagem acumulada), terminando em +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Métricas do processo: duração das rotas e uso do banco por requisição
+
+    O banco é instrumentado pela classe de conexão de connection_class(), passada ao
+    Database: cada comando, conexão aberta e linha lida é contado na requisição atual.
+    Com slow_query_ms > 0, comandos que levam mais que isso (execução + leitura das
+    linhas) vão para o log de consultas lentas, com o EXPLAIN QUERY PLAN.
+    """
+
+    def __init__(self, slow_query_ms=0, slow_log_size=50):
+        self.slow_query_seconds = slow_query_ms / 1000.0
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._responses = Counter()
+        self._statements_per_request = {}
+        self._rows_per_request = {}
+        self._db = {'statements': Counter(), 'rows': Counter(), 'connections': Counter()}
+        self._slow_queries = deque(maxlen=slow_log_size)
+        self._slow_total = 0
+
+    # ===== REQUISIÇÕES =====
+
+    def start_request(self):
+        """Abre os contadores da requisição; devolve (stats, token) para finish_request"""
+        stats = RequestStats()
+        return stats, current_request.set(stats)
+
+    def finish_request(self, route, started, request):
+        stats, token = request
+        current_request.reset(token)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            if route not in self._durations:
+                self._durations[route] = Histogram(LATENCY_BUCKETS)
+                self._statements_per_request[route] = Histogram(COUNT_BUCKETS)
+                self._rows_per_request[route] = Histogram(COUNT_BUCKETS)
+            self._durations[route].observe(elapsed)
+            self._statements_per_request[route].observe(stats.statements)
+            self._rows_per_request[route].observe(stats.rows)
+            self._responses[(route, str(stats.status))] += 1
+            self._db['statements'][route] += stats.statements
+            self._db['rows'][route] += stats.rows
+            self._db['connections'][route] += stats.connections
+
+    # ===== BANCO =====
+
+    def connection_class(self):
+        """Classe de conexão SQLite instrumentada (parâmetro factory de sqlite3.connect)"""
+        return type('MetricsConnection', (MetricsConnection,), {'metrics': self})
+
+    def _count(self, field, amount):
+        stats = current_request.get()
+        if stats is not None:
+            setattr(stats, field, getattr(stats, field) + amount)
+            return
+        # Fora de requisições (inicialização, tarefas internas): direto nos totais
+        with self._lock:
+            self._db[field][current_endpoint.get()] += amount
+
+    def _slow_query(self, cursor):
+        """Registra o comando do cursor no log de consultas lentas (uma vez por execução)"""
+        sql = ' '.join(cursor._sql.split())
+        plan = None
+        if cursor._params is not None and not sql.upper().startswith(('BEGIN', 'COMMIT', 'ROLLBACK')):
+            try:
+                explain = cursor.connection.cursor(sqlite3.Cursor)
+                plan = [row[3] for row in explain.execute('EXPLAIN QUERY PLAN ' + cursor._sql, cursor._params)]
+            except sqlite3.Error:
+                pass
+
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'endpoint': current_endpoint.get(),
+            'seconds': round(cursor._elapsed, 4),
+            'rows': cursor._rows,
+            'sql': sql[:1000],
+            'plan': plan,
+        }
+        with self._lock:
+            self._slow_queries.append(entry)
+            self._slow_total += 1
+
+        print(f"🐢 Consulta lenta ({cursor._elapsed * 1000:.0f} ms, {entry['endpoint']}): {sql[:200]}")
+        for step in plan or ():
+            print(f"     {step}")
+        return entry
+
+    def slow_queries(self):
+        """Últimas consultas lentas, da mais recente para a mais antiga"""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._slow_queries)]
+
+    # ===== EXPOSIÇÃO =====
+
+    def render(self, extra=()):
+        """Texto no formato de exposição do Prometheus (0.0.4)
+
+        extra: métricas adicionais como (nome, tipo, ajuda, [(rótulos, valor), ...]).
+        """
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histograms(name, help_text, by_route):
+            family(name, 'histogram', help_text)
+            for route, histogram in sorted(by_route.items()):
+                for bound, count in histogram.samples():
+                    lines.append(f"{name}_bucket{format_labels({'route': route, 'le': bound})} {count}")
+                lines.append(f"{name}_sum{format_labels({'route': route})} {format_value(histogram.sum)}")
+                lines.append(f"{name}_count{format_labels({'route': route})} {histogram.count}")
+
+        with self._lock:
+            histograms('pomodoro_http_request_duration_seconds',
+                       'Duração das requisições por rota (em streams, a duração da conexão)', self._durations)
+
+            family('pomodoro_http_responses_total', 'counter', 'Respostas por rota e status')
+            for (route, status), count in sorted(self._responses.items()):
+                lines.append(f"pomodoro_http_responses_total{format_labels({'route': route, 'status': status})} {count}")
+
+            histograms('pomodoro_db_statements_per_request', 'Comandos SQL por requisição',
+                       self._statements_per_request)
+            histograms('pomodoro_db_rows_per_request', 'Linhas lidas do banco por requisição',
+                       self._rows_per_request)
+
+            for field, help_text in (('statements', 'Comandos SQL executados'),
+                                     ('rows', 'Linhas lidas do banco'),
+                                     ('connections', 'Conexões SQLite abertas')):
+                name = f"pomodoro_db_{field}_total"
+                family(name, 'counter', f"{help_text} por endpoint")
+                for endpoint, count in sorted(self._db[field].items()):
+                    lines.append(f"{name}{format_labels({'endpoint': endpoint})} {count}")
+
+            family('pomodoro_db_slow_queries_total', 'counter', 'Comandos acima do limite de consulta lenta')
+            lines.append(f"pomodoro_db_slow_queries_total {self._slow_total}")
+
+        for name, kind, help_text, samples in extra:
+            family(name, kind, help_text)
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsCursor(sqlite3.Cursor):
+    """Cursor que conta comandos e linhas lidas e mede a duração de cada comando
+
+    A duração soma a execução e todas as leituras de linhas, onde o SQLite faz a maior
+    parte do trabalho de um SELECT.
+    """
+
+    _sql = None
+    _params = None
+    _elapsed = 0.0
+    _rows = 0
+    _slow = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._started(sql, parameters, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        # Sem parâmetros para o EXPLAIN (uma execução por item)
+        self._started(sql, None, time.perf_counter() - started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(0 if row is None else 1, time.perf_counter() - started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(0, time.perf_counter() - started)
+            raise
+        self._fetched(1, time.perf_counter() - started)
+        return row
+
+    def _started(self, sql, params, elapsed):
+        self._sql, self._params, self._elapsed, self._rows, self._slow = sql, params, elapsed, 0, None
+        metrics = self.connection.metrics
+        metrics._count('statements', 1)
+        self._check_slow(metrics)
+
+    def _fetched(self, rows, elapsed):
+        self._elapsed += elapsed
+        self._rows += rows
+        metrics = self.connection.metrics
+        if rows:
+            metrics._count('rows', rows)
+        self._check_slow(metrics)
+
+    def _check_slow(self, metrics):
+        if not metrics.slow_query_seconds or self._elapsed < metrics.slow_query_seconds:
+            return
+        if self._slow is None:
+            self._slow = metrics._slow_query(self)
+        else:
+            # Leituras seguintes do mesmo comando atualizam a entrada já registrada
+            self._slow['seconds'] = round(self._elapsed, 4)
+            self._slow['rows'] = self._rows
+
+
+class MetricsConnection(sqlite3.Connection):
+    """Conexão que cria MetricsCursor e conta a própria abertura (ver Metrics.connection_class)"""
+
+    metrics = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics._count('connections', 1)
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or MetricsCursor)
+
+    # Connection.execute não passa pelo método cursor() sobrescrito
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# Caracteres escapados nos valores dos rótulos
+LABEL_ESCAPE = re.compile(r'[\\"\n]')
+LABEL_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n'}
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def escape_label(value):
+    return LABEL_ESCAPE.sub(lambda match: LABEL_ESCAPES[match.group(0)], str(value))
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,143 @@
+from datetime import datetime
+
+# Import compatível com Windows e Linux
+try:
+    from backend.changelog import CHANGELOG_SCHEMA
+    from backend.localtime import EPOCH_SQL, SETTINGS_SCHEMA
+    from backend.rollups import (ROLLUP_SCHEMA, ROLLUP_SCHEMA_V1, ROLLUP_TRIGGERS, SUMMARY_SCHEMA,
+                                 rebuild_rollups, rebuild_rollups_v1, rebuild_summary)
+    from backend.versions import VERSION_SCHEMA
+except ModuleNotFoundError:
+    from changelog import CHANGELOG_SCHEMA
+    from localtime import EPOCH_SQL, SETTINGS_SCHEMA
+    from rollups import (ROLLUP_SCHEMA, ROLLUP_SCHEMA_V1, ROLLUP_TRIGGERS, SUMMARY_SCHEMA,
+                         rebuild_rollups, rebuild_rollups_v1, rebuild_summary)
+    from versions import VERSION_SCHEMA
+
+
+def _backfill_session_timestamps(cursor):
+    """Preenche started_ts/completed_ts das sessões existentes sem disparar as triggers
+
+    O conteúdo visível das sessões não muda, então não há o que registrar no change_log
+    nem em table_versions. As triggers de study_sessions são recriadas em seguida.
+    """
+    cursor.execute("""
+        SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'study_sessions'
+    """)
+    triggers = cursor.fetchall()
+    for name, _ in triggers:
+        cursor.execute(f'DROP TRIGGER {name}')
+
+    cursor.execute(f'''
+        UPDATE study_sessions SET
+            started_ts = {EPOCH_SQL.format('started_at')},
+            completed_ts = {EPOCH_SQL.format('completed_at')}
+    ''')
+
+    for _, sql in triggers:
+        cursor.execute(sql)
+
+
+# Migrações versionadas do schema: (versão, descrição, passos)
+# Cada passo é um comando SQL ou uma função que recebe o cursor.
+# Nunca altere uma migração já publicada; acrescente uma nova no final.
+MIGRATIONS = [
+    (1, 'Índices secundários para sessões, disciplinas e ciclos', [
+        # Filtros por período em get_chart_data / get_heatmap_data
+        'CREATE INDEX IF NOT EXISTS idx_sessions_started_at ON study_sessions(started_at)',
+        # Filtro por disciplina + período e JOIN do ranking
+        'CREATE INDEX IF NOT EXISTS idx_sessions_subject_started ON study_sessions(subject_id, started_at)',
+        # Disciplinas de um ciclo
+        'CREATE INDEX IF NOT EXISTS idx_subjects_cycle ON subjects(cycle_id)',
+        # Índice parcial: só o(s) ciclo(s) ativo(s)
+        'CREATE INDEX IF NOT EXISTS idx_cycles_active ON cycles(is_active) WHERE is_active = 1',
+    ]),
+    (2, 'Agregados por dia/hora/disciplina mantidos por triggers', [
+        *ROLLUP_SCHEMA_V1,
+        rebuild_rollups_v1,
+    ]),
+    (3, 'Versão de modificação por tabela (ETags)', VERSION_SCHEMA),
+    (4, 'Chave de idempotência das sessões (ingestão em lote)', [
+        'ALTER TABLE study_sessions ADD COLUMN idempotency_key TEXT',
+        # Índice parcial: sessões sem chave (inclusive as antigas) ficam fora da unicidade
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_idempotency
+        ON study_sessions(idempotency_key) WHERE idempotency_key IS NOT NULL
+        ''',
+    ]),
+    (5, 'Registro de alterações para sincronização incremental', CHANGELOG_SCHEMA),
+    (6, 'Instantes inteiros das sessões e agregados no fuso do usuário', [
+        'ALTER TABLE study_sessions ADD COLUMN started_ts INTEGER',
+        'ALTER TABLE study_sessions ADD COLUMN completed_ts INTEGER',
+        _backfill_session_timestamps,
+        # Filtros e paginação por período passam a comparar inteiros
+        'DROP INDEX IF EXISTS idx_sessions_started_at',
+        'DROP INDEX IF EXISTS idx_sessions_subject_started',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_started_ts ON study_sessions(started_ts)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_subject_started_ts ON study_sessions(subject_id, started_ts)',
+        *SETTINGS_SCHEMA,
+        # Agregados por dia/hora locais (inteiros) no lugar dos agregados por texto UTC
+        'DROP TRIGGER IF EXISTS trg_sessions_rollup_insert',
+        'DROP TRIGGER IF EXISTS trg_sessions_rollup_delete',
+        'DROP TRIGGER IF EXISTS trg_sessions_rollup_update',
+        'DROP TABLE IF EXISTS session_rollups',
+        *ROLLUP_SCHEMA,
+        rebuild_rollups,
+    ]),
+    (7, 'Totais e sequências de dias mantidos por triggers', [
+        *SUMMARY_SCHEMA,
+        rebuild_summary,
+    ]),
+    (8, 'Limpeza dos agregados vazios só na célula alterada', [
+        'DROP TRIGGER IF EXISTS trg_sessions_rollup_insert',
+        'DROP TRIGGER IF EXISTS trg_sessions_rollup_delete',
+        'DROP TRIGGER IF EXISTS trg_sessions_rollup_update',
+        *ROLLUP_TRIGGERS,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(cursor):
+    """Retorna a versão atual do schema (0 se nenhuma migração foi aplicada)"""
+    cursor.execute('''
+        SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'
+    ''')
+    if cursor.fetchone() is None:
+        return 0
+
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    return cursor.fetchone()[0] or 0
+
+
+def apply_migrations(cursor):
+    """Aplica as migrações pendentes; deve rodar dentro de uma transação"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+
+    current = get_schema_version(cursor)
+    applied = []
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+
+        for step in steps:
+            if callable(step):
+                step(cursor)
+            else:
+                cursor.execute(step)
+
+        cursor.execute('''
+            INSERT INTO schema_version (version, description, applied_at)
+            VALUES (?, ?, ?)
+        ''', (version, description, datetime.now().isoformat()))
+        applied.append(version)
+
+    return applied
@@ -0,0 +1,247 @@
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Rótulo do endpoint que está usando o banco (definido pelo middleware do FastAPI)
+current_endpoint = ContextVar('current_endpoint', default='internal')
+
+# PRAGMAs aplicados uma única vez, quando cada conexão é aberta
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# Perfis de armazenamento (conjuntos de PRAGMAs) selecionáveis pelo Database
+STORAGE_PROFILES = {
+    # Journal de rollback padrão do SQLite: escritas bloqueiam os leitores
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        **DEFAULT_PRAGMAS,
+    },
+    # WAL: leitores não bloqueiam o escritor e vice-versa
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,  # 16 MB por conexão
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo limite"""
+
+
+class ConnectionPool:
+    """Pool limitado de conexões SQLite reutilizáveis entre threads"""
+
+    def __init__(self, db_path, size=5, timeout=10.0, pragmas=None, factory=None):
+        if size < 1:
+            raise ValueError('O tamanho do pool deve ser pelo menos 1')
+
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        # Classe das conexões (ex.: conexões instrumentadas de backend/metrics.py)
+        self.factory = factory or sqlite3.Connection
+
+        self._idle = []
+        self._cond = threading.Condition()
+        self._draining = False
+        self._opened = 0
+        self._in_use = 0
+        self._timeouts = 0
+        self._checkouts = Counter()
+
+    def open_connection(self):
+        """Abre uma nova conexão e aplica os PRAGMAs configurados"""
+        # isolation_level=None: as transações são abertas explicitamente pelo Database
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, factory=self.factory)
+        # busy_timeout primeiro: trocar o journal_mode disputa o lock do arquivo com outros processos
+        for name, value in sorted(self.pragmas.items(), key=lambda item: item[0] != 'busy_timeout'):
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self, timeout=None):
+        """Retira uma conexão do pool, abrindo uma nova se ainda houver espaço"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            while True:
+                if not self._draining:
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._opened < self.size:
+                        # Reserva a vaga; a conexão é aberta fora do lock
+                        self._opened += 1
+                        conn = None
+                        break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f'Nenhuma conexão disponível após {timeout}s (pool com {self.size} conexões)'
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts[current_endpoint.get()] += 1
+
+        if conn is None:
+            try:
+                conn = self.open_connection()
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._in_use -= 1
+                    self._cond.notify_all()
+                raise
+
+        return conn
+
+    def release(self, conn):
+        """Devolve a conexão ao pool, desfazendo transações esquecidas"""
+        broken = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            broken = True
+
+        with self._cond:
+            self._in_use -= 1
+            if broken or self._draining:
+                # Conexão inutilizável ou pool sendo drenado: fecha e libera a vaga
+                conn.close()
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify_all()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def drain(self, timeout=None):
+        """Bloqueia novos checkouts, espera as conexões em uso voltarem e fecha todas"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._cond:
+            self._draining = True
+            while self._in_use:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._draining = False
+                    self._cond.notify_all()
+                    raise PoolTimeoutError(f'{self._in_use} conexões ainda em uso após {timeout}s')
+                self._cond.wait(remaining)
+
+            self._close_idle()
+
+    def resume(self):
+        """Libera os checkouts depois de um drain()"""
+        with self._cond:
+            self._draining = False
+            self._cond.notify_all()
+
+    def close_all(self):
+        """Fecha as conexões ociosas do pool"""
+        with self._cond:
+            self._close_idle()
+
+    def _close_idle(self):
+        while self._idle:
+            self._idle.pop().close()
+            self._opened -= 1
+
+    def stats(self):
+        """Retorna contadores do pool, incluindo checkouts por endpoint"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._opened,
+                'inUse': self._in_use,
+                'idle': len(self._idle),
+                'draining': self._draining,
+                'timeouts': self._timeouts,
+                'checkouts': dict(self._checkouts),
+            }
+
+    def reset_stats(self):
+        with self._cond:
+            self._timeouts = 0
+            self._checkouts.clear()
+
+
+class SingleWriter:
+    """Conexão exclusiva para escritas; as threads esperam a vez em fila (ordem de chegada)"""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._conn = None
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._writes = Counter()
+
+    @contextmanager
+    def _turn(self):
+        """Espera a vez na fila de escritores"""
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while ticket != self._serving:
+                self._cond.wait()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._serving += 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def connection(self):
+        with self._turn():
+            if self._conn is None:
+                self._conn = self._connect()
+            self._writes[current_endpoint.get()] += 1
+            yield self._conn
+
+    @contextmanager
+    def suspended(self):
+        """Fecha a conexão de escrita e segura a fila até o fim do bloco"""
+        with self._turn():
+            self._close()
+            yield
+
+    def close(self):
+        with self._turn():
+            self._close()
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': self._next_ticket - self._serving,
+                'writes': dict(self._writes),
+            }
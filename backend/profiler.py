@@ -0,0 +1,122 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Funções onde uma thread fica parada esperando trabalho (amostras ociosas)
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),      # event loop sem nada a fazer
+    ('threading.py', 'wait'),        # Condition.wait (pool, escritor único, Event)
+    ('thread.py', '_worker'),        # thread do ThreadPoolExecutor esperando tarefa
+    ('queue.py', 'get'),
+}
+
+# Profundidade máxima de pilha registrada (quadros mais externos são descartados)
+MAX_DEPTH = 100
+
+
+class ProfilerBusyError(Exception):
+    """Já existe uma captura em andamento"""
+
+
+class StackSampler:
+    """Profiler por amostragem: lê a pilha de todas as threads a cada intervalo
+
+    Roda numa thread própria e não instrumenta o código (ao contrário do cProfile, que só
+    mede a thread onde foi ativado), então vale para o event loop e para as threads do
+    banco ao mesmo tempo. As amostras são de tempo de parede: esperas por I/O e locks
+    também aparecem. Uma captura por vez.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def sample(self, seconds, interval=0.005, include_idle=False):
+        """Amostra as pilhas por seconds segundos
+
+        Retorna (Counter {pilha: amostras}, totais). samples conta as leituras de todas as
+        threads; idleSamples, as pilhas descartadas por estarem paradas esperando trabalho.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError('Já existe uma captura em andamento')
+
+        try:
+            own = threading.get_ident()
+            stacks = Counter()
+            samples = idle = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+
+            while True:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if not include_idle and is_idle(frame):
+                        idle += 1
+                        continue
+                    stacks[(names.get(ident, f"thread-{ident}"),) + collect_stack(frame)] += 1
+                samples += 1
+
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                time.sleep(min(interval, deadline - now))
+
+            return stacks, {
+                'seconds': round(time.perf_counter() - started, 3),
+                'samples': samples,
+                'idleSamples': idle,
+            }
+        finally:
+            self._lock.release()
+
+
+def collect_stack(frame):
+    """Pilha da mais externa para a mais interna, como tupla de "função (arquivo:linha)" """
+    frames = []
+    while frame is not None and len(frames) < MAX_DEPTH:
+        frames.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+
+def frame_label(code):
+    # Linha da definição (não a atual), para que cada função apareça uma vez só
+    path = code.co_filename.replace('\\', '/').split('/')
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})".replace(';', ',')
+
+
+def is_idle(frame):
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def collapsed(stacks):
+    """Formato "pilha;separada;por;ponto-e-vírgula contagem" (flamegraph.pl, speedscope)"""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks, period, limit=50):
+    """Resumo por função, como o pstats: amostras próprias (no topo da pilha) e acumuladas
+
+    period é o tempo real entre amostras (duração / número de amostras).
+    """
+    own = Counter()
+    total = Counter()
+    for stack, count in stacks.items():
+        # stack[0] é o nome da thread
+        own[stack[-1]] += count
+        for function in set(stack[1:]):
+            total[function] += count
+
+    return [
+        {
+            'function': function,
+            'ownSamples': own[function],
+            'totalSamples': count,
+            'ownSeconds': round(own[function] * period, 3),
+            'totalSeconds': round(count * period, 3),
+        }
+        for function, count in sorted(total.items(), key=lambda item: (-own[item[0]], -item[1]))[:limit]
+    ]
@@ -0,0 +1,342 @@
+"""
+Agregados materializados de study_sessions por (dia local, hora local, disciplina).
+
+As triggers mantêm session_rollups atualizada a cada INSERT/UPDATE/DELETE em
+study_sessions, então o dashboard lê apenas os agregados. Dia e hora saem de
+started_ts com o fuso do usuário (ver backend/localtime.py); quando o fuso muda os
+agregados são recalculados.
+
+Sobre session_rollups, outras triggers mantêm os totais gerais (session_totals) e as
+sequências de dias estudados (streak_runs: um intervalo [start_day, end_day] por
+sequência), para que /stats/general não dependa do tamanho do histórico.
+
+Para recalcular tudo a partir das sessões brutas:
+
+    python -m backend.rollups --db pomodoro.db
+"""
+
+import argparse
+import time
+
+# Import compatível com Windows e Linux
+try:
+    from backend.localtime import OFFSET_SQL, read_utc_offset
+except ModuleNotFoundError:
+    from localtime import OFFSET_SQL, read_utc_offset
+
+# Dia local (dias desde 1970-01-01) e hora local de started_ts
+_DAY = "(({col} + " + OFFSET_SQL + ") / 86400)"
+_HOUR = "(({col} + " + OFFSET_SQL + ") % 86400 / 3600)"
+
+_INVALID = "SELECT RAISE(ABORT, 'started_at inválido') WHERE NEW.started_ts IS NULL;"
+
+# Célula da sessão removida/alterada: a limpeza de células vazias usa a chave primária,
+# em vez de varrer session_rollups a cada DELETE/UPDATE de sessão
+_OLD_CELL = ("day = " + _DAY.format(col='OLD.started_ts') + " AND hour = " + _HOUR.format(col='OLD.started_ts')
+             + " AND subject_id = OLD.subject_id")
+
+ROLLUP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS session_rollups (
+        day INTEGER NOT NULL,  -- dias desde 1970-01-01, no fuso do usuário
+        hour INTEGER NOT NULL,
+        subject_id TEXT NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        minutes INTEGER NOT NULL DEFAULT 0,
+        heat_units INTEGER NOT NULL DEFAULT 0,  -- soma de minutes / 15 (intensidade do heatmap)
+        PRIMARY KEY (day, hour, subject_id)
+    ) WITHOUT ROWID
+    '''
+
+ROLLUP_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_rollup_insert
+    AFTER INSERT ON study_sessions
+    BEGIN
+        {_INVALID}
+        INSERT INTO session_rollups (day, hour, subject_id, sessions, minutes, heat_units)
+        VALUES ({_DAY.format(col='NEW.started_ts')}, {_HOUR.format(col='NEW.started_ts')},
+                NEW.subject_id, 1, NEW.minutes, NEW.minutes / 15)
+        ON CONFLICT (day, hour, subject_id) DO UPDATE SET
+            sessions = sessions + 1,
+            minutes = minutes + excluded.minutes,
+            heat_units = heat_units + excluded.heat_units;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_rollup_delete
+    AFTER DELETE ON study_sessions
+    BEGIN
+        UPDATE session_rollups SET
+            sessions = sessions - 1,
+            minutes = minutes - OLD.minutes,
+            heat_units = heat_units - OLD.minutes / 15
+        WHERE {_OLD_CELL};
+        DELETE FROM session_rollups WHERE {_OLD_CELL} AND sessions <= 0;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_rollup_update
+    AFTER UPDATE OF subject_id, minutes, started_ts ON study_sessions
+    BEGIN
+        {_INVALID}
+        UPDATE session_rollups SET
+            sessions = sessions - 1,
+            minutes = minutes - OLD.minutes,
+            heat_units = heat_units - OLD.minutes / 15
+        WHERE {_OLD_CELL};
+        DELETE FROM session_rollups WHERE {_OLD_CELL} AND sessions <= 0;
+        INSERT INTO session_rollups (day, hour, subject_id, sessions, minutes, heat_units)
+        VALUES ({_DAY.format(col='NEW.started_ts')}, {_HOUR.format(col='NEW.started_ts')},
+                NEW.subject_id, 1, NEW.minutes, NEW.minutes / 15)
+        ON CONFLICT (day, hour, subject_id) DO UPDATE SET
+            sessions = sessions + 1,
+            minutes = minutes + excluded.minutes,
+            heat_units = heat_units + excluded.heat_units;
+    END
+    ''',
+]
+
+ROLLUP_SCHEMA = [ROLLUP_TABLE, *ROLLUP_TRIGGERS]
+
+
+def rebuild_rollups(cursor):
+    """Recalcula session_rollups a partir de study_sessions; deve rodar dentro de uma transação"""
+    offset = read_utc_offset(cursor) * 60
+    cursor.execute('DELETE FROM session_rollups')
+    cursor.execute('''
+        INSERT INTO session_rollups (day, hour, subject_id, sessions, minutes, heat_units)
+        SELECT
+            (started_ts + ?) / 86400,
+            (started_ts + ?) % 86400 / 3600,
+            subject_id,
+            COUNT(*),
+            SUM(minutes),
+            SUM(minutes / 15)
+        FROM study_sessions
+        WHERE started_ts IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''', (offset, offset))
+    cursor.execute('SELECT COUNT(*) FROM session_rollups')
+    return cursor.fetchone()[0]
+
+
+# ===== TOTAIS E SEQUÊNCIAS =====
+
+# A linha de session_rollups inserida/removida era a única do dia
+_FIRST_OF_DAY = '''NOT EXISTS (
+    SELECT 1 FROM session_rollups
+    WHERE day = NEW.day AND (hour != NEW.hour OR subject_id != NEW.subject_id)
+)'''
+_LAST_OF_DAY = 'NOT EXISTS (SELECT 1 FROM session_rollups WHERE day = OLD.day)'
+
+# Sequência que contém o dia OLD.day (a de maior início até ele)
+_RUN_OF_OLD_DAY = '(SELECT MAX(start_day) FROM streak_runs WHERE start_day <= OLD.day)'
+
+SUMMARY_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS session_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        sessions INTEGER NOT NULL DEFAULT 0,
+        minutes INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    'INSERT OR IGNORE INTO session_totals (id, sessions, minutes) VALUES (1, 0, 0)',
+    '''
+    CREATE TABLE IF NOT EXISTS streak_runs (
+        start_day INTEGER PRIMARY KEY,
+        end_day INTEGER NOT NULL
+    )
+    ''',
+    # Sequência atual (end_day = hoje) e maior sequência (ORDER BY comprimento) por índice
+    'CREATE INDEX IF NOT EXISTS idx_streak_runs_end ON streak_runs(end_day)',
+    'CREATE INDEX IF NOT EXISTS idx_streak_runs_length ON streak_runs(end_day - start_day)',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_rollups_totals_insert
+    AFTER INSERT ON session_rollups
+    BEGIN
+        UPDATE session_totals SET
+            sessions = sessions + NEW.sessions,
+            minutes = minutes + NEW.minutes
+        WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_rollups_totals_update
+    AFTER UPDATE OF sessions, minutes ON session_rollups
+    BEGIN
+        UPDATE session_totals SET
+            sessions = sessions + NEW.sessions - OLD.sessions,
+            minutes = minutes + NEW.minutes - OLD.minutes
+        WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_rollups_totals_delete
+    AFTER DELETE ON session_rollups
+    BEGIN
+        UPDATE session_totals SET
+            sessions = sessions - OLD.sessions,
+            minutes = minutes - OLD.minutes
+        WHERE id = 1;
+    END
+    ''',
+    # Dia novo: estende a sequência que termina na véspera (ou cria uma) e junta com a
+    # que começa no dia seguinte
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_rollups_streak_insert
+    AFTER INSERT ON session_rollups
+    WHEN {_FIRST_OF_DAY}
+    BEGIN
+        UPDATE streak_runs SET end_day = NEW.day WHERE end_day = NEW.day - 1;
+        INSERT INTO streak_runs (start_day, end_day)
+        SELECT NEW.day, NEW.day
+        WHERE NOT EXISTS (SELECT 1 FROM streak_runs WHERE end_day = NEW.day);
+        UPDATE streak_runs SET end_day = (SELECT end_day FROM streak_runs WHERE start_day = NEW.day + 1)
+        WHERE end_day = NEW.day AND EXISTS (SELECT 1 FROM streak_runs WHERE start_day = NEW.day + 1);
+        DELETE FROM streak_runs WHERE start_day = NEW.day + 1;
+    END
+    ''',
+    # Dia sem sessões: divide a sequência que o continha em antes e depois dele
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_rollups_streak_delete
+    AFTER DELETE ON session_rollups
+    WHEN {_LAST_OF_DAY}
+    BEGIN
+        INSERT INTO streak_runs (start_day, end_day)
+        SELECT OLD.day + 1, end_day FROM streak_runs
+        WHERE start_day = {_RUN_OF_OLD_DAY} AND end_day > OLD.day;
+        UPDATE streak_runs SET end_day = OLD.day - 1
+        WHERE start_day = {_RUN_OF_OLD_DAY} AND end_day >= OLD.day;
+        DELETE FROM streak_runs WHERE start_day = OLD.day;
+    END
+    ''',
+]
+
+
+def rebuild_summary(cursor):
+    """Recalcula session_totals e streak_runs a partir de session_rollups
+
+    As sequências são as "ilhas" de dias consecutivos: dentro de uma sequência,
+    day - ROW_NUMBER() é constante.
+    """
+    cursor.execute('''
+        UPDATE session_totals SET
+            sessions = (SELECT COALESCE(SUM(sessions), 0) FROM session_rollups),
+            minutes = (SELECT COALESCE(SUM(minutes), 0) FROM session_rollups)
+        WHERE id = 1
+    ''')
+    cursor.execute('DELETE FROM streak_runs')
+    cursor.execute('''
+        INSERT INTO streak_runs (start_day, end_day)
+        SELECT MIN(day), MAX(day)
+        FROM (
+            SELECT day, day - ROW_NUMBER() OVER (ORDER BY day) AS island
+            FROM (SELECT DISTINCT day FROM session_rollups)
+        )
+        GROUP BY island
+    ''')
+
+
+# ===== VERSÃO 1 (texto ISO, UTC) =====
+# Mantida só para a migração 2; a migração 6 troca pelos agregados acima
+
+_DAY_V1 = "substr({col}, 1, 10)"
+_HOUR_V1 = "CAST(substr({col}, 12, 2) AS INTEGER)"
+_OLD_CELL_V1 = ("day = " + _DAY_V1.format(col='OLD.started_at') + " AND hour = " + _HOUR_V1.format(col='OLD.started_at')
+                + " AND subject_id = OLD.subject_id")
+
+ROLLUP_SCHEMA_V1 = [
+    '''
+    CREATE TABLE IF NOT EXISTS session_rollups (
+        day TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        subject_id TEXT NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        minutes INTEGER NOT NULL DEFAULT 0,
+        heat_units INTEGER NOT NULL DEFAULT 0,  -- soma de minutes / 15 (intensidade do heatmap)
+        PRIMARY KEY (day, hour, subject_id)
+    ) WITHOUT ROWID
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_rollup_insert
+    AFTER INSERT ON study_sessions
+    BEGIN
+        INSERT INTO session_rollups (day, hour, subject_id, sessions, minutes, heat_units)
+        VALUES ({_DAY_V1.format(col='NEW.started_at')}, {_HOUR_V1.format(col='NEW.started_at')},
+                NEW.subject_id, 1, NEW.minutes, NEW.minutes / 15)
+        ON CONFLICT (day, hour, subject_id) DO UPDATE SET
+            sessions = sessions + 1,
+            minutes = minutes + excluded.minutes,
+            heat_units = heat_units + excluded.heat_units;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_rollup_delete
+    AFTER DELETE ON study_sessions
+    BEGIN
+        UPDATE session_rollups SET
+            sessions = sessions - 1,
+            minutes = minutes - OLD.minutes,
+            heat_units = heat_units - OLD.minutes / 15
+        WHERE {_OLD_CELL_V1};
+        DELETE FROM session_rollups WHERE {_OLD_CELL_V1} AND sessions <= 0;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_sessions_rollup_update
+    AFTER UPDATE OF subject_id, minutes, started_at ON study_sessions
+    BEGIN
+        UPDATE session_rollups SET
+            sessions = sessions - 1,
+            minutes = minutes - OLD.minutes,
+            heat_units = heat_units - OLD.minutes / 15
+        WHERE {_OLD_CELL_V1};
+        DELETE FROM session_rollups WHERE {_OLD_CELL_V1} AND sessions <= 0;
+        INSERT INTO session_rollups (day, hour, subject_id, sessions, minutes, heat_units)
+        VALUES ({_DAY_V1.format(col='NEW.started_at')}, {_HOUR_V1.format(col='NEW.started_at')},
+                NEW.subject_id, 1, NEW.minutes, NEW.minutes / 15)
+        ON CONFLICT (day, hour, subject_id) DO UPDATE SET
+            sessions = sessions + 1,
+            minutes = minutes + excluded.minutes,
+            heat_units = heat_units + excluded.heat_units;
+    END
+    ''',
+]
+
+
+def rebuild_rollups_v1(cursor):
+    cursor.execute('DELETE FROM session_rollups')
+    cursor.execute(f'''
+        INSERT INTO session_rollups (day, hour, subject_id, sessions, minutes, heat_units)
+        SELECT
+            {_DAY_V1.format(col='started_at')},
+            {_HOUR_V1.format(col='started_at')},
+            subject_id,
+            COUNT(*),
+            SUM(minutes),
+            SUM(minutes / 15)
+        FROM study_sessions
+        GROUP BY 1, 2, 3
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM session_rollups')
+    return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula os agregados do dashboard (células, totais e "
+                                                 "sequências) a partir das sessões")
+    parser.add_argument("--db", default="pomodoro.db", help="caminho do banco SQLite")
+    args = parser.parse_args()
+
+    try:
+        from backend.database import Database
+    except ModuleNotFoundError:
+        from database import Database
+
+    started = time.perf_counter()
+    cells = Database(args.db).rebuild_rollups()
+    print(f"✅ {cells} agregados, totais e sequências recalculados em {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
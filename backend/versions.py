@@ -0,0 +1,57 @@
+"""
+Versão de modificação por tabela, mantida no próprio banco.
+
+Cada INSERT/UPDATE/DELETE nas tabelas rastreadas incrementa o contador da tabela
+em table_versions (via triggers), inclusive quando a escrita vem de outro processo.
+A API usa essas versões para calcular ETags sem executar as consultas.
+"""
+
+TRACKED_TABLES = ('cycles', 'subjects', 'study_sessions', 'stats')
+
+VERSION_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    *(
+        f"INSERT OR IGNORE INTO table_versions (name, version) VALUES ('{table}', 0)"
+        for table in TRACKED_TABLES
+    ),
+    *(
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+        AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+        END
+        '''
+        for table in TRACKED_TABLES
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ),
+]
+
+
+def read_table_versions(cursor):
+    """Retorna {tabela: versão} para as tabelas rastreadas"""
+    cursor.execute('SELECT name, version FROM table_versions')
+    return dict(cursor.fetchall())
+
+
+def read_version_total(cursor):
+    """Soma das versões: muda a cada escrita nas tabelas rastreadas, em qualquer processo"""
+    cursor.execute('SELECT SUM(version) FROM table_versions')
+    return cursor.fetchone()[0] or 0
+
+
+def advance_table_versions(cursor, floor):
+    """Leva cada versão para acima de max(atual, floor[tabela])
+
+    Usado depois de restaurar um backup: o arquivo restaurado traz versões antigas,
+    que podem coincidir com ETags já entregues para outro conteúdo.
+    """
+    for table in TRACKED_TABLES:
+        cursor.execute('''
+            UPDATE table_versions SET version = MAX(version, ?) + 1 WHERE name = ?
+        ''', (floor.get(table, 0), table))
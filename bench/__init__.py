@@ -0,0 +1,12 @@
+"""
+Benchmarks do Database e da API sobre um banco com carga sintética.
+
+    pip install -r bench/requirements.txt
+    python -m bench --users 1 --years 10 --out baseline.json
+    python -m bench --users 1 --years 10 --compare baseline.json --fail-on-regression
+
+O banco populado (bench/seed.py) é reaproveitado entre execuções com os mesmos
+parâmetros; cada grupo (database, api, scenarios) roda numa cópia dele. O resultado traz
+p50/p90/p99 de cada método do Database e de cada rota da API, os cenários de carga
+(bench/scenarios.py) e o pico de memória do processo.
+"""
@@ -0,0 +1,270 @@
+"""
+Executa os benchmarks e salva o resultado em JSON (ver bench/__init__.py)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bench import api_bench, database_bench, scenarios, workers
+from bench.seed import seed
+from bench.timing import peak_rss_mb
+
+GROUPS = ('database', 'api', 'scenarios', 'workers', 'aggregation')
+
+# aggregation popula o próprio banco (1 milhão de sessões): só roda quando pedido em --only
+DEFAULT_GROUPS = ('database', 'api', 'scenarios', 'workers')
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def prepare_seed(seed_db, params, reseed=False):
+    """Reaproveita o banco populado com os mesmos parâmetros ou cria um novo"""
+    meta_path = seed_db + '.json'
+
+    if os.path.exists(seed_db) and os.path.exists(meta_path) and not reseed:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if all(meta['params'].get(key) == value for key, value in params.items()):
+            log(f"Reaproveitando {seed_db} ({meta['sessions']} sessões)")
+            return meta
+        log(f"{seed_db} foi gerado com outros parâmetros: recriando")
+
+    for suffix in ('', '-wal', '-shm', '.json'):
+        if os.path.exists(seed_db + suffix):
+            os.remove(seed_db + suffix)
+
+    log(f"Populando {seed_db}...")
+    meta = seed(seed_db, progress=lambda n: log(f"  {n} sessões"), **params)
+    meta['params'] = params
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    log(f"  {meta['sessions']} sessões em {meta['seconds']}s")
+    return meta
+
+
+def working_copy(seed_db, workdir, name):
+    """Cada grupo roda numa cópia do banco populado: as escritas não se acumulam entre execuções"""
+    path = os.path.join(workdir, name)
+    shutil.copyfile(seed_db, path)
+    return path
+
+
+def run_api(path, meta, repeat, selected, sse_clients):
+    """Rotas e cenários de API (um único event loop: os semáforos das rotas ficam presos ao loop)"""
+    os.environ['POMODORO_DB_PATH'] = path
+    main = api_bench.load_app()
+    results = {}
+
+    async def run():
+        if 'api' in selected:
+            results['api'] = await api_bench.run(main, meta, repeat=repeat, progress=lambda n: log(f"  {n}"))
+
+        if 'scenarios' in selected:
+            found = results['scenarios'] = {}
+            async with api_bench.make_client(main.app) as client:
+                log("  ingest")
+                found['ingest'] = await scenarios.ingest(client, meta)
+                log("  health_under_load")
+                found['health_under_load'] = await scenarios.health_under_load(client, main, meta)
+                log("  etag")
+                found['etag'] = await scenarios.etag(client, meta)
+
+    asyncio.run(run())
+
+    if 'scenarios' in selected:
+        log("  sse_fanout")
+        results['scenarios']['sse_fanout'] = scenarios.sse_fanout(main, meta, clients=sse_clients)
+
+    main.db.close()
+    return results
+
+
+def run_scenarios(path, meta, workdir):
+    """Cenários que usam o Database diretamente, em ordem, sobre a mesma cópia"""
+    found = {}
+    for name, call in (
+        ('query_counts', lambda: scenarios.query_counts(path, meta)),
+        ('query_plans', lambda: scenarios.query_plans(path, meta)),
+        ('patterns_rollups', lambda: scenarios.patterns_rollups(path)),
+        ('backup_under_writer', lambda: scenarios.backup_under_writer(path, meta, workdir)),
+        # Por último: o escritor contínuo multiplica o número de sessões do banco
+        ('read_under_ingest', lambda: scenarios.read_under_ingest(path, meta)),
+    ):
+        log(f"  {name}")
+        found[name] = call()
+    return found
+
+
+def flatten(results):
+    """{"database.get_all_cycles": p50, ...} com as medidas comparáveis entre execuções"""
+    flat = {}
+    for name, summary in results.get('database', {}).get('methods', {}).items():
+        flat[f"database.{name}"] = summary['p50']
+    for name, summary in results.get('api', {}).get('routes', {}).items():
+        flat[f"api.{name}"] = summary['p50']
+    return flat
+
+
+def compare(current, baseline_path, threshold):
+    """Lista as medidas cujo p50 piorou mais que threshold (fração) em relação ao baseline"""
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f))
+
+    regressions = []
+    for name, value in sorted(flatten(current).items()):
+        old = baseline.get(name)
+        # Abaixo de 0,05 ms a diferença é ruído
+        if old is None or max(old, value) < 0.05:
+            continue
+        change = (value - old) / old if old else float('inf')
+        if change > threshold:
+            regressions.append({'name': name, 'baseline': old, 'current': value, 'change': round(change, 3)})
+    return regressions
+
+
+def print_table(results):
+    rows = []
+    for name, summary in results.get('database', {}).get('methods', {}).items():
+        rows.append((f"database {name}", summary))
+    for name, summary in results.get('api', {}).get('routes', {}).items():
+        rows.append((f"api {name}", summary))
+
+    width = max((len(name) for name, _ in rows), default=10)
+    print(f"{'medida'.ljust(width)}  {'n':>4} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}  (ms)")
+    for name, summary in rows:
+        print(f"{name.ljust(width)}  {summary['n']:>4} {summary['p50']:>9.3f} {summary['p90']:>9.3f} "
+              f"{summary['p99']:>9.3f} {summary['max']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmarks do Database e da API")
+    parser.add_argument("--seed-db", default=os.path.join(tempfile.gettempdir(), "pomodoro-bench.db"),
+                        help="banco populado (reaproveitado se os parâmetros forem os mesmos)")
+    parser.add_argument("--reseed", action="store_true", help="recria o banco populado")
+    parser.add_argument("--users", type=int, default=1, help="usuários (um ciclo cada)")
+    parser.add_argument("--years", type=float, default=10, help="anos de histórico")
+    parser.add_argument("--subjects", type=int, default=5, help="disciplinas por usuário")
+    parser.add_argument("--sessions-per-day", type=int, default=6, help="média de sessões por dia de estudo")
+    parser.add_argument("--seed", type=int, default=42, help="semente do gerador aleatório")
+    parser.add_argument("--repeat", type=int, default=20, help="repetições por método/rota")
+    parser.add_argument("--only", default=",".join(DEFAULT_GROUPS),
+                        help="grupos: database, api, scenarios, workers, aggregation")
+    parser.add_argument("--sse-clients", type=int, default=200, help="conexões SSE no cenário sse_fanout")
+    parser.add_argument("--workers", help="números de workers do grupo workers (ex.: 1,2,4; padrão 1, 2 e as CPUs)")
+    parser.add_argument("--load-seconds", type=float, default=5, help="duração da carga de leitura por número de workers")
+    parser.add_argument("--aggregation-db", default=os.path.join(tempfile.gettempdir(), "pomodoro-bench-1m.db"),
+                        help="banco populado do grupo aggregation (reaproveitado como --seed-db)")
+    parser.add_argument("--aggregation-users", type=int, default=54,
+                        help="usuários do grupo aggregation (10 anos cada; 54 = cerca de 1 milhão de sessões)")
+    parser.add_argument("--out", help="salva o resultado em JSON (baseline)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar os p50")
+    parser.add_argument("--threshold", type=float, default=0.25, help="piora máxima aceita no p50 (fração)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="sai com código 1 se houver regressão")
+    args = parser.parse_args()
+
+    selected = {group.strip() for group in args.only.split(',') if group.strip()}
+    unknown = selected - set(GROUPS)
+    if unknown:
+        parser.error(f"grupos desconhecidos: {', '.join(sorted(unknown))}")
+
+    meta = prepare_seed(args.seed_db, {'users': args.users, 'years': args.years, 'subjects': args.subjects,
+                                       'sessions_per_day': args.sessions_per_day, 'random_seed': args.seed},
+                        args.reseed)
+    started = time.perf_counter()
+    workdir = tempfile.mkdtemp(prefix="pomodoro-bench-")
+
+    results = {
+        'meta': {
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+            'seed': {key: meta[key] for key in ('users', 'years', 'subjectsPerUser', 'sessionsPerDay',
+                                                'randomSeed', 'sessions', 'bytes')},
+        },
+    }
+
+    try:
+        if 'database' in selected:
+            log("Database")
+            db = database_bench.Database(working_copy(args.seed_db, workdir, 'database.db'))
+            try:
+                results['database'] = database_bench.run(db, meta, workdir, repeat=args.repeat,
+                                                         progress=lambda n: log(f"  {n}"))
+            finally:
+                db.close()
+
+        if 'scenarios' in selected:
+            log("Cenários (Database)")
+            results['scenarios'] = run_scenarios(working_copy(args.seed_db, workdir, 'scenarios.db'), meta, workdir)
+
+        if selected & {'api', 'scenarios'}:
+            log("API")
+            api_results = run_api(working_copy(args.seed_db, workdir, 'api.db'), meta, args.repeat, selected,
+                                  args.sse_clients)
+            results.setdefault('scenarios', {}).update(api_results.pop('scenarios', {}))
+            results.update(api_results)
+
+        if 'workers' in selected:
+            log("Workers")
+            counts = sorted({int(n) for n in args.workers.split(',')}) if args.workers else None
+            results['workers'] = workers.run(working_copy(args.seed_db, workdir, 'workers.db'), meta,
+                                             worker_counts=counts, seconds=args.load_seconds,
+                                             progress=lambda n: log(f"  {n}"))
+            for count, found in results['workers']['workers'].items():
+                log(f"  {count} worker(s): {found['requestsPerSecond']} req/s, p50 {found['latency']['p50']} ms, "
+                    f"speedup {results['workers']['speedup'][count]}, leituras desatualizadas "
+                    f"{results['workers']['staleReads'][count]}")
+
+        if 'aggregation' in selected:
+            log("Agregações (caminho antigo em Python x SQL)")
+            prepare_seed(args.aggregation_db, {'users': args.aggregation_users, 'years': 10, 'subjects': args.subjects,
+                                               'sessions_per_day': args.sessions_per_day, 'random_seed': args.seed},
+                         args.reseed)
+            # Só leituras: roda direto no banco populado, sem a cópia de trabalho
+            found = results['aggregation'] = scenarios.aggregation_paths(args.aggregation_db)
+            for name in ('get_heatmap_data', 'get_study_patterns'):
+                python, sql = found[name]['python'], found[name]['sql']
+                log(f"  {name}: {python['cpuSeconds']}s CPU / {python['peakMb']} MB -> "
+                    f"{sql['cpuSeconds']}s CPU / {sql['peakMb']} MB ({found['sessions']} sessões)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results['meta']['seconds'] = round(time.perf_counter() - started, 1)
+    results['meta']['peakRssMb'] = peak_rss_mb()
+
+    print_table(results)
+    for group, key in (('database', 'uncovered'), ('api', 'uncovered'), ('api', 'failures')):
+        if results.get(group, {}).get(key):
+            log(f"⚠️  {group} {key}: {results[group][key]}")
+
+    if args.compare:
+        regressions = results['regressions'] = compare(results, args.compare, args.threshold)
+        for item in regressions:
+            log(f"🔺 {item['name']}: {item['baseline']} -> {item['current']} ms (+{item['change']:.0%})")
+        if not regressions:
+            log(f"Sem regressões acima de {args.threshold:.0%} em relação a {args.compare}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        log(f"Resultado salvo em {args.out}")
+
+    if args.compare and results['regressions'] and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
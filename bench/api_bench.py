@@ -0,0 +1,203 @@
+"""
+Cronometra cada rota de backend/main.py com um cliente ASGI no mesmo processo (httpx).
+
+Os casos são indexados pelo rótulo da rota ("GET /api/cycles/{cycle_id}"), o mesmo de
+ROUTE_CONCURRENCY_LIMITS, com uma variante opcional entre colchetes. Rotas sem caso
+aparecem em "uncovered". As rotas de estatísticas rodam com o cache quente e também
+"[cold]", com o cache limpo antes de cada requisição.
+
+O módulo backend.main cria o Database ao ser importado: defina POMODORO_DB_PATH antes
+de chamar load_app.
+"""
+
+import importlib
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from bench.database_bench import cycle_payload, session_payload, subject_payload
+from bench.timing import measure_async, summarize
+
+# O ASGITransport do httpx só devolve a resposta completa: streams sem fim ficam no cenário SSE
+STREAMING_ROUTES = {'GET /api/stats/stream'}
+
+# Token dos endpoints de administração no app de benchmark
+ADMIN_TOKEN = 'bench'
+
+
+def load_app():
+    """Importa backend.main (que abre o banco de POMODORO_DB_PATH)"""
+    os.environ['POMODORO_ADMIN_TOKEN'] = ADMIN_TOKEN
+    return importlib.import_module('backend.main')
+
+
+def route_labels(app):
+    """Rótulos "MÉTODO caminho" das rotas da API (sem /docs e /openapi.json)"""
+    from fastapi.routing import APIRoute
+
+    return {
+        f"{method} {route.path}"
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+
+
+def api_cases(main, meta):
+    """Casos: (rótulo, build(i) -> (método, url, kwargs do httpx), repetições ou None)
+
+    build roda fora do cronômetro e pode preparar o banco (ex.: criar o ciclo a apagar).
+    """
+    db = main.db
+    cycle_id = meta['cycles'][0]
+    subject_id = meta['subjects'][0]
+    today = date.today().isoformat()
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    now = datetime.now(timezone.utc)
+
+    def get(url, **kwargs):
+        return lambda i: ('GET', url, kwargs)
+
+    def cold(url):
+        def build(i):
+            main.stats_cache.clear()
+            return 'GET', url, {}
+        return build
+
+    def delete_cycle(i):
+        db.create_cycle(cycle_payload(f"api-delete-cycle-{i}"))
+        return 'DELETE', f"/api/cycles/api-delete-cycle-{i}", {}
+
+    def delete_subject(i):
+        db.create_subject(subject_payload(f"api-delete-subject-{i}", cycle_id))
+        return 'DELETE', f"/api/subjects/api-delete-subject-{i}", {}
+
+    def batch(i):
+        moment = now - timedelta(days=2)
+        sessions = [session_payload(subject_id, moment + timedelta(seconds=n), key=f"api-batch-{i}-{n}")
+                    for n in range(1000)]
+        return 'POST', '/api/sessions/batch', {'json': sessions}
+
+    def sync_push(i):
+        return 'POST', '/api/sync', {'json': {'since': db.sync_cursor(), 'mutations': [
+            {'table': 'stats', 'op': 'upsert', 'data': {
+                'date': today, 'completedSessions': 8, 'totalFocusTime': 200, 'totalBreakTime': 40,
+            }},
+        ]}}
+
+    # NDJSON com as sessões dos últimos 7 dias (reimportar não duplica nada)
+    since = (now - timedelta(days=7)).isoformat()
+    ndjson = ''.join(
+        json.dumps({'type': kind, 'data': data}, ensure_ascii=False) + '\n'
+        for kind, data in db.iter_export_records(since=since)
+    ).encode('utf-8')
+
+    restore_file = os.path.join(os.path.dirname(os.path.abspath(db.db_path)), '.bench-api-restore.db')
+
+    def restore(i):
+        db.backup_to(restore_file)
+        with open(restore_file, 'rb') as f:
+            content = f.read()
+        os.remove(restore_file)
+        return 'POST', '/api/backup/restore', {'files': {'file': ('backup.db', content, 'application/octet-stream')}}
+
+    return [
+        ('GET /', get('/'), None),
+        ('GET /api/health', get('/api/health'), None),
+        ('GET /api/pool', get('/api/pool'), None),
+        ('GET /api/events', get('/api/events'), None),
+        ('GET /api/cache', get('/api/cache'), None),
+        ('GET /metrics', get('/metrics'), None),
+        ('GET /api/slow-queries', get('/api/slow-queries'), None),
+        ('POST /api/cycles', lambda i: ('POST', '/api/cycles', {'json': cycle_payload(f"api-cycle-{i}")}), None),
+        ('GET /api/cycles', get('/api/cycles'), None),
+        ('GET /api/cycles/active', get('/api/cycles/active'), None),
+        ('GET /api/cycles/{cycle_id}', get(f"/api/cycles/{cycle_id}"), None),
+        ('PUT /api/cycles/{cycle_id}/activate', lambda i: ('PUT', f"/api/cycles/{cycle_id}/activate", {}), None),
+        ('PUT /api/cycles/{cycle_id}', lambda i: ('PUT', f"/api/cycles/{cycle_id}", {'json': {
+            'name': 'Ciclo 1', 'study_days': ['mon', 'tue', 'wed', 'thu', 'fri'], 'week_start_date': today,
+        }}), None),
+        ('DELETE /api/cycles/{cycle_id}', delete_cycle, None),
+        ('PUT /api/cycles/{cycle_id}/reset-week',
+         lambda i: ('PUT', f"/api/cycles/{cycle_id}/reset-week", {}), None),
+        ('POST /api/subjects', lambda i: ('POST', '/api/subjects', {
+            'json': subject_payload(f"api-subject-{i}", cycle_id)}), None),
+        ('GET /api/subjects', get('/api/subjects'), None),
+        ('GET /api/subjects/{subject_id}', get(f"/api/subjects/{subject_id}"), None),
+        ('PUT /api/subjects/{subject_id}', lambda i: ('PUT', f"/api/subjects/{subject_id}", {'json': {
+            'name': 'Matemática', 'weeklyHours': 6, 'color': '#667eea', 'priority': 1,
+        }}), None),
+        ('DELETE /api/subjects/{subject_id}', delete_subject, None),
+        ('POST /api/sessions', lambda i: ('POST', '/api/sessions', {
+            'json': session_payload(subject_id, now - timedelta(minutes=30 + i), key=f"api-session-{i}")}), None),
+        ('GET /api/sessions', get('/api/sessions?limit=50'), None),
+        ('GET /api/sessions[cycle, period]',
+         get(f"/api/sessions?cycle={cycle_id}&start={month_ago}&end={today}&limit=50"), None),
+        ('POST /api/sessions/batch[1000]', batch, 5),
+        ('GET /api/settings', get('/api/settings'), None),
+        ('PUT /api/settings', lambda i: ('PUT', '/api/settings', {'json': {'utcOffsetMinutes': 0}}), None),
+        ('GET /api/stats/general', get('/api/stats/general'), None),
+        ('GET /api/stats/general[cold]', cold('/api/stats/general'), None),
+        ('GET /api/stats/chart-data', get('/api/stats/chart-data?period=year'), None),
+        ('GET /api/stats/chart-data[cold]', cold('/api/stats/chart-data?period=year'), None),
+        ('GET /api/stats/heatmap', get('/api/stats/heatmap'), None),
+        ('GET /api/stats/heatmap[cold]', cold('/api/stats/heatmap'), None),
+        ('GET /api/stats/patterns', get('/api/stats/patterns'), None),
+        ('GET /api/stats/patterns[cold]', cold('/api/stats/patterns'), None),
+        ('GET /api/stats/ranking', get('/api/stats/ranking'), None),
+        ('GET /api/stats/ranking[cold]', cold('/api/stats/ranking'), None),
+        ('GET /api/stats/{date}', get(f"/api/stats/{today}"), None),
+        ('PUT /api/stats/{date}', lambda i: ('PUT', f"/api/stats/{today}", {'json': {
+            'completedSessions': 8, 'totalFocusTime': 200, 'totalBreakTime': 40,
+        }}), None),
+        ('GET /api/sync', lambda i: ('GET', f"/api/sync?since={db.sync_cursor()}", {}), None),
+        ('GET /api/sync[full page]', get('/api/sync?limit=1000'), None),
+        ('GET /api/sync/cursor', get('/api/sync/cursor'), None),
+        ('POST /api/sync', sync_push, None),
+        ('GET /api/export/csv', get('/api/export/csv'), 3),
+        ('GET /api/export/csv[30 days]', get(f"/api/export/csv?start={month_ago}&end={today}"), None),
+        ('GET /api/export/json', get('/api/export/json'), 3),
+        ('GET /api/export/json[ndjson]', get('/api/export/json?format=ndjson'), 3),
+        ('POST /api/import/ndjson[7 days]', lambda i: ('POST', '/api/import/ndjson', {
+            'content': ndjson, 'headers': {'Content-Type': 'application/x-ndjson'}}), 5),
+        ('POST /api/backup/create', lambda i: ('POST', '/api/backup/create', {}), 3),
+        ('POST /api/backup/create[gzip]', lambda i: ('POST', '/api/backup/create?compress=gzip', {}), 2),
+        ('POST /api/backup/restore', restore, 2),
+        ('POST /api/admin/profile[0.2s]', lambda i: ('POST', '/api/admin/profile?seconds=0.2&format=top', {
+            'headers': {'X-Admin-Token': ADMIN_TOKEN}}), 3),
+    ]
+
+
+def make_client(app):
+    import httpx
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=None)
+
+
+async def run(main, meta, repeat=20, progress=None):
+    """Executa todos os casos e retorna {rótulo: resumo}, as rotas sem cobertura e as falhas"""
+    cases = api_cases(main, meta)
+    results = {}
+    failures = {}
+
+    async with make_client(main.app) as client:
+        for name, build, case_repeat in cases:
+            if progress:
+                progress(name)
+            prepared = {}
+
+            def setup(i, build=build):
+                prepared['request'] = build(i)
+                return ()
+
+            async def call():
+                method, url, kwargs = prepared['request']
+                response = await client.request(method, url, **kwargs)
+                if response.status_code >= 400:
+                    failures[name] = f"{response.status_code}: {response.text[:200]}"
+
+            count = case_repeat or repeat
+            samples = await measure_async(call, repeat=count, warmup=0 if case_repeat else 2, setup=setup)
+            results[name] = summarize(samples)
+
+    covered = {name.split('[')[0] for name, _, _ in cases}
+    uncovered = sorted(route_labels(main.app) - covered - STREAMING_ROUTES)
+    return {'routes': results, 'uncovered': uncovered, 'failures': failures}
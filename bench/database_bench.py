@@ -0,0 +1,196 @@
+"""
+Cronometra cada método público do Database sobre o banco populado.
+
+Cada caso é (nome, chamada, setup, repetições). O nome é o do método, com uma variante
+opcional entre colchetes (ex.: "get_chart_data[year]"). Métodos públicos sem caso
+aparecem em "uncovered" no relatório, para que métodos novos não fiquem de fora.
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from backend.changelog import format_cursor
+from backend.database import Database
+
+from bench.seed import iso
+from bench.timing import measure, summarize
+
+# Métodos públicos que não são operações do banco
+NOT_BENCHMARKED = {'connection', 'transaction', 'close'}
+
+
+def consume(iterable):
+    """Percorre um gerador inteiro (iter_sessions, iter_export_records)"""
+    count = 0
+    for _ in iterable:
+        count += 1
+    return count
+
+
+def session_payload(subject_id, moment, minutes=25, key=None):
+    return {
+        'subject_id': subject_id,
+        'minutes': minutes,
+        'started_at': iso(moment),
+        'completed_at': iso(moment + timedelta(minutes=minutes)),
+        'idempotency_key': key,
+    }
+
+
+def cycle_payload(cycle_id):
+    return {
+        'id': cycle_id,
+        'name': 'Ciclo de benchmark',
+        'study_days': ['mon', 'wed', 'fri'],
+        'created_at': iso(datetime.now(timezone.utc)),
+        'week_start_date': date.today().isoformat(),
+        'is_active': False,
+    }
+
+
+def subject_payload(subject_id, cycle_id):
+    return {
+        'id': subject_id,
+        'cycle_id': cycle_id,
+        'name': 'Disciplina de benchmark',
+        'weeklyHours': 4,
+        'color': '#667eea',
+        'priority': 1,
+    }
+
+
+def database_cases(db, meta, workdir, peer):
+    """Casos de benchmark: (nome, chamada, setup(i) -> argumentos, repetições ou None)
+
+    peer é um segundo Database(shared=True) sobre o mesmo arquivo, no papel de outro worker:
+    as escritas de db são externas para ele.
+    """
+    cycle_id = meta['cycles'][0]
+    subject_id = meta['subjects'][0]
+    today = date.today().isoformat()
+    month_ago = (date.today() - timedelta(days=30)).isoformat()
+    now = datetime.now(timezone.utc)
+    backup_path = os.path.join(workdir, 'bench-backup.db')
+
+    # Cursor de sincronização ~1000 alterações atrás
+    epoch, seq = db.sync_cursor().split('.')
+    recent_cursor = format_cursor(epoch, max(0, int(seq) - 1000))
+
+    # Registros pequenos para reimportar (upsert idempotente)
+    import_sample = list(db.iter_export_records(since=(now - timedelta(days=7)).isoformat()))
+
+    def created_cycle(i):
+        db.create_cycle(cycle_payload(f"bench-delete-cycle-{i}"))
+        return (f"bench-delete-cycle-{i}",)
+
+    def created_subject(i):
+        db.create_subject(subject_payload(f"bench-delete-subject-{i}", cycle_id))
+        return (f"bench-delete-subject-{i}",)
+
+    def fresh_backup(i):
+        restore_path = os.path.join(os.path.dirname(os.path.abspath(db.db_path)), f".bench-restore-{i}.db")
+        db.backup_to(restore_path)
+        return (restore_path,)
+
+    def external_write(i):
+        db.update_stats(today, {'completedSessions': i, 'totalFocusTime': 200, 'totalBreakTime': 40})
+        return ()
+
+    def sessions_batch(i):
+        moment = now - timedelta(days=1)
+        return ([session_payload(subject_id, moment + timedelta(seconds=n), key=f"bench-batch-{i}-{n}")
+                 for n in range(1000)],)
+
+    return [
+        ('get_table_versions', db.get_table_versions, None, None),
+        ('pool_stats', db.pool_stats, None, None),
+        ('init_db', db.init_db, None, None),
+        ('schema_version', db.schema_version, None, None),
+        # Antes de restore_from, que troca o arquivo sob as conexões abertas do peer
+        ('shared_version', peer.shared_version, None, None),
+        ('poll_external_changes', peer.poll_external_changes, None, None),
+        ('poll_external_changes[external write]', peer.poll_external_changes, external_write, None),
+        ('create_cycle', lambda c: db.create_cycle(c), lambda i: (cycle_payload(f"bench-cycle-{i}"),), None),
+        ('get_all_cycles', db.get_all_cycles, None, None),
+        ('get_cycle_by_id', lambda: db.get_cycle_by_id(cycle_id), None, None),
+        ('get_active_cycle', db.get_active_cycle, None, None),
+        ('set_active_cycle', lambda: db.set_active_cycle(cycle_id), None, None),
+        ('update_cycle', lambda: db.update_cycle(cycle_id, {
+            'name': 'Ciclo 1', 'study_days': ['mon', 'tue', 'wed', 'thu', 'fri'], 'week_start_date': today,
+        }), None, None),
+        ('delete_cycle', db.delete_cycle, created_cycle, None),
+        ('create_subject', lambda s: db.create_subject(s),
+         lambda i: (subject_payload(f"bench-subject-{i}", cycle_id),), None),
+        ('get_subjects_by_cycle', lambda: db.get_subjects_by_cycle(cycle_id), None, None),
+        ('get_subject', lambda: db.get_subject(subject_id), None, None),
+        ('update_subject', lambda: db.update_subject(subject_id, {
+            'name': 'Matemática', 'weeklyHours': 6, 'color': '#667eea', 'priority': 1,
+        }), None, None),
+        ('delete_subject', db.delete_subject, created_subject, None),
+        ('reset_week_minutes', lambda: db.reset_week_minutes(cycle_id), None, None),
+        ('create_session', db.create_session,
+         lambda i: (session_payload(subject_id, now - timedelta(minutes=30 + i)),), None),
+        ('create_sessions[1000]', db.create_sessions, sessions_batch, 5),
+        ('get_or_create_stats', lambda: db.get_or_create_stats(today), None, None),
+        ('update_stats', lambda: db.update_stats(today, {
+            'completedSessions': 8, 'totalFocusTime': 200, 'totalBreakTime': 40,
+        }), None, None),
+        ('local_today', db.local_today, None, None),
+        ('get_settings', db.get_settings, None, None),
+        # Alterna o fuso (recalcula os agregados); o último passo volta para UTC
+        ('set_utc_offset', db.set_utc_offset, lambda i: (-180 if i % 2 == 0 else 0,), 4),
+        ('rebuild_rollups', db.rebuild_rollups, None, 3),
+        ('get_general_stats', db.get_general_stats, None, None),
+        ('get_chart_data[week]', lambda: db.get_chart_data('week'), None, None),
+        ('get_chart_data[year]', lambda: db.get_chart_data('year', subject_id), None, None),
+        ('get_heatmap_data', db.get_heatmap_data, None, None),
+        ('get_study_patterns', db.get_study_patterns, None, None),
+        ('get_subject_ranking', db.get_subject_ranking, None, None),
+        ('get_all_sessions', db.get_all_sessions, None, 3),
+        ('iter_sessions[subject, 30 days]', lambda: consume(db.iter_sessions(subject_id, month_ago, today)),
+         None, None),
+        ('get_sessions_page', lambda: db.get_sessions_page(limit=50), None, None),
+        ('get_sessions_page[cycle, period]', lambda: db.get_sessions_page(
+            cycle_id=cycle_id, start_date=month_ago, end_date=today, limit=50), None, None),
+        ('get_all_subjects', db.get_all_subjects, None, None),
+        ('backup_to', lambda: db.backup_to(backup_path), None, 3),
+        ('validate_backup_file', lambda: db.validate_backup_file(backup_path), None, 3),
+        ('restore_from', db.restore_from, fresh_backup, 2),
+        ('iter_export_records', lambda: consume(db.iter_export_records()), None, 3),
+        ('import_records[7 days]', lambda: db.import_records(iter(import_sample)), None, 5),
+        ('sync_cursor', db.sync_cursor, None, None),
+        ('get_changes[1000]', lambda: db.get_changes(recent_cursor, limit=1000), None, None),
+        ('apply_mutations', lambda: db.apply_mutations([
+            {'table': 'stats', 'op': 'upsert', 'data': {
+                'date': today, 'completedSessions': 8, 'totalFocusTime': 200, 'totalBreakTime': 40,
+            }},
+        ], db.sync_cursor()), None, None),
+    ]
+
+
+def uncovered_methods(cases):
+    """Métodos públicos do Database sem caso de benchmark"""
+    covered = {name.split('[')[0] for name, _, _, _ in cases}
+    public = {name for name in dir(Database) if not name.startswith('_') and callable(getattr(Database, name))}
+    return sorted(public - covered - NOT_BENCHMARKED)
+
+
+def run(db, meta, workdir, repeat=20, progress=None):
+    """Executa todos os casos e retorna {nome: resumo} e os métodos sem cobertura"""
+    peer = Database(db.db_path, shared=True)
+    try:
+        cases = database_cases(db, meta, workdir, peer)
+        results = {}
+        for name, call, setup, case_repeat in cases:
+            if progress:
+                progress(name)
+            count = case_repeat or repeat
+            samples = measure(call, repeat=count, warmup=0 if case_repeat else 2, setup=setup)
+            results[name] = summarize(samples)
+    finally:
+        peer.close()
+
+    if os.path.exists(os.path.join(workdir, 'bench-backup.db')):
+        os.remove(os.path.join(workdir, 'bench-backup.db'))
+
+    return {'methods': results, 'uncovered': uncovered_methods(cases)}
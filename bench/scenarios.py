@@ -0,0 +1,489 @@
+"""
+Cenários de carga que um cronômetro por método não cobre.
+
+- ingest: POST /api/sessions/batch com 10 mil sessões
+- read_under_ingest: latência de leitura com e sem um escritor contínuo
+- query_counts: número de consultas de get_all_cycles & cia. com 10x mais ciclos (N+1)
+- query_plans: EXPLAIN QUERY PLAN de cada SELECT executado; marca varreduras completas
+- patterns_rollups: padrões pelos agregados x consulta direta em study_sessions
+- aggregation_paths: CPU e memória do heatmap e dos padrões, caminho antigo em Python x SQL
+- backup_under_writer: backup online com e sem escritas concorrentes
+- health_under_load: latência de /api/health com rotas pesadas em paralelo
+- etag: bytes e tempo de respostas 200 x 304 (If-None-Match)
+- sse_fanout: memória por conexão SSE e latência de entrega, num uvicorn de verdade
+"""
+
+import asyncio
+import re
+import socket
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from backend.database import Database
+
+from bench.database_bench import cycle_payload, session_payload, subject_payload
+from bench.timing import cpu_and_memory, measure, measure_async, summarize
+
+# Tabelas que crescem com o histórico, com os apelidos usados nas consultas (ss = study_sessions);
+# varrer as demais (ciclos, disciplinas, CTEs de poucas linhas...) é aceitável
+LARGE_TABLES = {'study_sessions', 'ss', 'session_rollups', 'change_log'}
+
+# Varreduras esperadas: os padrões agregam o histórico inteiro por hora e dia da semana,
+# e session_rollups já tem uma linha por dia, hora e disciplina (não por sessão)
+EXPECTED_SCANS = {'get_study_patterns': {'session_rollups'}}
+
+PLAN_SCAN = re.compile(r'^SCAN (\w+)(?: AS (\w+))?')
+
+
+def sessions(subject_ids, count, key_prefix, days_ago=3):
+    """count sessões recentes (com idempotency_key) espalhadas entre as disciplinas"""
+    moment = datetime.now(timezone.utc) - timedelta(days=days_ago)
+    return [
+        session_payload(subject_ids[n % len(subject_ids)], moment + timedelta(seconds=n), key=f"{key_prefix}-{n}")
+        for n in range(count)
+    ]
+
+
+@contextmanager
+def traced(db):
+    """Registra os comandos SQL executados (db deve ter pool_size=1 e nenhum escritor único)"""
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        yield statements
+    finally:
+        with db.connection() as conn:
+            conn.set_trace_callback(None)
+
+
+def is_query(statement):
+    return statement.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+# ===== DATABASE =====
+
+def read_under_ingest(db_path, meta, seconds=3.0):
+    """Latência de leituras típicas do dashboard, parado e com um escritor inserindo lotes"""
+    db = Database(db_path, single_writer=True)
+    subject_ids = meta['subjects']
+
+    def read_loop(stop, samples):
+        while not stop.is_set():
+            started = time.perf_counter()
+            db.get_sessions_page(limit=50)
+            db.get_general_stats()
+            samples.append(time.perf_counter() - started)
+
+    def write_loop(stop, written):
+        batch = 0
+        while not stop.is_set():
+            db.create_sessions(sessions(subject_ids, 1000, f"ingest-read-{batch}"))
+            written.append(1000)
+            batch += 1
+
+    def phase(with_writer):
+        stop = threading.Event()
+        samples, written = [], []
+        threads = [threading.Thread(target=read_loop, args=(stop, samples))]
+        if with_writer:
+            threads.append(threading.Thread(target=write_loop, args=(stop, written)))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return samples, sum(written)
+
+    try:
+        idle, _ = phase(False)
+        loaded, written = phase(True)
+    finally:
+        db.close()
+
+    return {
+        'idle': summarize(idle),
+        'underIngest': summarize(loaded),
+        'ingestSessionsPerSecond': round(written / seconds),
+    }
+
+
+def query_counts(db_path, meta, extra_cycles=50):
+    """Consultas SQL por chamada antes e depois de criar extra_cycles ciclos (deve ser constante)"""
+    db = Database(db_path, pool_size=1)
+    cycle_id = meta['cycles'][0]
+    calls = {
+        'get_all_cycles': db.get_all_cycles,
+        'get_active_cycle': db.get_active_cycle,
+        'get_cycle_by_id': lambda: db.get_cycle_by_id(cycle_id),
+        'get_subjects_by_cycle': lambda: db.get_subjects_by_cycle(cycle_id),
+        'get_all_subjects': db.get_all_subjects,
+        'get_subject_ranking': db.get_subject_ranking,
+    }
+
+    def count():
+        result = {}
+        for name, call in calls.items():
+            with traced(db) as statements:
+                call()
+            result[name] = sum(1 for statement in statements if is_query(statement))
+        return result
+
+    try:
+        before = count()
+        for index in range(extra_cycles):
+            db.create_cycle(cycle_payload(f"count-cycle-{index}"))
+            for subject in range(5):
+                db.create_subject(subject_payload(f"count-subject-{index}-{subject}", f"count-cycle-{index}"))
+        after = count()
+    finally:
+        db.close()
+
+    return {
+        'queries': {name: [before[name], after[name]] for name in calls},
+        'constant': before == after,
+    }
+
+
+def query_plans(db_path, meta):
+    """Plano de cada SELECT executado pelas leituras principais; marca varreduras de tabelas grandes
+
+    fullScans traz só as varreduras inesperadas; as de EXPECTED_SCANS vão para expectedScans.
+    """
+    db = Database(db_path, pool_size=1)
+    cycle_id = meta['cycles'][0]
+    subject_id = meta['subjects'][0]
+    since = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+    epoch, seq = db.sync_cursor().split('.')
+    calls = {
+        'get_general_stats': db.get_general_stats,
+        'get_chart_data': lambda: db.get_chart_data('year', subject_id),
+        'get_heatmap_data': db.get_heatmap_data,
+        'get_study_patterns': db.get_study_patterns,
+        'get_subject_ranking': db.get_subject_ranking,
+        'get_sessions_page': lambda: db.get_sessions_page(cycle_id=cycle_id, limit=50),
+        'get_changes': lambda: db.get_changes(f"{epoch}.{max(0, int(seq) - 100)}"),
+        'iter_export_records': lambda: list(db.iter_export_records(since=since)),
+        'get_all_cycles': db.get_all_cycles,
+    }
+
+    plans = {}
+    flagged = []
+    expected = []
+    try:
+        for name, call in calls.items():
+            with traced(db) as statements:
+                call()
+
+            plans[name] = []
+            with db.connection() as conn:
+                for statement in statements:
+                    if not is_query(statement):
+                        continue
+                    steps = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement)]
+                    plans[name].append({'sql': ' '.join(statement.split())[:300], 'plan': steps})
+                    for step in steps:
+                        match = PLAN_SCAN.match(step)
+                        if not match or 'USING' in step or not LARGE_TABLES.intersection(match.groups()):
+                            continue
+                        if match.group(1) in EXPECTED_SCANS.get(name, ()):
+                            expected.append({'call': name, 'step': step})
+                        else:
+                            flagged.append({'call': name, 'step': step})
+    finally:
+        db.close()
+
+    return {'plans': plans, 'fullScans': flagged, 'expectedScans': expected}
+
+
+def patterns_rollups(db_path, repeat=5):
+    """get_study_patterns (agregados) x a mesma agregação direto em study_sessions"""
+    db = Database(db_path)
+    offset = db.utc_offset * 60
+
+    def raw():
+        with db.connection() as conn:
+            conn.execute('''
+                SELECT ((started_ts + ?1) % 86400) / 3600 AS hour, COUNT(*), SUM(minutes)
+                FROM study_sessions GROUP BY hour
+            ''', (offset,)).fetchall()
+            conn.execute('''
+                SELECT ((started_ts + ?1) / 86400 + 3) % 7 AS weekday, COUNT(*), SUM(minutes)
+                FROM study_sessions GROUP BY weekday
+            ''', (offset,)).fetchall()
+
+    try:
+        with db.connection() as conn:
+            total = conn.execute('SELECT COUNT(*) FROM study_sessions').fetchone()[0]
+        rollups = summarize(measure(db.get_study_patterns, repeat=repeat, warmup=1))
+        direct = summarize(measure(raw, repeat=repeat, warmup=1))
+    finally:
+        db.close()
+
+    return {
+        'sessions': total,
+        'rollups': rollups,
+        'studySessions': direct,
+        'speedup': round(direct['p50'] / rollups['p50'], 1) if rollups['p50'] else None,
+    }
+
+
+def legacy_heatmap_data(db):
+    """get_heatmap_data antes dos agregados: lê as sessões de 30 dias e agrupa linha a linha em Python"""
+    start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    with db.connection() as conn:
+        sessions = conn.execute('''
+            SELECT started_at, minutes
+            FROM study_sessions
+            WHERE started_at >= ?
+        ''', (start_date,)).fetchall()
+
+    heatmap = [[0 for _ in range(17)] for _ in range(7)]
+    for started_at, minutes in sessions:
+        dt = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+        if 6 <= dt.hour <= 22:
+            heatmap[dt.weekday()][dt.hour - 6] += minutes // 15
+    return heatmap
+
+
+def legacy_study_patterns(db):
+    """get_study_patterns antes dos agregados: lê todas as sessões e soma por hora e dia em Python"""
+    from collections import defaultdict
+
+    with db.connection() as conn:
+        sessions = conn.execute('SELECT started_at, minutes FROM study_sessions').fetchall()
+
+    hour_stats = defaultdict(int)
+    day_stats = defaultdict(int)
+    durations = []
+    for started_at, minutes in sessions:
+        dt = datetime.fromisoformat(started_at.replace('Z', '+00:00'))
+        hour_stats[dt.hour] += minutes
+        day_stats[dt.weekday()] += minutes
+        durations.append(minutes)
+
+    best_hour = max(hour_stats, key=hour_stats.get) if hour_stats else 14
+    best_day = max(day_stats, key=day_stats.get) if day_stats else 0
+    return best_hour, best_day, sum(durations) // len(durations) if durations else 25
+
+
+def aggregation_paths(db_path, repeat=3):
+    """CPU e pico de memória do heatmap e dos padrões: caminho antigo (Python) x agregados em SQL
+
+    Feito para o banco do grupo aggregation (1 milhão de sessões); em bancos pequenos as
+    diferenças ficam no ruído.
+    """
+    db = Database(db_path)
+    paths = {
+        'get_heatmap_data': (lambda: legacy_heatmap_data(db), db.get_heatmap_data),
+        'get_study_patterns': (lambda: legacy_study_patterns(db), db.get_study_patterns),
+    }
+
+    found = {}
+    try:
+        with db.connection() as conn:
+            total = conn.execute('SELECT COUNT(*) FROM study_sessions').fetchone()[0]
+        for name, (legacy, current) in paths.items():
+            python = cpu_and_memory(legacy, repeat=repeat)
+            sql = cpu_and_memory(current, repeat=repeat)
+            found[name] = {
+                'python': python,
+                'sql': sql,
+                'cpuSpeedup': round(python['cpuSeconds'] / sql['cpuSeconds'], 1) if sql['cpuSeconds'] else None,
+            }
+    finally:
+        db.close()
+
+    return {'sessions': total, **found}
+
+
+def backup_under_writer(db_path, meta, workdir):
+    """Duração do backup online parado e com transações de escrita concorrentes"""
+    import os
+
+    db = Database(db_path, single_writer=True)
+    dest = os.path.join(workdir, 'bench-backup-writer.db')
+    subject_ids = meta['subjects']
+
+    def backup():
+        started = time.perf_counter()
+        db.backup_to(dest)
+        elapsed = time.perf_counter() - started
+        os.remove(dest)
+        return elapsed
+
+    try:
+        idle = backup()
+
+        stop = threading.Event()
+        commits = []
+
+        def write_loop():
+            batch = 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                db.create_sessions(sessions(subject_ids, 100, f"backup-writer-{batch}"))
+                commits.append(time.perf_counter() - started)
+                batch += 1
+
+        writer = threading.Thread(target=write_loop)
+        writer.start()
+        try:
+            loaded = backup()
+        finally:
+            stop.set()
+            writer.join()
+    finally:
+        db.close()
+
+    return {
+        'idleSeconds': round(idle, 3),
+        'withWriterSeconds': round(loaded, 3),
+        'writerCommits': len(commits),
+        'writerCommit': summarize(commits),
+    }
+
+
+# ===== API =====
+
+async def ingest(client, meta, count=10000, repeat=3):
+    """POST /api/sessions/batch com count sessões novas por requisição"""
+    samples = await measure_async(
+        lambda body: client.post('/api/sessions/batch', json=body),
+        repeat=repeat, warmup=0,
+        setup=lambda i: (sessions(meta['subjects'], count, f"ingest-{i}", days_ago=4),),
+    )
+    result = summarize(samples)
+    result['sessionsPerSecond'] = round(count / (result['p50'] / 1000)) if result['p50'] else None
+    return result
+
+
+async def health_under_load(client, main, meta, probes=50):
+    """Latência de /api/health parado e com exportação, padrões (sem cache), lote e backup em paralelo"""
+    async def probe():
+        started = time.perf_counter()
+        await client.get('/api/health')
+        return time.perf_counter() - started
+
+    idle = [await probe() for _ in range(probes)]
+
+    async def patterns():
+        main.stats_cache.clear()
+        await client.get('/api/stats/patterns')
+
+    heavy = [
+        client.get('/api/export/csv'),
+        client.get('/api/export/json?format=ndjson'),
+        client.post('/api/sessions/batch', json=sessions(meta['subjects'], 10000, 'health-load', days_ago=5)),
+        client.post('/api/backup/create'),
+    ] + [patterns() for _ in range(4)]
+
+    tasks = [asyncio.ensure_future(request) for request in heavy]
+    loaded = []
+    while not all(task.done() for task in tasks):
+        loaded.append(await probe())
+        await asyncio.sleep(0.01)
+    await asyncio.gather(*tasks)
+
+    return {'idle': summarize(idle), 'underLoad': summarize(loaded)}
+
+
+async def etag(client, meta, repeat=20):
+    """Para cada GET com ETag: tamanho e tempo da resposta completa x 304 com If-None-Match"""
+    urls = ['/api/cycles', '/api/subjects', f"/api/cycles/{meta['cycles'][0]}", '/api/sessions?limit=50',
+            '/api/stats/general', '/api/stats/chart-data?period=year', '/api/stats/heatmap',
+            '/api/stats/patterns', '/api/stats/ranking', '/api/sync?limit=1000']
+    results = {}
+    for url in urls:
+        first = await client.get(url)
+        tag = first.headers.get('etag')
+
+        full = summarize(await measure_async(lambda: client.get(url), repeat=repeat))
+        not_modified = summarize(await measure_async(
+            lambda: client.get(url, headers={'If-None-Match': tag}), repeat=repeat))
+        status = (await client.get(url, headers={'If-None-Match': tag})).status_code
+
+        results[url] = {
+            'bytes': len(first.content),
+            'notModifiedStatus': status,
+            'full': full,
+            'notModified': not_modified,
+        }
+    return results
+
+
+# ===== SSE =====
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def sse_fanout(main, meta, clients=200, events=10):
+    """Abre clients conexões SSE num uvicorn real e mede memória por conexão e latência de entrega
+
+    A memória é a alocada pelo Python (tracemalloc) ao abrir as conexões; servidor e clientes
+    rodam no mesmo processo, então inclui os dois lados. A latência vai do envio de
+    POST /api/sessions até o evento chegar a cada cliente.
+    Deve ser o último cenário: o shutdown do servidor encerra o distribuidor de eventos.
+    """
+    import httpx
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        main.app, host='127.0.0.1', port=port, log_level='warning', timeout_graceful_shutdown=5,
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    async def scenario():
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        request = f"GET /api/stats/stream HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nAccept: text/event-stream\r\n\r\n"
+        connections = []
+        for _ in range(clients):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request.encode())
+            await writer.drain()
+            await reader.readuntil(b'event: ready')
+            connections.append((reader, writer))
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        latencies = []
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            for index in range(events):
+                async def receive(reader):
+                    await reader.readuntil(b'event: session')
+                    return time.perf_counter()
+
+                waiting = [asyncio.ensure_future(receive(reader)) for reader, _ in connections]
+                started = time.perf_counter()
+                await client.post('/api/sessions', json=session_payload(
+                    meta['subjects'][0], datetime.now(timezone.utc) - timedelta(minutes=index),
+                    key=f"sse-{index}-{started}"))
+                latencies.extend(received - started for received in await asyncio.gather(*waiting))
+
+        for _, writer in connections:
+            writer.close()
+
+        return {
+            'clients': clients,
+            'events': events,
+            'kbPerConnection': round((after - before) / 1024 / clients, 1),
+            'delivery': summarize(latencies),
+        }
+
+    try:
+        return asyncio.run(scenario())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -0,0 +1,162 @@
+"""
+Gerador de carga sintética: popula um banco com ciclos, disciplinas e sessões.
+
+O app é de um usuário só; aqui cada "usuário" é um ciclo com suas disciplinas e o
+próprio histórico de sessões, o que dá o mesmo volume de linhas que N usuários teriam.
+As sessões entram pelo caminho real de ingestão (Database.create_sessions), com as
+triggers de agregados, versões e change_log ativas.
+
+    python -m bench.seed --db /tmp/pomodoro-bench.db --users 10 --years 10
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from backend.database import Database
+
+COLORS = ['#667eea', '#f56565', '#48bb78', '#ed8936', '#9f7aea', '#38b2ac']
+SUBJECT_NAMES = ['Matemática', 'Português', 'Física', 'Química', 'Biologia', 'História',
+                 'Geografia', 'Inglês', 'Filosofia', 'Redação']
+STUDY_DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+# Sessões por chamada de create_sessions (uma transação cada)
+CHUNK_SIZE = 10000
+
+
+def iso(moment):
+    """Instante no formato enviado pelo frontend (toISOString)"""
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z"
+
+
+def generate_sessions(rng, subject_ids, start, days, sessions_per_day):
+    """Gera as sessões de um usuário, dia a dia (em média sessions_per_day por dia, de 6h a 23h)"""
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        # Alguns dias sem estudo quebram as sequências (streaks)
+        if rng.random() < 0.15:
+            continue
+
+        count = rng.randint(0, sessions_per_day * 2)
+        for _ in range(count):
+            started = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(
+                seconds=rng.randrange(6 * 3600, 23 * 3600)
+            )
+            minutes = rng.choice((25, 25, 25, 50))
+            yield {
+                'subject_id': rng.choice(subject_ids),
+                'minutes': minutes,
+                'started_at': iso(started),
+                'completed_at': iso(started + timedelta(minutes=minutes)),
+            }
+
+
+def seed(db_path, users=1, years=10, subjects=5, sessions_per_day=6, random_seed=42, progress=None):
+    """Cria e popula o banco em db_path (que não deve existir); retorna os metadados da carga"""
+    if os.path.exists(db_path):
+        raise FileExistsError(f"O banco já existe: {db_path}")
+
+    rng = random.Random(random_seed)
+    db = Database(db_path, single_writer=True)
+    started = time.perf_counter()
+
+    today = date.today()
+    first_day = today - timedelta(days=int(years * 365))
+    days = (today - first_day).days + 1
+
+    cycles = []
+    subject_ids = []
+    total_sessions = 0
+    pending = []
+
+    def flush():
+        nonlocal total_sessions
+        db.create_sessions(pending)
+        total_sessions += len(pending)
+        pending.clear()
+        if progress:
+            progress(total_sessions)
+
+    try:
+        for user in range(users):
+            cycle_id = f"cycle-{user:05d}"
+            db.create_cycle({
+                'id': cycle_id,
+                'name': f"Ciclo {user + 1}",
+                'study_days': STUDY_DAYS[:5],
+                'created_at': iso(datetime(first_day.year, first_day.month, first_day.day)),
+                'week_start_date': (today - timedelta(days=today.weekday())).isoformat(),
+                'is_active': user == 0,
+            })
+            cycles.append(cycle_id)
+
+            user_subjects = []
+            for index in range(subjects):
+                subject_id = f"subject-{user:05d}-{index:02d}"
+                db.create_subject({
+                    'id': subject_id,
+                    'cycle_id': cycle_id,
+                    'name': SUBJECT_NAMES[index % len(SUBJECT_NAMES)],
+                    'weeklyHours': rng.randint(2, 10),
+                    'color': COLORS[index % len(COLORS)],
+                    'priority': index + 1,
+                })
+                user_subjects.append(subject_id)
+            subject_ids.extend(user_subjects)
+
+            for session in generate_sessions(rng, user_subjects, first_day, days, sessions_per_day):
+                pending.append(session)
+                if len(pending) >= CHUNK_SIZE:
+                    flush()
+
+        if pending:
+            flush()
+
+        # Estatísticas diárias (tabela stats) para o último ano
+        with db.transaction() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO stats (date, completed_sessions, total_focus_time, total_break_time)
+                VALUES (?, ?, ?, ?)
+            ''', [
+                ((today - timedelta(days=offset)).isoformat(), 8, 200, 40)
+                for offset in range(min(days, 365))
+            ])
+    finally:
+        db.close()
+
+    return {
+        'db': db_path,
+        'users': users,
+        'years': years,
+        'subjectsPerUser': subjects,
+        'sessionsPerDay': sessions_per_day,
+        'randomSeed': random_seed,
+        'sessions': total_sessions,
+        'cycles': cycles,
+        'subjects': subject_ids,
+        'firstDay': first_day.isoformat(),
+        'lastDay': today.isoformat(),
+        'seconds': round(time.perf_counter() - started, 2),
+        'bytes': os.path.getsize(db_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Popula um banco com carga sintética para os benchmarks")
+    parser.add_argument("--db", required=True, help="arquivo do banco a criar")
+    parser.add_argument("--users", type=int, default=1, help="usuários (um ciclo cada)")
+    parser.add_argument("--years", type=float, default=10, help="anos de histórico")
+    parser.add_argument("--subjects", type=int, default=5, help="disciplinas por usuário")
+    parser.add_argument("--sessions-per-day", type=int, default=6, help="média de sessões por dia de estudo")
+    parser.add_argument("--seed", type=int, default=42, help="semente do gerador aleatório")
+    args = parser.parse_args()
+
+    meta = seed(args.db, args.users, args.years, args.subjects, args.sessions_per_day, args.seed,
+                progress=lambda n: print(f"  {n} sessões...", end="\r"))
+    print(f"✅ {meta['sessions']} sessões em {meta['seconds']}s ({meta['bytes'] / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Medição: repetições cronometradas, percentis e pico de memória do processo.
+"""
+
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ModuleNotFoundError:  # Windows
+    resource = None
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por interpolação linear (sorted_values já ordenados)"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples):
+    """Resume durações em segundos como milissegundos: n, média, p50, p90, p99 e máximo"""
+    values = sorted(samples)
+    ms = 1000.0
+    return {
+        'n': len(values),
+        'mean': round(sum(values) / len(values) * ms, 3) if values else 0.0,
+        'p50': round(percentile(values, 0.50) * ms, 3),
+        'p90': round(percentile(values, 0.90) * ms, 3),
+        'p99': round(percentile(values, 0.99) * ms, 3),
+        'max': round(values[-1] * ms, 3) if values else 0.0,
+    }
+
+
+def measure(fn, repeat=20, warmup=2, setup=None):
+    """Executa fn repetidas vezes e retorna as durações (setup, se houver, fica fora do cronômetro)
+
+    setup(i) retorna os argumentos de fn para a repetição i.
+    """
+    samples = []
+    for i in range(warmup + repeat):
+        args = setup(i) if setup else ()
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+async def measure_async(fn, repeat=20, warmup=2, setup=None):
+    """Versão de measure para corrotinas"""
+    samples = []
+    for i in range(warmup + repeat):
+        args = setup(i) if setup else ()
+        started = time.perf_counter()
+        await fn(*args)
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+def cpu_and_memory(fn, repeat=3):
+    """Tempo de CPU (process_time, mediana de repeat execuções) e pico de memória alocada pelo Python
+
+    O pico (tracemalloc) é medido numa execução à parte, porque o rastreamento deixa o código
+    Python mais lento; a memória interna do SQLite não entra na conta.
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        samples.append(time.process_time() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'cpuSeconds': round(sorted(samples)[len(samples) // 2], 4),
+        'peakMb': round(peak / (1024 * 1024), 2),
+    }
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo em MB (None onde não houver getrusage)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
@@ -0,0 +1,187 @@
+"""
+Vazão de leitura com 1, 2, ... workers do uvicorn sobre o mesmo banco (modo produção do launcher).
+
+Para cada número de workers sobe um uvicorn real (python -m uvicorn --workers N) numa cópia do
+banco e dispara leituras de processos clientes separados, cada um com várias conexões
+keep-alive, por um tempo fixo. O cliente é um HTTP/1.1 mínimo em asyncio para gastar pouca
+CPU por requisição: clientes e servidor dividem os mesmos núcleos, e a vazão só escala
+enquanto houver núcleos livres (em máquinas de 1 CPU não há ganho a medir).
+
+Depois da carga, o cenário grava uma sessão e lê /api/stats/general por conexões novas
+(que caem em workers diferentes): respostas sem a sessão contam em staleReads.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+from bench.database_bench import session_payload
+from bench.scenarios import free_port
+from bench.timing import summarize
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Leituras da carga (as de estatísticas passam pelo cache e pela versão compartilhada)
+READ_PATHS = (
+    '/api/cycles',
+    '/api/subjects',
+    '/api/sessions?limit=50',
+    '/api/stats/general',
+    '/api/stats/heatmap',
+    '/api/stats/ranking',
+)
+
+# Requisições diretas em 127.0.0.1, sem proxies do ambiente
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def default_worker_counts():
+    cpus = os.cpu_count() or 1
+    return sorted({1, 2, cpus})
+
+
+def start_server(db_path, port, workers):
+    env = dict(os.environ, POMODORO_DB_PATH=db_path, POMODORO_WORKERS=str(workers))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'backend.main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+
+
+def request_json(port, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+    with _opener.open(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def wait_for_workers(process, port, workers, timeout=30.0):
+    """Espera o /api/health responder; retorna os pids vistos (conexões novas a cada tentativa)
+
+    O kernel escolhe o worker de cada conexão: com todos ociosos, nem sempre aparecem todos.
+    """
+    deadline = time.monotonic() + timeout
+    pids = set()
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn encerrou: {process.stderr.read().decode(errors='replace')[-500:]}")
+        try:
+            pids.add(request_json(port, 'GET', '/api/health')['pid'])
+            if len(pids) >= workers:
+                break
+        except (urllib.error.URLError, OSError):
+            pids.clear()
+        time.sleep(0.05 if pids else 0.2)
+    if not pids:
+        raise RuntimeError(f"uvicorn não respondeu em {timeout:.0f}s")
+    return pids
+
+
+async def read_loop(port, deadline, latencies, errors):
+    """Uma conexão keep-alive fazendo GETs em sequência até o prazo"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = 0
+    try:
+        while time.perf_counter() < deadline:
+            path = READ_PATHS[i % len(READ_PATHS)]
+            i += 1
+            started = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if not head.startswith(b'HTTP/1.1 200'):
+                errors.append(head.split(b'\r\n', 1)[0].decode())
+    finally:
+        writer.close()
+
+
+def client_process(port, connections, seconds):
+    """Processo cliente: connections conexões simultâneas por seconds segundos"""
+    async def run():
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(read_loop(port, deadline, latencies, errors) for _ in range(connections)))
+        return latencies, errors
+    return asyncio.run(run())
+
+
+def load(port, seconds, clients, connections):
+    """Carga de leitura de clients processos; retorna (vazão, latências, erros)"""
+    per_client = max(1, connections // clients)
+    started = time.perf_counter()
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(client_process, [(port, per_client, seconds)] * clients)
+    elapsed = time.perf_counter() - started
+    latencies = [value for found, _ in results for value in found]
+    errors = [error for _, found in results for error in found]
+    return len(latencies) / elapsed, latencies, errors
+
+
+def stale_reads(port, meta, key, probes=20):
+    """Grava uma sessão e confere se todas as leituras seguintes (em qualquer worker) já a veem"""
+    before = request_json(port, 'GET', '/api/stats/general')['totalSessions']
+    moment = datetime.now(timezone.utc) - timedelta(hours=1)
+    request_json(port, 'POST', '/api/sessions', session_payload(meta['subjects'][0], moment, key=key))
+    return sum(
+        request_json(port, 'GET', '/api/stats/general')['totalSessions'] != before + 1
+        for _ in range(probes)
+    )
+
+
+def run(db_path, meta, worker_counts=None, seconds=5.0, clients=None, connections=32, progress=None):
+    """Mede a vazão para cada número de workers; retorna {workers: {...}, speedup, staleReads}"""
+    worker_counts = worker_counts or default_worker_counts()
+    clients = clients or max(1, (os.cpu_count() or 1) // 2)
+    found = {}
+    stale = {}
+
+    for workers in worker_counts:
+        if progress:
+            progress(f"{workers} worker(s)")
+        port = free_port()
+        process = start_server(db_path, port, workers)
+        try:
+            pids = wait_for_workers(process, port, workers)
+            load(port, 1.0, clients, connections)  # aquecimento: caches e conexões dos pools
+            throughput, latencies, errors = load(port, seconds, clients, connections)
+            stale[str(workers)] = stale_reads(port, meta, key=f"workers-stale-{workers}")
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+        found[str(workers)] = {
+            'requestsPerSecond': round(throughput, 1),
+            'latency': summarize(latencies),
+            'errors': len(errors),
+            'pidsSeen': len(pids),
+        }
+
+    base = found[str(worker_counts[0])]['requestsPerSecond']
+    return {
+        'cpus': os.cpu_count(),
+        'clients': clients,
+        'connections': connections,
+        'seconds': seconds,
+        'workers': found,
+        'speedup': {workers: round(result['requestsPerSecond'] / base, 2) if base else None
+                    for workers, result in found.items()},
+        'staleReads': stale,
+    }
@@ -60,6 +60,9 @@ class PomodoroApp {
             this.loadInitialState();
             this.requestNotifications();
             
+            // Estatísticas no fuso do navegador (sem bloquear a inicialização)
+            StorageManager.syncTimezone();
+            
             // Atualizar display do ciclo após carregamento
             this.updateCycleDisplay();
             
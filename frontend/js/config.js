@@ -50,7 +50,8 @@ export const STORAGE_KEYS = {
     STATS: 'pomodoro_stats',
     STUDY_CYCLE: 'pomodoro_study_cycle',
     CYCLE_PROGRESS: 'pomodoro_cycle_progress',
-    CUSTOM_TEMPLATES: 'pomodoro_custom_templates'
+    CUSTOM_TEMPLATES: 'pomodoro_custom_templates',
+    SYNC_CURSOR: 'pomodoro_sync_cursor'
 };
 
 export const TIMER_MODES = {
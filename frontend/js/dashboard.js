@@ -9,6 +9,11 @@ class Dashboard {
         this.charts = {};
         this.currentPeriod = 'week';
         this.currentSubject = 'all';
+        // Últimos dados recebidos, atualizados pelos eventos em tempo real
+        this.generalStats = null;
+        this.heatmapData = null;
+        this.ranking = null;
+        this.eventSource = null;
         this.init();
     }
 
@@ -16,6 +21,87 @@ class Dashboard {
         this.setupEventListeners();
         await this.loadData();
         this.setupCharts();
+        this.connectStream();
+    }
+
+    // Atualizações em tempo real (Server-Sent Events)
+    connectStream() {
+        if (!window.EventSource) return;
+
+        // O navegador reconecta sozinho; ao reconectar ("ready") recarrega o que pode ter perdido
+        let connected = false;
+        this.eventSource = new EventSource(`${API_BASE_URL}/api/stats/stream`);
+
+        this.eventSource.addEventListener('ready', () => {
+            if (connected) this.loadData();
+            connected = true;
+        });
+
+        this.eventSource.addEventListener('session', (e) => {
+            this.applySessionDelta(JSON.parse(e.data));
+        });
+
+        this.eventSource.addEventListener('subject', (e) => {
+            const { ranking } = JSON.parse(e.data);
+            this.updateRankingItem(ranking);
+        });
+
+        this.eventSource.addEventListener('subject-deleted', (e) => {
+            const { id } = JSON.parse(e.data);
+            if (this.ranking) {
+                this.renderRanking(this.ranking.filter(item => item.id !== id));
+            }
+        });
+
+        this.eventSource.addEventListener('invalidate', () => {
+            this.loadData();
+        });
+    }
+
+    applySessionDelta(delta) {
+        if (this.generalStats) {
+            this.renderGeneralStats({
+                ...this.generalStats,
+                totalMinutes: this.generalStats.totalMinutes + delta.general.totalMinutes,
+                totalSessions: this.generalStats.totalSessions + delta.general.totalSessions,
+                totalSubjects: this.generalStats.totalSubjects + delta.general.totalSubjects
+            });
+        }
+
+        if (delta.heatmap && this.heatmapData) {
+            const row = this.heatmapData[delta.heatmap.day];
+            const hourIndex = delta.heatmap.hour - 6;
+            if (row) {
+                row[hourIndex] = (row[hourIndex] || 0) + delta.heatmap.value;
+                this.renderHeatmap(this.heatmapData);
+            }
+        }
+
+        if (delta.ranking) {
+            this.updateRankingItem(delta.ranking);
+        }
+
+        // Gráficos e padrões dependem dos filtros: recarregados a partir do servidor
+        this.loadChartData();
+        this.loadPatterns();
+    }
+
+    updateRankingItem(update) {
+        if (!this.ranking) return;
+
+        const current = this.ranking.find(item => item.id === update.id);
+        const item = {
+            id: update.id,
+            name: update.name,
+            weeklyHours: update.weeklyHours,
+            currentMinutes: update.currentMinutes,
+            sessions: (current ? current.sessions : 0) + update.sessionsDelta
+        };
+
+        const ranking = this.ranking.filter(other => other.id !== update.id);
+        ranking.push(item);
+        ranking.sort((a, b) => b.currentMinutes - a.currentMinutes);
+        this.renderRanking(ranking);
     }
 
     setupEventListeners() {
@@ -121,15 +207,22 @@ class Dashboard {
             const response = await fetch(`${API_BASE_URL}/api/stats/general`);
             const stats = await response.json();
             
-            document.getElementById('totalHours').textContent = `${Math.floor(stats.totalMinutes / 60)}h ${stats.totalMinutes % 60}m`;
-            document.getElementById('totalSessions').textContent = stats.totalSessions || 0;
-            document.getElementById('totalSubjects').textContent = stats.totalSubjects || 0;
-            document.getElementById('currentStreak').textContent = stats.currentStreak || 0;
+            this.renderGeneralStats(stats);
         } catch (error) {
             console.error('Erro ao carregar estatísticas gerais:', error);
         }
     }
 
+    renderGeneralStats(stats) {
+        this.generalStats = stats;
+
+        document.getElementById('totalHours').textContent = `${Math.floor(stats.totalMinutes / 60)}h ${stats.totalMinutes % 60}m`;
+        document.getElementById('totalSessions').textContent = stats.totalSessions || 0;
+        document.getElementById('totalSubjects').textContent = stats.totalSubjects || 0;
+        document.getElementById('currentStreak').textContent = stats.currentStreak || 0;
+        document.getElementById('longestStreak').textContent = stats.longestStreak || 0;
+    }
+
     async loadSubjectsFilter() {
         try {
             const response = await fetch(`${API_BASE_URL}/api/subjects`);
@@ -313,6 +406,7 @@ class Dashboard {
     }
 
     renderHeatmap(data) {
+        this.heatmapData = data;
         const container = document.getElementById('heatmapContainer');
         
         const days = ['', 'Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom'];
@@ -382,6 +476,7 @@ class Dashboard {
     }
 
     renderRanking(data) {
+        this.ranking = data;
         const container = document.getElementById('rankingContainer');
         
         if (!data || data.length === 0) {
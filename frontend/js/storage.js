@@ -2,7 +2,7 @@
  * Gerenciamento de Storage com Backend API
  */
 
-import { API_BASE_URL, DEFAULT_SETTINGS, STORAGE_KEYS } from './config.js';
+import { API_BASE_URL, DEFAULT_SETTINGS, STORAGE_KEYS, checkBackendAvailability } from './config.js';
 
 export class StorageManager {
     /**
@@ -207,6 +207,22 @@ export class StorageManager {
         }
     }
 
+    /**
+     * Zera os minutos semanais das disciplinas de um ciclo
+     */
+    static async resetWeek(cycleId) {
+        try {
+            const response = await fetch(`${API_BASE_URL}/api/cycles/${cycleId}/reset-week`, {
+                method: 'PUT'
+            });
+            if (!response.ok) throw new Error('Erro ao resetar semana');
+            return true;
+        } catch (error) {
+            console.error('Erro ao resetar semana:', error);
+            return false;
+        }
+    }
+
     /**
      * Cria uma nova disciplina
      */
@@ -298,6 +314,7 @@ export class StorageManager {
 
     /**
      * Registra uma sessão de estudo
+     * Retorna a disciplina com os contadores atualizados pelo servidor (ou null em caso de erro)
      */
     static async createSession(session) {
         try {
@@ -307,10 +324,11 @@ export class StorageManager {
                 body: JSON.stringify(session)
             });
             if (!response.ok) throw new Error('Erro ao criar sessão');
-            return true;
+            const result = await response.json();
+            return result.subject;
         } catch (error) {
             console.error('Erro ao criar sessão:', error);
-            return false;
+            return null;
         }
     }
 
@@ -346,6 +364,121 @@ export class StorageManager {
         }
     }
 
+    // ===== SINCRONIZAÇÃO INCREMENTAL (/api/sync) =====
+
+    /**
+     * Busca o cursor atual do servidor (antes de uma carga completa)
+     * @returns {string|null} Cursor ou null se o backend não responder
+     */
+    static async getSyncCursor() {
+        try {
+            const response = await fetch(`${API_BASE_URL}/api/sync/cursor`);
+            if (!response.ok) throw new Error('Erro ao buscar cursor de sincronização');
+            return (await response.json()).cursor;
+        } catch (error) {
+            console.info('📦 Cursor de sincronização indisponível (backend offline)');
+            return null;
+        }
+    }
+
+    /**
+     * Busca as alterações do servidor desde o cursor salvo, página por página
+     * Com reset (cursor de outro banco, ex.: backup restaurado) o cliente deve recarregar tudo
+     * @returns {Object|null} { reset, changes, deleted } ou null sem cursor ou sem backend
+     */
+    static async pullChanges() {
+        let since = this.load(STORAGE_KEYS.SYNC_CURSOR);
+        if (!since) return null;
+
+        const delta = { reset: false, changes: {}, deleted: {} };
+        try {
+            let hasMore = true;
+            while (hasMore) {
+                const response = await fetch(`${API_BASE_URL}/api/sync?since=${encodeURIComponent(since)}`);
+                if (!response.ok) throw new Error(`Backend retornou ${response.status}`);
+                const page = await response.json();
+
+                if (page.reset) {
+                    this.remove(STORAGE_KEYS.SYNC_CURSOR);
+                    return { ...delta, reset: true };
+                }
+
+                for (const [table, rows] of Object.entries(page.changes)) {
+                    delta.changes[table] = (delta.changes[table] || []).concat(rows);
+                }
+                for (const [table, keys] of Object.entries(page.deleted)) {
+                    delta.deleted[table] = (delta.deleted[table] || []).concat(keys);
+                }
+                since = page.cursor;
+                hasMore = page.hasMore;
+            }
+
+            this.save(STORAGE_KEYS.SYNC_CURSOR, since);
+            return delta;
+        } catch (error) {
+            console.info('📦 Sincronização adiada (backend indisponível)');
+            return null;
+        }
+    }
+
+    /**
+     * Envia alterações locais numa única requisição, a partir do cursor salvo
+     * @param {Array} mutations - Alterações no formato de POST /api/sync
+     * @param {string|null} since - Cursor avulso, só quando não há cursor salvo (que então não é criado)
+     * @returns {Object|null} Resumo do servidor, { stale: true } se o cursor for de outro
+     *   banco, ou null sem cursor ou sem backend
+     */
+    static async pushChanges(mutations, since = null) {
+        const saved = this.load(STORAGE_KEYS.SYNC_CURSOR);
+        since = saved || since;
+        if (!since) return null;
+
+        try {
+            const response = await fetch(`${API_BASE_URL}/api/sync`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ since, mutations })
+            });
+            if (response.status === 409) {
+                this.remove(STORAGE_KEYS.SYNC_CURSOR);
+                return { stale: true };
+            }
+            if (!response.ok) throw new Error(`Backend retornou ${response.status}`);
+
+            const result = await response.json();
+            if (saved) this.save(STORAGE_KEYS.SYNC_CURSOR, result.cursor);
+            return result;
+        } catch (error) {
+            console.info('📦 Alterações mantidas localmente (backend indisponível)');
+            return null;
+        }
+    }
+
+    /**
+     * Informa ao backend o fuso horário do navegador
+     * Dias e horas das estatísticas (hoje, sequência, heatmap) seguem esse fuso
+     */
+    static async syncTimezone() {
+        const utcOffsetMinutes = -new Date().getTimezoneOffset();
+        try {
+            const response = await fetch(`${API_BASE_URL}/api/settings`);
+            if (!response.ok) throw new Error('Erro ao buscar configurações');
+            const settings = await response.json();
+            if (settings.utcOffsetMinutes === utcOffsetMinutes) return true;
+
+            const update = await fetch(`${API_BASE_URL}/api/settings`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ utcOffsetMinutes })
+            });
+            if (!update.ok) throw new Error('Erro ao atualizar fuso horário');
+            return true;
+        } catch (error) {
+            console.error('Erro ao sincronizar fuso horário:', error);
+            return false;
+        }
+    }
+
     /**
      * Carrega configurações
      * @returns {Object} Configurações salvas ou padrão
@@ -6,6 +6,37 @@
 import { STORAGE_KEYS } from './config.js';
 import { StorageManager } from './storage.js';
 
+/**
+ * Ciclo do backend (GET /api/cycles, GET /api/sync) no formato local, sem as disciplinas
+ */
+function cycleFromServer(cycle) {
+    return {
+        id: cycle.id,
+        name: cycle.name,
+        studyDays: cycle.study_days || [],
+        subjects: [],
+        currentSubjectIndex: 0,
+        createdAt: cycle.created_at,
+        weekStartDate: cycle.week_start_date
+    };
+}
+
+/**
+ * Disciplina do backend no formato local
+ */
+function subjectFromServer(s) {
+    return {
+        id: s.id,
+        name: s.name,
+        weeklyHours: s.weeklyHours || s.weekly_hours,
+        color: s.color,
+        priority: s.priority,
+        currentWeekMinutes: s.currentWeekMinutes || s.current_week_minutes || 0,
+        totalMinutes: s.totalMinutes || s.total_minutes || 0,
+        totalSessions: s.totalSessions || s.total_sessions || 0
+    };
+}
+
 export class StudyCycle {
     constructor() {
         this.cycles = [];
@@ -69,6 +100,8 @@ export class StudyCycle {
                     subject.currentWeekMinutes = 0;
                 });
                 cycle.weekStartDate = this.getWeekStartDate();
+                // O servidor zera os próprios contadores (saveCycles não envia contadores)
+                StorageManager.resetWeek(cycle.id);
             }
         });
         this.saveCycles();
@@ -291,30 +324,42 @@ export class StudyCycle {
         const subject = cycle.subjects.find(s => s.id === subjectId);
         if (!subject) return false;
 
-        // Atualizar localStorage
+        // Atualizar localmente (vale enquanto o backend não responde ou em modo offline)
         subject.currentWeekMinutes += minutes;
         subject.totalMinutes += minutes;
         subject.totalSessions++;
         subject.lastStudied = new Date().toISOString();
-
-        await this.saveCycles();
         
-        // Salvar no backend
+        // Salvar no backend: o servidor soma os contadores na mesma transação da sessão,
+        // então não é preciso regravar a disciplina inteira depois
         try {
             const now = new Date();
             const session = {
                 subject_id: subjectId,
                 minutes: minutes,
                 started_at: new Date(now.getTime() - minutes * 60000).toISOString(),
-                completed_at: now.toISOString()
+                completed_at: now.toISOString(),
+                idempotency_key: `session_${now.getTime()}_${Math.random().toString(36).slice(2, 10)}`
             };
             
-            await StorageManager.createSession(session);
-            console.log('✅ Sessão salva no backend:', session);
+            const updated = await StorageManager.createSession(session);
+            if (updated) {
+                // Contadores do servidor incluem sessões registradas em outras abas
+                subject.currentWeekMinutes = updated.currentWeekMinutes;
+                subject.totalMinutes = updated.totalMinutes;
+                subject.totalSessions = updated.totalSessions;
+                console.log('✅ Sessão salva no backend:', session);
+            }
         } catch (error) {
             console.warn('⚠️ Erro ao salvar sessão no backend:', error);
         }
         
+        // Só o localStorage: os contadores já estão no backend
+        StorageManager.save(STORAGE_KEYS.STUDY_CYCLE, {
+            cycles: this.cycles,
+            activeCycleId: this.activeCycleId
+        });
+        
         return true;
     }
 
@@ -455,65 +500,147 @@ export class StudyCycle {
         // Salvar no localStorage (síncrono)
         StorageManager.save(STORAGE_KEYS.STUDY_CYCLE, data);
         
-        // Salvar no backend (assíncrono)
+        // Salvar no backend (assíncrono): uma única requisição com ciclos e disciplinas
         try {
-            // Sincronizar cada ciclo com o backend
-            for (const cycle of this.cycles) {
-                await this.syncCycleToBackend(cycle);
-            }
+            await this.pushToBackend();
         } catch (error) {
             console.warn('Erro ao sincronizar ciclos com backend:', error);
         }
     }
     
     /**
-     * Sincroniza um ciclo com o backend
+     * Envia ciclos e disciplinas por POST /api/sync
+     * Em conflito (linha alterada no servidor depois do cursor, ex.: contadores somados por
+     * uma sessão ou outra aba), busca as alterações e reenvia uma vez
      */
-    async syncCycleToBackend(cycle) {
-        try {
-            // Verificar se o ciclo já existe no backend
-            const cycleData = {
-                id: cycle.id,
-                name: cycle.name,
-                study_days: cycle.studyDays,
-                created_at: cycle.createdAt,
-                week_start_date: cycle.weekStartDate,
-                is_active: cycle.id === this.activeCycleId
-            };
-            
-            // Tentar criar ou atualizar o ciclo
-            await StorageManager.createCycle(cycleData);
-            
-            // Sincronizar disciplinas
+    async pushToBackend(retry = true) {
+        if (this.cycles.length === 0) return;
+        
+        // Sem cursor salvo (a carga completa não passou pelo backend): envia a partir do cursor
+        // atual do servidor, sem guardá-lo; a próxima carga completa traz o que faltar
+        let since = null;
+        if (!StorageManager.load(STORAGE_KEYS.SYNC_CURSOR)) {
+            since = await StorageManager.getSyncCursor();
+            if (!since) return;
+        }
+        
+        const result = await StorageManager.pushChanges(this.syncMutations(), since);
+        if (!result) return;
+        
+        if (result.stale) {
+            // Cursor de outro banco (backup restaurado): o servidor é a referência
+            if (!this.loadPromise) await this.loadCycles();
+            return;
+        }
+        
+        if (result.conflict > 0 && retry) {
+            const delta = await StorageManager.pullChanges();
+            if (delta && !delta.reset) {
+                this.applySyncChanges(delta, true);
+                StorageManager.save(STORAGE_KEYS.STUDY_CYCLE, {
+                    cycles: this.cycles,
+                    activeCycleId: this.activeCycleId
+                });
+                await this.pushToBackend(false);
+            }
+        } else if (result.conflict > 0 || result.invalid > 0) {
+            console.warn('⚠️ Alterações não aplicadas pelo servidor:', result.results.filter(r => r.status !== 'applied'));
+        }
+    }
+    
+    /**
+     * Ciclos e disciplinas locais no formato de POST /api/sync
+     * Contadores ficam com o servidor (somados por POST /api/sessions)
+     */
+    syncMutations() {
+        const mutations = [];
+        for (const cycle of this.cycles) {
+            mutations.push({
+                table: 'cycles',
+                op: 'upsert',
+                data: {
+                    id: cycle.id,
+                    name: cycle.name,
+                    study_days: cycle.studyDays,
+                    created_at: cycle.createdAt,
+                    week_start_date: cycle.weekStartDate,
+                    is_active: cycle.id === this.activeCycleId
+                }
+            });
             for (const subject of cycle.subjects) {
-                await this.syncSubjectToBackend(subject, cycle.id);
+                mutations.push({
+                    table: 'subjects',
+                    op: 'upsert',
+                    data: {
+                        id: subject.id,
+                        cycle_id: cycle.id,
+                        name: subject.name,
+                        weeklyHours: subject.weeklyHours,
+                        color: subject.color,
+                        priority: subject.priority
+                    }
+                });
             }
-        } catch (error) {
-            console.warn('Erro ao sincronizar ciclo com backend:', error);
         }
+        return mutations;
     }
     
     /**
-     * Sincroniza uma disciplina com o backend
+     * Aplica as alterações do servidor (GET /api/sync) aos ciclos locais
+     * Com keepLocal, ciclos e disciplinas que já existem aqui só recebem os contadores do
+     * servidor: os dados locais são reenviados em seguida
      */
-    async syncSubjectToBackend(subject, cycleId) {
-        try {
-            const subjectData = {
-                id: subject.id,
-                cycle_id: cycleId,
-                name: subject.name,
-                weeklyHours: subject.weeklyHours,
-                color: subject.color,
-                priority: subject.priority,
-                currentWeekMinutes: subject.currentWeekMinutes || 0,
-                totalMinutes: subject.totalMinutes || 0,
-                totalSessions: subject.totalSessions || 0
-            };
+    applySyncChanges(delta, keepLocal = false) {
+        const deletedCycles = new Set(delta.deleted.cycles || []);
+        const deletedSubjects = new Set(delta.deleted.subjects || []);
+        
+        this.cycles = this.cycles.filter(c => !deletedCycles.has(c.id));
+        this.cycles.forEach(cycle => {
+            cycle.subjects = cycle.subjects.filter(s => !deletedSubjects.has(s.id));
+        });
+        
+        for (const row of delta.changes.cycles || []) {
+            const local = this.getCycle(row.id);
+            if (!local) {
+                this.cycles.push(cycleFromServer(row));
+            } else if (!keepLocal) {
+                Object.assign(local, cycleFromServer(row), {
+                    subjects: local.subjects,
+                    currentSubjectIndex: local.currentSubjectIndex
+                });
+            }
+            if (row.is_active && !keepLocal) {
+                this.activeCycleId = row.id;
+            }
+        }
+        
+        for (const row of delta.changes.subjects || []) {
+            const cycle = this.getCycle(row.cycle_id);
+            const owner = this.cycles.find(c => c.subjects.some(s => s.id === row.id));
+            const local = owner && owner.subjects.find(s => s.id === row.id);
+            const server = subjectFromServer(row);
             
-            await StorageManager.createSubject(subjectData);
-        } catch (error) {
-            console.warn('Erro ao sincronizar disciplina com backend:', error);
+            if (local && keepLocal) {
+                local.currentWeekMinutes = server.currentWeekMinutes;
+                local.totalMinutes = server.totalMinutes;
+                local.totalSessions = server.totalSessions;
+            } else if (local && owner === cycle) {
+                Object.assign(local, server);
+            } else {
+                // Disciplina nova ou movida para outro ciclo
+                if (owner) owner.subjects = owner.subjects.filter(s => s.id !== row.id);
+                if (cycle) cycle.subjects.push({ ...local, ...server });
+            }
         }
+        
+        if (!this.getCycle(this.activeCycleId) && this.cycles.length > 0) {
+            this.activeCycleId = this.cycles[0].id;
+        }
+        this.cycles.forEach(cycle => {
+            if (cycle.currentSubjectIndex >= cycle.subjects.length) {
+                cycle.currentSubjectIndex = 0;
+            }
+        });
     }
 
     /**
@@ -534,6 +661,32 @@ export class StudyCycle {
     async _loadCyclesInternal() {
         console.log('🔄 StudyCycle: Iniciando carregamento de ciclos...');
         
+        // Com cursor e cópia local: só as alterações desde a última sincronização
+        const local = StorageManager.load(STORAGE_KEYS.STUDY_CYCLE);
+        if (StorageManager.load(STORAGE_KEYS.SYNC_CURSOR) && local && local.cycles && local.cycles.length > 0) {
+            this.cycles = local.cycles;
+            this.activeCycleId = local.activeCycleId;
+            
+            const delta = await StorageManager.pullChanges();
+            if (!delta) {
+                console.log('📂 StudyCycle: Backend indisponível, usando localStorage');
+                return;
+            }
+            if (!delta.reset) {
+                this.applySyncChanges(delta);
+                StorageManager.save(STORAGE_KEYS.STUDY_CYCLE, {
+                    cycles: this.cycles,
+                    activeCycleId: this.activeCycleId
+                });
+                console.log('✅ StudyCycle: Alterações do servidor aplicadas');
+                return;
+            }
+            console.log('⚠️ StudyCycle: Banco do servidor foi trocado, recarregando tudo...');
+        }
+        
+        // Carga completa; o cursor é lido antes, então nada alterado no meio fica de fora
+        const cursor = await StorageManager.getSyncCursor();
+        
         // Primeiro, tentar carregar do backend
         try {
             console.log('🌐 StudyCycle: Tentando carregar do backend...');
@@ -544,29 +697,11 @@ export class StudyCycle {
                 console.log(`✅ StudyCycle: ${backendCycles.length} ciclo(s) encontrado(s) no backend`);
                 
                 // Converter formato do backend para formato local
-                this.cycles = await Promise.all(backendCycles.map(async (cycle) => {
-                    // Buscar disciplinas do ciclo
+                this.cycles = backendCycles.map(cycle => {
                     const subjects = cycle.subjects || [];
                     console.log(`  📚 Ciclo "${cycle.name}": ${subjects.length} disciplina(s)`);
-                    
-                    return {
-                        id: cycle.id,
-                        name: cycle.name,
-                        studyDays: cycle.study_days || [],
-                        subjects: subjects.map(s => ({
-                            id: s.id,
-                            name: s.name,
-                            weeklyHours: s.weeklyHours || s.weekly_hours,
-                            color: s.color,
-                            priority: s.priority,
-                            currentWeekMinutes: s.currentWeekMinutes || s.current_week_minutes || 0,
-                            totalMinutes: s.totalMinutes || s.total_minutes || 0,
-                            totalSessions: s.totalSessions || s.total_sessions || 0
-                        })),
-                        createdAt: cycle.created_at,
-                        weekStartDate: cycle.week_start_date
-                    };
-                }));
+                    return { ...cycleFromServer(cycle), subjects: subjects.map(subjectFromServer) };
+                });
                 
                 // Verificar ciclo ativo
                 const activeCycle = backendCycles.find(c => c.is_active);
@@ -585,11 +720,13 @@ export class StudyCycle {
                     activeCycleId: this.activeCycleId
                 };
                 StorageManager.save(STORAGE_KEYS.STUDY_CYCLE, data);
+                if (cursor) StorageManager.save(STORAGE_KEYS.SYNC_CURSOR, cursor);
                 
                 console.log('✅ StudyCycle: Carregamento concluído com sucesso!');
                 return;
             } else {
                 console.log('⚠️ StudyCycle: Nenhum ciclo encontrado no backend');
+                if (cursor) StorageManager.save(STORAGE_KEYS.SYNC_CURSOR, cursor);
             }
         } catch (error) {
             console.warn('❌ StudyCycle: Erro ao carregar ciclos do backend, usando localStorage:', error);
@@ -4,10 +4,18 @@
 Script Python para iniciar a aplicação com interface gráfica
 """
 
+import os
+import queue
 import subprocess
 import sys
+import threading
 import time
+import urllib.error
+import urllib.request
 import webbrowser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 try:
@@ -25,11 +33,136 @@ FRONTEND_PORT = 8080
 BACKEND_CMD = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "0.0.0.0", "--port", str(BACKEND_PORT)]
 FRONTEND_CMD = [sys.executable, "-m", "http.server", str(FRONTEND_PORT)]
 
+def backend_command(workers=1):
+    """Comando do backend; com mais de um worker o uvicorn sobe um processo (e um pool) por worker"""
+    if workers <= 1:
+        return BACKEND_CMD
+    return BACKEND_CMD + ["--workers", str(workers)]
+
+# Prontidão: URLs que respondem 200 quando cada servidor está de pé
+BACKEND_READY_URL = f"http://127.0.0.1:{BACKEND_PORT}/api/health"
+FRONTEND_READY_URL = f"http://127.0.0.1:{FRONTEND_PORT}/"
+READY_TIMEOUT = 30.0  # segundos até desistir de um componente que não responde
+READY_INITIAL_DELAY = 0.05  # intervalo entre tentativas, dobrado a cada falha...
+READY_MAX_DELAY = 1.0  # ...até este máximo
+
+# Supervisão: componentes que caírem são reiniciados, com espera crescente entre reinícios;
+# mais de MAX_RESTARTS dentro de RESTART_WINDOW segundos é um crash loop e o launcher desiste
+SUPERVISE_INTERVAL = 1.0
+MAX_RESTARTS = 5
+RESTART_WINDOW = 60.0
+RESTART_MAX_DELAY = 30.0
+
+# Sondas direto em 127.0.0.1, sem passar por proxies configurados no ambiente
+_probe_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+class ManagedProcess:
+    """Processo filho supervisionado: inicia, espera a URL de prontidão e pode ser reiniciado"""
+    
+    def __init__(self, name, cmd, cwd, log_file, ready_url, env=None):
+        self.name = name
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+        self.log_file = log_file
+        self.ready_url = ready_url
+        self.process = None
+        self.spawned_at = None
+        self.startup_time = None
+        self.restarts = deque()  # instantes dos reinícios dentro da janela
+        self.gave_up = False
+    
+    def spawn(self, restart=False):
+        """Inicia o processo (o log é recriado no primeiro início e continuado nos reinícios)"""
+        self.log_file.parent.mkdir(exist_ok=True)
+        with open(self.log_file, "a" if restart else "w") as f:
+            if restart:
+                f.write(f"\n--- reiniciado em {datetime.now().isoformat(timespec='seconds')} ---\n")
+                f.flush()
+            self.process = subprocess.Popen(
+                self.cmd,
+                stdout=f,
+                stderr=subprocess.STDOUT,
+                cwd=self.cwd,
+                env=self.env
+            )
+        self.spawned_at = time.monotonic()
+    
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        """Consulta a URL de prontidão com backoff; retorna o tempo desde o início do processo"""
+        deadline = time.monotonic() + timeout
+        delay = READY_INITIAL_DELAY
+        while True:
+            process = self.process
+            if process is None or process.poll() is not None:
+                code = process.returncode if process is not None else None
+                raise RuntimeError(f"{self.name} encerrou durante a inicialização (código {code}). Veja {self.log_file}")
+            
+            try:
+                with _probe_opener.open(self.ready_url, timeout=1) as response:
+                    if response.status == 200:
+                        self.startup_time = time.monotonic() - self.spawned_at
+                        return self.startup_time
+            except (urllib.error.URLError, OSError):
+                pass  # ainda subindo (conexão recusada, 5xx, timeout)
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"{self.name} não respondeu em {timeout:.0f}s ({self.ready_url}). Veja {self.log_file}")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, READY_MAX_DELAY)
+    
+    @property
+    def started(self):
+        return self.process is not None
+    
+    @property
+    def crashed(self):
+        return self.process is not None and self.process.poll() is not None
+    
+    def allow_restart(self):
+        """Registra um reinício; retorna o tempo de espera antes dele ou None em crash loop"""
+        now = time.monotonic()
+        while self.restarts and now - self.restarts[0] > RESTART_WINDOW:
+            self.restarts.popleft()
+        if len(self.restarts) >= MAX_RESTARTS:
+            self.gave_up = True
+            return None
+        self.restarts.append(now)
+        return min(2 ** (len(self.restarts) - 1), RESTART_MAX_DELAY)
+    
+    def stop(self, timeout=5):
+        """Encerra o processo (terminate e, se não sair a tempo, kill)"""
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
 class PomodoroLauncher:
-    def __init__(self):
-        self.backend_process = None
-        self.frontend_process = None
+    def __init__(self, workers=1):
         self.project_dir = Path(__file__).parent
+        self.workers = workers
+        # O backend sabe quantos processos dividem o banco (cache e eventos entre workers)
+        env = dict(os.environ, POMODORO_WORKERS=str(workers))
+        self.backend = ManagedProcess(
+            "Backend", backend_command(workers), self.project_dir,
+            self.project_dir / "logs" / "backend.log", BACKEND_READY_URL, env=env
+        )
+        # http.server roda de dentro da pasta frontend
+        self.frontend = ManagedProcess(
+            "Frontend", FRONTEND_CMD, self.project_dir / "frontend",
+            self.project_dir / "logs" / "frontend.log", FRONTEND_READY_URL
+        )
+        self.components = [self.backend, self.frontend]
+        self.on_event = None  # callback extra para mensagens da supervisão (interface gráfica)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._supervisor = None
         
     def check_dependencies(self):
         """Verifica se as dependências estão instaladas"""
@@ -47,39 +180,80 @@ class PomodoroLauncher:
         requirements = self.project_dir / "backend" / "requirements.txt"
         subprocess.run([sys.executable, "-m", "pip", "install", "-r", str(requirements)])
     
-    def start_backend(self):
-        """Inicia o backend"""
-        print(f"🚀 Iniciando backend na porta {BACKEND_PORT}...")
-        log_file = self.project_dir / "logs" / "backend.log"
-        log_file.parent.mkdir(exist_ok=True)
+    def start(self):
+        """Inicia backend e frontend juntos, espera os dois ficarem prontos e liga a supervisão
         
-        with open(log_file, "w") as f:
-            self.backend_process = subprocess.Popen(
-                BACKEND_CMD,
-                stdout=f,
-                stderr=subprocess.STDOUT,
-                cwd=self.project_dir
-            )
-        time.sleep(3)
-        print("✅ Backend iniciado!")
-    
-    def start_frontend(self):
-        """Inicia o frontend"""
-        print(f"🚀 Iniciando frontend na porta {FRONTEND_PORT}...")
-        log_file = self.project_dir / "logs" / "frontend.log"
+        Retorna o tempo de inicialização de cada componente, em segundos.
+        """
+        self._stopping.clear()
+        mode = f"{self.workers} workers" if self.workers > 1 else "1 worker"
+        print(f"🚀 Iniciando backend (porta {BACKEND_PORT}, {mode}) e frontend (porta {FRONTEND_PORT})...")
+        with self._lock:
+            for component in self.components:
+                component.restarts.clear()
+                component.gave_up = False
+                component.spawn()
         
-        # Executar http.server de dentro da pasta frontend
-        frontend_dir = self.project_dir / "frontend"
+        # Espera os dois em paralelo para que cada tempo de inicialização seja só o dele
+        with ThreadPoolExecutor(max_workers=len(self.components)) as executor:
+            waits = [executor.submit(component.wait_ready) for component in self.components]
+        try:
+            for component, wait in zip(self.components, waits):
+                seconds = wait.result()
+                print(f"✅ {component.name} pronto em {seconds:.2f}s")
+        except RuntimeError:
+            self.stop()
+            raise
         
-        with open(log_file, "w") as f:
-            self.frontend_process = subprocess.Popen(
-                FRONTEND_CMD,
-                stdout=f,
-                stderr=subprocess.STDOUT,
-                cwd=frontend_dir  # ✅ Mudado de project_dir para frontend_dir
-            )
-        time.sleep(2)
-        print("✅ Frontend iniciado!")
+        self._supervisor = threading.Thread(target=self.supervise, name="supervisor", daemon=True)
+        self._supervisor.start()
+        return {component.name: component.startup_time for component in self.components}
+    
+    def supervise(self):
+        """Reinicia componentes que caírem, até o limite de crash loop (roda numa thread)"""
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            for component in self.components:
+                if component.gave_up or not component.crashed:
+                    continue
+                
+                code = component.process.returncode
+                delay = component.allow_restart()
+                if delay is None:
+                    self.notify(
+                        f"❌ {component.name} caiu {MAX_RESTARTS} vezes em {RESTART_WINDOW:.0f}s; "
+                        f"reinício automático desativado. Veja {component.log_file}"
+                    )
+                    continue
+                
+                self.notify(f"⚠️ {component.name} encerrou (código {code}); reiniciando em {delay}s...")
+                if self._stopping.wait(delay):
+                    return
+                
+                with self._lock:
+                    if self._stopping.is_set():
+                        return
+                    component.spawn(restart=True)
+                
+                try:
+                    seconds = component.wait_ready()
+                    self.notify(f"✅ {component.name} reiniciado, pronto em {seconds:.2f}s")
+                except RuntimeError as e:
+                    # Processo caiu de novo: a próxima volta conta outro reinício
+                    self.notify(f"⚠️ {e}")
+    
+    def notify(self, message):
+        print(message)
+        if self.on_event is not None:
+            self.on_event(message)
+    
+    @property
+    def running(self):
+        return any(component.started for component in self.components)
+    
+    @property
+    def failed(self):
+        """Algum componente entrou em crash loop"""
+        return any(component.gave_up for component in self.components)
     
     def open_browser(self):
         """Abre o navegador"""
@@ -100,12 +274,15 @@ class PomodoroLauncher:
 
     
     def stop(self):
-        """Para os processos"""
+        """Para a supervisão e os processos"""
         print("\n🛑 Parando aplicação...")
-        if self.backend_process:
-            self.backend_process.terminate()
-        if self.frontend_process:
-            self.frontend_process.terminate()
+        self._stopping.set()
+        with self._lock:
+            for component in self.components:
+                component.stop()
+        if self._supervisor is not None and self._supervisor is not threading.current_thread():
+            self._supervisor.join(timeout=READY_TIMEOUT)
+            self._supervisor = None
         print("✅ Aplicação parada!")
     
     def run_gui(self):
@@ -147,10 +324,9 @@ class PomodoroLauncher:
                     return
             
             try:
-                self.start_backend()
-                self.start_frontend()
+                times = self.start()
                 self.open_browser()
-                self.status_label.config(text="✅ Aplicação rodando!")
+                self.status_label.config(text="✅ Aplicação rodando! " + format_startup_times(times))
                 start_btn.config(state="disabled")
                 stop_btn.config(state="normal")
                 browser_btn.config(state="normal")
@@ -170,7 +346,7 @@ class PomodoroLauncher:
         
         def on_close():
             assert messagebox is not None  # Para o type checker
-            if self.backend_process or self.frontend_process:
+            if self.running:
                 if messagebox.askyesno("Sair", "A aplicação está rodando. Deseja parar e sair?"):
                     self.stop()
                     root.destroy()
@@ -197,7 +373,17 @@ class PomodoroLauncher:
                        font=("Arial", 9), fg="gray")
         info.pack(pady=10)
         
+        # Mensagens da supervisão chegam de outra thread; o Tk só é atualizado na thread dele
+        events = queue.Queue()
+        self.on_event = events.put
+        
+        def poll_events():
+            while not events.empty():
+                self.status_label.config(text=events.get_nowait())
+            root.after(500, poll_events)
+        
         root.protocol("WM_DELETE_WINDOW", on_close)
+        root.after(500, poll_events)
         root.mainloop()
     
     def run_console(self):
@@ -216,12 +402,11 @@ class PomodoroLauncher:
                 return
         
         try:
-            self.start_backend()
-            self.start_frontend()
+            times = self.start()
             self.open_browser()
             
             print("\n" + "="*50)
-            print("✅ APLICAÇÃO RODANDO!")
+            print("✅ APLICAÇÃO RODANDO! " + format_startup_times(times))
             print("="*50)
             print(f"\n📱 Timer:  http://localhost:{FRONTEND_PORT}/")
             print(f"📚 Ciclos: http://localhost:{FRONTEND_PORT}/ciclos.html")
@@ -229,10 +414,11 @@ class PomodoroLauncher:
             print(f"🔧 API:    http://localhost:{BACKEND_PORT}/docs")
             print("\n💡 Pressione Ctrl+C para parar\n")
             
-            # Manter rodando
+            # Manter rodando (a supervisão reinicia componentes que caírem)
             try:
-                while True:
+                while not self.failed:
                     time.sleep(1)
+                print("\n❌ Um componente entrou em crash loop; encerrando.")
             except KeyboardInterrupt:
                 pass
             
@@ -241,8 +427,24 @@ class PomodoroLauncher:
         finally:
             self.stop()
 
+def format_startup_times(times):
+    """Ex.: (Backend 1.21s, Frontend 0.18s)"""
+    return "(" + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in times.items()) + ")"
+
+def parse_workers(argv):
+    """--workers N escolhe o número de workers do backend; --production usa um por CPU"""
+    if "--workers" in argv:
+        index = argv.index("--workers")
+        try:
+            return max(1, int(argv[index + 1]))
+        except (IndexError, ValueError):
+            sys.exit("❌ Uso: --workers N (N inteiro)")
+    if "--production" in argv:
+        return os.cpu_count() or 1
+    return 1
+
 def main():
-    launcher = PomodoroLauncher()
+    launcher = PomodoroLauncher(workers=parse_workers(sys.argv))
     
     if HAS_GUI and "--console" not in sys.argv:
         launcher.run_gui()
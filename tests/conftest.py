@@ -0,0 +1,54 @@
+"""
+Fixtures dos testes automatizados (pytest, executar do diretório raiz)
+
+Os testes usam a mesma carga sintética dos benchmarks (bench/seed.py), em bancos temporários.
+"""
+
+import importlib
+import shutil
+
+import pytest
+
+from backend.concurrency import AsyncDatabase
+from backend.database import Database
+from bench.seed import seed
+
+
+@pytest.fixture(scope='session')
+def seeded(tmp_path_factory):
+    """Banco populado uma vez por execução (2 ciclos, 1 ano de sessões); retorna (caminho, metadados)"""
+    path = str(tmp_path_factory.mktemp('seed') / 'seed.db')
+    meta = seed(path, users=2, years=1)
+    return path, meta
+
+
+@pytest.fixture
+def seeded_copy(seeded, tmp_path):
+    """Cópia do banco populado para o teste alterar à vontade; retorna (caminho, metadados)"""
+    path, meta = seeded
+    copy = str(tmp_path / 'pomodoro.db')
+    shutil.copyfile(path, copy)
+    return copy, meta
+
+
+@pytest.fixture
+def api(seeded_copy, monkeypatch):
+    """Cliente HTTP do backend.main sobre a cópia do banco; retorna (cliente, Database, metadados)
+
+    backend.main abre o banco de POMODORO_DB_PATH só na primeira importação: a cada teste
+    o módulo passa a usar um Database novo sobre a cópia, com o cache vazio.
+    """
+    from fastapi.testclient import TestClient
+
+    path, meta = seeded_copy
+    monkeypatch.setenv('POMODORO_DB_PATH', path)
+    main = importlib.import_module('backend.main')
+
+    db = Database(path, single_writer=True)
+    monkeypatch.setattr(main, 'db', db)
+    monkeypatch.setattr(main, 'adb', AsyncDatabase(db))
+    main.stats_cache.clear()
+
+    # Sem "with": o lifespan fecharia o distribuidor de eventos do módulo
+    yield TestClient(main.app), db, meta
+    db.close()
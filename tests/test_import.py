@@ -0,0 +1,64 @@
+"""
+POST /api/import/ndjson: sessões com idempotency_key de outra sessão são resolvidas pela chave.
+"""
+
+import json
+import sqlite3
+
+
+def ndjson(records):
+    meta = {'type': 'meta', 'version': 1}
+    return '\n'.join(json.dumps(record) for record in [meta, *records]) + '\n'
+
+
+def session_record(id_, subject_id, key, day=5):
+    return {'type': 'session', 'data': {
+        'id': id_, 'subject_id': subject_id, 'minutes': 25, 'idempotency_key': key,
+        'started_at': f"2026-01-0{day}T10:00:00.000Z", 'completed_at': f"2026-01-0{day}T10:25:00.000Z",
+    }}
+
+
+def count_sessions(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM study_sessions').fetchone()[0]
+
+
+def test_key_owned_by_another_session_is_a_duplicate(api):
+    client, db, meta = api
+    subject_id = meta['subjects'][0]
+    existing = db.create_sessions([session_record(None, subject_id, 'same-session')['data']])[0]
+    before = count_sessions(db.db_path)
+    stats = client.get('/api/stats/general').json()
+
+    response = client.post('/api/import/ndjson', content=ndjson([
+        # A mesma sessão gravada em outro aparelho, com outro id
+        session_record(10 ** 9, subject_id, 'same-session'),
+        # Chave nova repetida no próprio arquivo: fica a primeira
+        session_record(10 ** 9 + 1, subject_id, 'new-key', day=6),
+        session_record(10 ** 9 + 2, subject_id, 'new-key', day=7),
+        # Reimportar a sessão existente com o próprio id continua valendo
+        session_record(existing['id'], subject_id, 'same-session'),
+    ]))
+    assert response.status_code == 200, response.text
+    assert response.json()['imported']['session'] == 2
+    assert response.json()['imported']['duplicate'] == 2
+
+    assert count_sessions(db.db_path) == before + 1
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute("SELECT id FROM study_sessions WHERE idempotency_key = 'new-key'").fetchall() == \
+            [(10 ** 9 + 1,)]
+    assert client.get('/api/stats/general').json()['totalSessions'] == stats['totalSessions'] + 1
+
+
+def test_constraint_violation_is_400(api):
+    client, db, meta = api
+    before = count_sessions(db.db_path)
+    response = client.post('/api/import/ndjson', content=ndjson([
+        session_record(10 ** 9, meta['subjects'][0], 'ok-session'),
+        {'type': 'subject', 'data': {'id': 'broken', 'cycle_id': meta['cycles'][0], 'name': None,
+                                     'weeklyHours': 1, 'color': '#000000', 'priority': 1}},
+    ]))
+    assert response.status_code == 400
+    assert 'Arquivo de importação inválido' in response.json()['detail']
+    # Uma transação só: nada do arquivo foi gravado
+    assert count_sessions(db.db_path) == before
@@ -0,0 +1,67 @@
+"""
+Instantes das sessões: só instantes ISO completos entram no banco, e o CSV sai no fuso do usuário.
+"""
+
+import pytest
+
+from backend.localtime import validate_instant
+
+
+@pytest.mark.parametrize('value', [
+    '2026-01-05T10:00',
+    '2026-01-05T10:00:30Z',
+    '2026-01-05T10:00:30.123Z',
+    '2026-01-05T10:00:30-03:00',
+])
+def test_complete_instants_are_accepted(value):
+    assert validate_instant(value) == value
+
+
+@pytest.mark.parametrize('value', [
+    '2026-01-05',
+    '2026-01-05 10:00',
+    '2026-01-05T10',
+    '2026-13-05T10:00Z',
+    '',
+    None,
+])
+def test_incomplete_instants_are_rejected(value):
+    with pytest.raises(ValueError):
+        validate_instant(value)
+
+
+def session(meta, started_at, completed_at, key):
+    return {'subject_id': meta['subjects'][0], 'minutes': 25, 'started_at': started_at,
+            'completed_at': completed_at, 'idempotency_key': key}
+
+
+def test_date_only_session_is_rejected_everywhere(api):
+    client, db, meta = api
+    before = db.get_general_stats()['totalSessions']
+
+    response = client.post('/api/sessions', json=session(meta, '2026-01-05', '2026-01-05', 'only-date'))
+    assert response.status_code == 422
+
+    response = client.post('/api/sessions/batch', json=[session(meta, '2026-01-05 10:00', '2026-01-05 10:25', 'space')])
+    assert [item['status'] for item in response.json()['results']] == ['invalid']
+
+    response = client.post('/api/sync', json={'since': db.sync_cursor(), 'mutations': [{
+        'table': 'sessions', 'op': 'upsert', 'data': session(meta, '2026-01-05', '2026-01-05', 'sync'),
+    }]})
+    assert response.json()['invalid'] == 1
+
+    assert db.get_general_stats()['totalSessions'] == before
+
+
+def test_csv_uses_user_offset(api):
+    client, db, meta = api
+    db.set_utc_offset(-180)
+    # Fim em outro fuso e início um dia antes do dia local em UTC
+    created = session(meta, '2026-01-05T01:30:00.000Z', '2026-01-04T23:05:00-03:00', 'csv-offset')
+    assert client.post('/api/sessions', json=created).status_code == 200
+
+    response = client.get('/api/export/csv', params={'start': '2026-01-04', 'end': '2026-01-04'})
+    assert response.status_code == 200
+    rows = response.text.strip().splitlines()
+    assert rows[0] == 'Data,Disciplina,Minutos,Hora Início,Hora Fim'
+    assert rows[1].startswith('2026-01-04,') and rows[1].endswith(',25,22:30,23:05')
@@ -0,0 +1,33 @@
+"""
+Número de consultas por chamada: não pode crescer com o número de ciclos (N+1)
+"""
+
+from backend.database import Database
+from bench.scenarios import query_counts
+
+
+def test_query_count_is_constant(seeded_copy):
+    path, meta = seeded_copy
+    result = query_counts(path, meta, extra_cycles=20)
+
+    assert result['constant'], result['queries']
+    for name, (before, after) in result['queries'].items():
+        assert before == after == 1, f"{name}: {before} -> {after} consultas"
+
+
+def test_n_plus_one_is_detected(seeded_copy, monkeypatch):
+    path, meta = seeded_copy
+
+    def get_all_cycles(self):
+        # Uma consulta de disciplinas por ciclo, como antes dos JOINs
+        with self.connection() as conn:
+            cycle_ids = [row[0] for row in conn.execute('SELECT id FROM cycles')]
+        return [self.get_subjects_by_cycle(cycle_id) for cycle_id in cycle_ids]
+
+    monkeypatch.setattr(Database, 'get_all_cycles', get_all_cycles)
+
+    result = query_counts(path, meta, extra_cycles=5)
+
+    assert not result['constant']
+    before, after = result['queries']['get_all_cycles']
+    assert after == before + 5
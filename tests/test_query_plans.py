@@ -0,0 +1,33 @@
+"""
+Planos de consulta das leituras principais: tabelas grandes só por índice
+"""
+
+import sqlite3
+
+from bench.scenarios import EXPECTED_SCANS, query_plans
+
+
+def test_reads_use_indexes(seeded_copy):
+    path, meta = seeded_copy
+    result = query_plans(path, meta)
+
+    assert result['fullScans'] == []
+    assert {scan['call'] for scan in result['expectedScans']} <= set(EXPECTED_SCANS)
+
+
+def test_stats_queries_are_planned(seeded_copy):
+    path, meta = seeded_copy
+    plans = query_plans(path, meta)['plans']
+
+    for name in ('get_general_stats', 'get_chart_data', 'get_heatmap_data', 'get_subject_ranking'):
+        assert plans[name], f"{name} não executou nenhuma consulta"
+
+
+def test_missing_index_is_flagged(seeded_copy):
+    path, meta = seeded_copy
+    with sqlite3.connect(path) as conn:
+        conn.execute('DROP INDEX idx_sessions_started_ts')
+
+    scans = query_plans(path, meta)['fullScans']
+
+    assert {'call': 'iter_export_records', 'step': 'SCAN study_sessions'} in scans
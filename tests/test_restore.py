@@ -0,0 +1,140 @@
+"""
+Restauração de backup (POST /api/backup/restore): arquivos de versões antigas são migrados
+antes de o pool voltar, e arquivos inválidos são recusados sem tocar no banco atual.
+"""
+
+import gzip
+import sqlite3
+
+import pytest
+
+from backend.migrations import SCHEMA_VERSION
+
+# Tabelas como eram criadas antes das migrações (schema versão 0)
+BASELINE_SCHEMA = '''
+    CREATE TABLE cycles (
+        id TEXT PRIMARY KEY, name TEXT NOT NULL, study_days TEXT NOT NULL, created_at TEXT NOT NULL,
+        week_start_date TEXT NOT NULL, is_active INTEGER DEFAULT 0
+    );
+    CREATE TABLE subjects (
+        id TEXT PRIMARY KEY, cycle_id TEXT NOT NULL, name TEXT NOT NULL, weekly_hours INTEGER NOT NULL,
+        color TEXT NOT NULL, priority INTEGER NOT NULL, current_week_minutes INTEGER DEFAULT 0,
+        total_minutes INTEGER DEFAULT 0, total_sessions INTEGER DEFAULT 0,
+        FOREIGN KEY (cycle_id) REFERENCES cycles(id) ON DELETE CASCADE
+    );
+    CREATE TABLE study_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, subject_id TEXT NOT NULL, minutes INTEGER NOT NULL,
+        started_at TEXT NOT NULL, completed_at TEXT NOT NULL,
+        FOREIGN KEY (subject_id) REFERENCES subjects(id) ON DELETE CASCADE
+    );
+    CREATE TABLE stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, completed_sessions INTEGER DEFAULT 0,
+        total_focus_time INTEGER DEFAULT 0, total_break_time INTEGER DEFAULT 0, UNIQUE(date)
+    );
+'''
+
+BASELINE_SESSIONS = 12
+
+
+def baseline_file(path):
+    """Banco de uma instalação antiga: 1 ciclo, 1 disciplina e 12 sessões de 25 min em 3 dias"""
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO cycles VALUES ('old-cycle', 'Ciclo antigo', '[\"mon\"]', '2024-01-01T00:00:00Z', "
+                 "'2024-01-01', 1)")
+    conn.execute("INSERT INTO subjects VALUES ('old-subject', 'old-cycle', 'Antiga', 4, '#000000', 1, 0, 300, 12)")
+    conn.executemany('INSERT INTO study_sessions (subject_id, minutes, started_at, completed_at) VALUES (?, ?, ?, ?)', [
+        ('old-subject', 25, f"2024-01-0{1 + n % 3}T1{n % 4}:00:00.000Z", f"2024-01-0{1 + n % 3}T1{n % 4}:25:00.000Z")
+        for n in range(BASELINE_SESSIONS)
+    ])
+    conn.commit()
+    conn.close()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def restore(client, content, name='backup.db'):
+    return client.post('/api/backup/restore', files={'file': (name, content, 'application/octet-stream')})
+
+
+def test_restore_baseline_schema(api, tmp_path):
+    client, db, _ = api
+    content = baseline_file(str(tmp_path / 'baseline.db'))
+
+    before_stats = client.get('/api/stats/general')
+    before_cycles = client.get('/api/cycles')
+    before_cursor = client.get('/api/sync/cursor').json()['cursor']
+
+    response = restore(client, gzip.compress(content), 'backup.db.gz')
+    assert response.status_code == 200, response.text
+    assert response.json()['schemaVersion'] == 0
+    assert db.schema_version() == SCHEMA_VERSION
+
+    # Agregados reconstruídos a partir das sessões do arquivo restaurado
+    stats = client.get('/api/stats/general', headers={'If-None-Match': before_stats.headers['etag']})
+    assert stats.status_code == 200
+    assert stats.headers['etag'] != before_stats.headers['etag']
+    assert stats.json()['totalSessions'] == BASELINE_SESSIONS
+    assert stats.json()['totalMinutes'] == BASELINE_SESSIONS * 25
+    assert stats.json()['longestStreak'] == 3
+
+    cycles = client.get('/api/cycles', headers={'If-None-Match': before_cycles.headers['etag']})
+    assert cycles.status_code == 200
+    assert [cycle['id'] for cycle in cycles.json()] == ['old-cycle']
+
+    # Cursor de sincronização de outro banco: o cliente recomeça
+    assert client.get('/api/sync', params={'since': before_cursor, 'limit': 1}).json()['reset']
+
+    # O banco restaurado aceita escritas pelos caminhos novos
+    created = client.post('/api/sessions', json={
+        'subject_id': 'old-subject', 'minutes': 25, 'idempotency_key': 'after-restore',
+        'started_at': '2024-01-04T10:00:00.000Z', 'completed_at': '2024-01-04T10:25:00.000Z'})
+    assert created.status_code == 200
+    assert client.get('/api/stats/general').json()['longestStreak'] == 4
+
+
+def newer_schema_file(path, seeded):
+    with open(seeded, 'rb') as src, open(path, 'wb') as dst:
+        dst.write(src.read())
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, 'futura', '2030-01-01')",
+                 (SCHEMA_VERSION + 1,))
+    conn.commit()
+    conn.close()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def missing_table_file(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute('DROP TABLE stats')
+    conn.close()
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('kind, detail', [
+    ('garbage', 'não é um banco de dados SQLite'),
+    ('truncated gzip', 'Backup inválido'),
+    ('newer schema', 'mais novo que o suportado'),
+    ('missing table', 'Tabelas ausentes no backup: stats'),
+])
+def test_invalid_backups_are_rejected(api, seeded, tmp_path, kind, detail):
+    client, db, _ = api
+    content = {
+        'garbage': lambda: b'isto nao e um banco' * 100,
+        'truncated gzip': lambda: gzip.compress(baseline_file(str(tmp_path / 'gz.db')))[:200],
+        'newer schema': lambda: newer_schema_file(str(tmp_path / 'newer.db'), seeded[0]),
+        'missing table': lambda: missing_table_file(str(tmp_path / 'missing.db')),
+    }[kind]()
+    before = client.get('/api/stats/general')
+
+    response = restore(client, content)
+    assert response.status_code == 400
+    assert detail in response.json()['detail']
+
+    # Banco atual intacto
+    after = client.get('/api/stats/general', headers={'If-None-Match': before.headers['etag']})
+    assert after.status_code == 304
+    assert db.schema_version() == SCHEMA_VERSION
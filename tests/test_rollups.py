@@ -0,0 +1,50 @@
+"""
+Reconstrução dos agregados: recalcula também os totais e as sequências mantidos por triggers.
+"""
+
+import sqlite3
+
+from backend.database import Database
+from backend.rollups import main
+
+
+def summary(path):
+    with sqlite3.connect(path) as conn:
+        totals = conn.execute('SELECT sessions, minutes FROM session_totals WHERE id = 1').fetchone()
+        runs = conn.execute('SELECT start_day, end_day FROM streak_runs ORDER BY start_day').fetchall()
+        sessions = conn.execute('SELECT COUNT(*), SUM(minutes) FROM study_sessions').fetchone()
+    return totals, runs, sessions
+
+
+def drift(path):
+    """Totais e sequências divergentes das sessões (as triggers não corrigem isso sozinhas)"""
+    with sqlite3.connect(path) as conn:
+        conn.execute('UPDATE session_totals SET sessions = sessions + 7, minutes = minutes - 100 WHERE id = 1')
+        conn.execute('DELETE FROM streak_runs WHERE start_day = (SELECT MAX(start_day) FROM streak_runs)')
+        conn.execute('INSERT INTO streak_runs (start_day, end_day) VALUES (1, 3)')
+
+
+def test_rebuild_rollups_repairs_summary(seeded_copy):
+    path, _ = seeded_copy
+    expected = summary(path)
+    assert expected[0] == expected[2]
+
+    drift(path)
+    assert summary(path) != expected
+
+    db = Database(path)
+    try:
+        db.rebuild_rollups()
+    finally:
+        db.close()
+    assert summary(path) == expected
+
+
+def test_cli_repairs_summary(seeded_copy, monkeypatch):
+    path, _ = seeded_copy
+    expected = summary(path)
+    drift(path)
+
+    monkeypatch.setattr('sys.argv', ['rollups', '--db', path])
+    main()
+    assert summary(path) == expected
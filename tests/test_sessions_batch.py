@@ -0,0 +1,91 @@
+"""
+POST /api/sessions/batch: ids das sessões criadas, reenvio idempotente e NDJSON lido por linha.
+"""
+
+import json
+import sqlite3
+
+
+def sessions(meta, count, prefix):
+    return [{
+        'subject_id': meta['subjects'][n % len(meta['subjects'])],
+        'minutes': 25,
+        'started_at': f"2026-01-05T{n // 60 % 24:02d}:{n % 60:02d}:00.000Z",
+        'completed_at': f"2026-01-05T{n // 60 % 24:02d}:{n % 60:02d}:30.000Z",
+        'idempotency_key': f"{prefix}-{n}",
+    } for n in range(count)]
+
+
+def stored(path, ids):
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(f"SELECT id, idempotency_key FROM study_sessions WHERE id IN ({','.join('?' * len(ids))})",
+                            ids).fetchall()
+    return dict(rows)
+
+
+def test_created_items_carry_their_ids(api):
+    client, db, meta = api
+    batch = sessions(meta, 50, 'ids')
+
+    body = client.post('/api/sessions/batch', json=batch).json()
+    assert body['created'] == 50
+    ids = [result['id'] for result in body['results']]
+    assert stored(db.db_path, ids) == {id_: item['idempotency_key'] for id_, item in zip(ids, batch)}
+
+
+def test_repost_returns_duplicates_with_existing_ids(api):
+    client, db, meta = api
+    batch = sessions(meta, 30, 'repost')
+    first = client.post('/api/sessions/batch', json=batch).json()
+    before = db.get_general_stats()['totalSessions']
+
+    second = client.post('/api/sessions/batch', json=batch).json()
+    assert (second['created'], second['duplicate']) == (0, 30)
+    assert [r['status'] for r in second['results']] == ['duplicate'] * 30
+    assert [r['id'] for r in second['results']] == [r['id'] for r in first['results']]
+    assert db.get_general_stats()['totalSessions'] == before
+
+
+def test_key_repeated_in_batch_points_to_first_row(api):
+    client, _, meta = api
+    batch = sessions(meta, 2, 'repeated')
+    batch[1]['idempotency_key'] = batch[0]['idempotency_key']
+
+    results = client.post('/api/sessions/batch', json=batch).json()['results']
+    assert [r['status'] for r in results] == ['created', 'duplicate']
+    assert results[1]['id'] == results[0]['id']
+
+
+def test_ndjson_is_read_line_by_line(api):
+    client, _, meta = api
+    batch = sessions(meta, 200, 'ndjson')
+    lines = [json.dumps(item).encode() for item in batch]
+    lines.insert(10, b'[1, 2]')  # item que não é objeto: invalid, o resto é gravado
+    body = b'\n'.join(lines) + b'\n'
+
+    def chunks(size=97):
+        # Blocos que cortam as linhas no meio
+        for start in range(0, len(body), size):
+            yield body[start:start + size]
+
+    response = client.post('/api/sessions/batch', content=chunks(),
+                           headers={'Content-Type': 'application/x-ndjson'})
+    result = response.json()
+    assert (result['created'], result['invalid']) == (200, 1)
+    assert result['results'][10]['status'] == 'invalid'
+    assert all('id' in r for r in result['results'] if r['status'] == 'created')
+
+
+def test_ndjson_errors(api, monkeypatch):
+    client, _, meta = api
+    headers = {'Content-Type': 'application/x-ndjson'}
+    item = json.dumps(sessions(meta, 1, 'errors')[0])
+
+    response = client.post('/api/sessions/batch', content=f"{item}\n{{quebrado\n", headers=headers)
+    assert response.status_code == 400
+    assert 'Linha 2' in response.json()['detail']
+
+    from backend import main
+    monkeypatch.setattr(main, 'MAX_BATCH_SESSIONS', 2)
+    response = client.post('/api/sessions/batch', content='\n'.join([item] * 3), headers=headers)
+    assert response.status_code == 413
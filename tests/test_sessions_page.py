@@ -0,0 +1,107 @@
+"""
+Paginação por chave de GET /api/sessions: mesmas sessões e ordem de um SELECT único, sem
+repetições nem buracos, com e sem filtro de ciclo (busca por disciplina e junção).
+"""
+
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from backend.database import Database
+from bench.database_bench import session_payload
+
+
+@pytest.fixture
+def db(seeded_copy):
+    path, meta = seeded_copy
+    db = Database(path, single_writer=True)
+    yield db, meta
+    db.close()
+
+
+def expected_ids(db, cycle_id=None, subject_id=None, start_date=None, end_date=None):
+    """As mesmas sessões num único SELECT ordenado (dias em UTC: o banco de teste não tem fuso)"""
+    query = '''
+        SELECT ss.id FROM study_sessions ss JOIN subjects s ON ss.subject_id = s.id WHERE 1 = 1
+    '''
+    params = []
+    if cycle_id:
+        query += ' AND s.cycle_id = ?'
+        params.append(cycle_id)
+    if subject_id:
+        query += ' AND ss.subject_id = ?'
+        params.append(subject_id)
+    if start_date:
+        query += " AND ss.started_ts >= CAST(strftime('%s', ?) AS INTEGER)"
+        params.append(start_date)
+    if end_date:
+        query += " AND ss.started_ts < CAST(strftime('%s', ?, '+1 day') AS INTEGER)"
+        params.append(end_date)
+    query += ' ORDER BY ss.started_ts DESC, ss.id DESC'
+    with sqlite3.connect(db.db_path) as conn:
+        return [row[0] for row in conn.execute(query, params)]
+
+
+def walk(db, between_pages=None, limit=37, **filters):
+    ids = []
+    before = None
+    while True:
+        page = db.get_sessions_page(before=before, limit=limit, **filters)
+        ids.extend(session['id'] for session in page['sessions'])
+        before = page['nextCursor']
+        if before is None:
+            return ids
+        if between_pages:
+            between_pages()
+
+
+def test_pages_match_single_select(db):
+    db, _ = db
+    assert walk(db) == expected_ids(db)
+
+
+@pytest.mark.parametrize('merged', [100, 0], ids=['per-subject', 'global-index'])
+def test_cycle_pages_match_single_select(db, monkeypatch, merged):
+    db, meta = db
+    # 0 força o caminho de ciclos com muitas disciplinas (filtro sobre o índice global)
+    monkeypatch.setattr(db, 'MAX_MERGED_SUBJECTS', merged)
+    start = (date.today() - timedelta(days=90)).isoformat()
+    end = (date.today() - timedelta(days=10)).isoformat()
+
+    for cycle_id in meta['cycles']:
+        expected = expected_ids(db, cycle_id=cycle_id)
+        assert expected
+        assert walk(db, cycle_id=cycle_id) == expected
+        assert walk(db, cycle_id=cycle_id, start_date=start, end_date=end) == \
+            expected_ids(db, cycle_id=cycle_id, start_date=start, end_date=end)
+
+    subject_id = meta['subjects'][0]
+    cycle_of_subject = db.get_subject(subject_id)['cycle_id']
+    other_cycle = next(cycle for cycle in meta['cycles'] if cycle != cycle_of_subject)
+    assert walk(db, cycle_id=cycle_of_subject, subject_id=subject_id) == expected_ids(db, subject_id=subject_id)
+    assert walk(db, cycle_id=other_cycle, subject_id=subject_id) == []
+
+
+def test_inserts_between_pages_cause_no_duplicates_or_gaps(db):
+    db, meta = db
+    cycle_id = meta['cycles'][0]
+    subjects = [subject['id'] for subject in db.get_subjects_by_cycle(cycle_id)]
+    with sqlite3.connect(db.db_path) as conn:
+        newest = conn.execute('SELECT MAX(started_ts) FROM study_sessions').fetchone()[0]
+    inserted = []
+
+    def insert():
+        # Sessões mais recentes que todas as outras, entre uma página e outra
+        moment = datetime.fromtimestamp(newest, timezone.utc) + timedelta(hours=1, minutes=len(inserted))
+        batch = [session_payload(subject, moment, key=f"page-insert-{len(inserted)}-{n}")
+                 for n, subject in enumerate(subjects)]
+        inserted.extend(result['id'] for result in db.create_sessions(batch))
+
+    for filters in ({}, {'cycle_id': cycle_id}):
+        # As sessões do momento da primeira página, nem mais nem menos
+        expected = expected_ids(db, **filters)
+        ids = walk(db, between_pages=insert, **filters)
+        assert len(ids) == len(set(ids))
+        assert ids == expected
+    assert inserted
@@ -0,0 +1,41 @@
+"""
+Cache das rotas de estatísticas: a entrada usa as mesmas versões do ETag, inclusive o dia.
+"""
+
+import sqlite3
+
+
+def test_day_change_produces_new_body(api, monkeypatch):
+    client, db, _ = api
+    with sqlite3.connect(db.db_path) as conn:
+        start_day, end_day = conn.execute(
+            'SELECT start_day, end_day FROM streak_runs ORDER BY end_day DESC LIMIT 1').fetchone()
+
+    today = [end_day]
+    monkeypatch.setattr(db, 'local_today', lambda: today[0])
+
+    first = client.get('/api/stats/general')
+    assert first.json()['currentStreak'] == end_day - start_day + 1
+
+    # Sem nenhuma escrita: só o dia muda (a sequência acabou ontem)
+    today[0] = end_day + 1
+    second = client.get('/api/stats/general', headers={'If-None-Match': first.headers['etag']})
+    assert second.status_code == 200
+    assert second.headers['etag'] != first.headers['etag']
+    assert second.json()['currentStreak'] == 0
+
+    # O corpo do novo dia fica em cache com o ETag do novo dia
+    third = client.get('/api/stats/general')
+    assert third.headers['etag'] == second.headers['etag']
+    assert third.json() == second.json()
+
+
+def test_write_produces_new_body(api):
+    client, db, meta = api
+    first = client.get('/api/stats/general').json()
+
+    db.create_session({'subject_id': meta['subjects'][0], 'minutes': 25, 'idempotency_key': 'cache-write',
+                       'started_at': '2026-01-05T10:00:00.000Z', 'completed_at': '2026-01-05T10:25:00.000Z'})
+
+    second = client.get('/api/stats/general').json()
+    assert second['totalSessions'] == first['totalSessions'] + 1
@@ -0,0 +1,93 @@
+"""
+Sincronização (GET/POST /api/sync): conflitos, linhas apagadas e recomeço depois de restaurar um backup.
+"""
+
+import pytest
+
+from backend.changelog import StaleCursorError
+from backend.database import Database
+
+
+@pytest.fixture
+def db(seeded_copy):
+    path, meta = seeded_copy
+    db = Database(path, single_writer=True)
+    yield db, meta
+    db.close()
+
+
+def cycle_upsert(db, cycle_id, name):
+    cycle = dict(db.get_cycle_by_id(cycle_id), name=name)
+    return {'table': 'cycles', 'op': 'upsert', 'data': {key: cycle[key] for key in (
+        'id', 'name', 'study_days', 'created_at', 'week_start_date', 'is_active')}}
+
+
+def test_stale_cursor_push_returns_conflict_with_current_row(db):
+    db, meta = db
+    cycle_id = meta['cycles'][0]
+    client_cursor = db.sync_cursor()
+
+    # Outro cliente altera o ciclo depois da última sincronização deste
+    server = db.get_cycle_by_id(cycle_id)
+    db.update_cycle(cycle_id, {'name': 'Renomeado no servidor', 'study_days': server['study_days'],
+                               'week_start_date': server['week_start_date']})
+
+    results, cursor = db.apply_mutations([cycle_upsert(db, cycle_id, 'Renomeado no cliente')], client_cursor)
+    assert results[0]['status'] == 'conflict'
+    assert results[0]['current']['id'] == cycle_id
+    assert results[0]['current']['name'] == 'Renomeado no servidor'
+    assert db.get_cycle_by_id(cycle_id)['name'] == 'Renomeado no servidor'
+    # Houve escrita depois do cursor do cliente: ele não avança
+    assert cursor == client_cursor
+
+    # Depois de buscar as alterações, a mesma mutação é aplicada
+    fresh = db.get_changes(client_cursor)['cursor']
+    results, cursor = db.apply_mutations([cycle_upsert(db, cycle_id, 'Renomeado no cliente')], fresh)
+    assert results[0]['status'] == 'applied'
+    assert db.get_cycle_by_id(cycle_id)['name'] == 'Renomeado no cliente'
+    assert cursor == db.sync_cursor()
+
+
+def test_delete_appears_in_deleted(db):
+    db, meta = db
+    subject_id = meta['subjects'][0]
+    since = db.sync_cursor()
+
+    results, _ = db.apply_mutations([{'table': 'subjects', 'op': 'delete', 'data': {'id': subject_id}}], since)
+    assert results[0]['status'] == 'applied'
+
+    delta = db.get_changes(since)
+    assert delta['deleted']['subjects'] == [subject_id]
+    assert subject_id not in [subject['id'] for subject in delta['changes']['subjects']]
+    assert not delta['reset']
+
+
+def test_restore_resets_cursor(db, tmp_path):
+    db, meta = db
+    backup = str(tmp_path / 'restore.db')
+    db.backup_to(backup)
+    old_cursor = db.sync_cursor()
+
+    db.restore_from(backup)
+
+    delta = db.get_changes(old_cursor, limit=100000)
+    assert delta['reset']
+    assert not delta['hasMore']
+    # Recomeça do zero: todos os ciclos vêm de novo
+    assert sorted(cycle['id'] for cycle in delta['changes']['cycles']) == sorted(meta['cycles'])
+    assert delta['cursor'].split('.')[0] != old_cursor.split('.')[0]
+
+    with pytest.raises(StaleCursorError):
+        db.apply_mutations([cycle_upsert(db, meta['cycles'][0], 'Depois da restauração')], old_cursor)
+
+
+def test_api_push_with_cursor_from_before_restore_is_409(api, tmp_path):
+    client, db, meta = api
+    old_cursor = client.get('/api/sync/cursor').json()['cursor']
+    backup = str(tmp_path / 'restore.db')
+    db.backup_to(backup)
+    db.restore_from(backup)
+
+    response = client.post('/api/sync', json={'since': old_cursor, 'mutations': []})
+    assert response.status_code == 409
+    assert client.get('/api/sync', params={'since': old_cursor, 'limit': 1}).json()['reset']